@@ -13,6 +13,20 @@ from datetime import date
 
 BACKEND_API_URL = "https://northbound-allie-silvery.ngrok-free.dev".strip()
 
+# Rows fetched per /query page (first page renders immediately)
+QUERY_PAGE_SIZE = 500
+
+# Compact result encoding: {"columns": [...], "rows": [[...]]}
+RESULT_FORMAT = "columnar"
+
+# Employees offered per typeahead search
+EMPLOYEE_SEARCH_LIMIT = 50
+
+
+def columnar_to_df(payload):
+    """Builds a DataFrame straight from a columnar payload."""
+    return pd.DataFrame(payload["rows"], columns=payload["columns"])
+
 # =================================================
 # MILL DISPLAY → BACKEND MAPPING
 # =================================================
@@ -40,6 +54,10 @@ st.set_page_config(
 if "page" not in st.session_state:
     st.session_state.page = "chat"
 
+# Last executed /query result (kept across reruns for "Load more")
+if "query_result" not in st.session_state:
+    st.session_state.query_result = None
+
 # =================================================
 # SIDEBAR – NAVIGATION & MILL SELECTION
 # =================================================
@@ -82,25 +100,44 @@ if st.session_state.page == "chat":
     st.markdown("- How many overtime workers today?")
     st.markdown("- Show overtime between 10/12/2025 to 31/12/2025")
 
+    # Same question on every mill, merged with a "Mill" column
+    all_mills = st.checkbox("Ask all mills")
+
     question = st.chat_input("Ask SmartEye related question...")
 
+    def fetch_query_page(question, mill, page_token=None):
+        """Fetches one page of /query results."""
+        return requests.post(
+            f"{BACKEND_API_URL}/query",
+            json={
+                "question": question,
+                "mill": mill,  # ✅ mapped value
+                "page_size": QUERY_PAGE_SIZE,
+                "page_token": page_token,
+                "format": RESULT_FORMAT
+            },
+            timeout=60
+        )
+
     if question:
         with st.spinner("Sending request to backend..."):
-            response = requests.post(
-                f"{BACKEND_API_URL}/query",
-                json={
-                    "question": question,
-                    "mill": mill  # ✅ mapped value
-                },
-                timeout=60
-            )
+            response = fetch_query_page(question, "all" if all_mills else mill)
 
         if response.status_code != 200:
             st.error("Backend error occurred")
             st.code(response.text)
             st.stop()
 
-        result = response.json()
+        st.session_state.query_result = {
+            "question": question,
+            "mill": "all" if all_mills else mill,
+            "result": response.json()
+        }
+
+    state = st.session_state.query_result
+
+    if state:
+        result = state["result"]
 
         if result.get("status") == "executed":
             st.success("SQL executed successfully")
@@ -112,11 +149,41 @@ if st.session_state.page == "chat":
                     st.markdown("Parameters:")
                     st.code(result["params"])
 
-                st.markdown(f"Rows returned: {result['rows']}")
+                st.markdown(f"Rows loaded: {len(result['data']['rows'])}")
+
+            # Per-mill status and timings (all-mills questions)
+            if result.get("mills"):
+                st.dataframe(pd.DataFrame(result["mills"]), use_container_width=True)
 
-            df = pd.DataFrame(result["data"])
+            df = columnar_to_df(result["data"])
             st.dataframe(df, use_container_width=True)
 
+            # Further pages are appended on demand
+            if result.get("next_page_token"):
+                if st.button("Load more rows"):
+                    with st.spinner("Loading more rows..."):
+                        response = fetch_query_page(
+                            state["question"],
+                            state["mill"],
+                            result["next_page_token"]
+                        )
+
+                    if response.status_code != 200:
+                        st.error("Backend error occurred")
+                        st.code(response.text)
+                        st.stop()
+
+                    page = response.json()
+
+                    if page.get("status") == "executed":
+                        result["data"]["rows"].extend(page["data"]["rows"])
+                        result["next_page_token"] = page.get("next_page_token")
+                    else:
+                        st.warning(page.get("message", "Could not load more rows"))
+                        result["next_page_token"] = None
+
+                    st.rerun()
+
         elif result.get("status") == "generated":
             st.warning("SQL was generated but execution was blocked by safety rules.")
 
@@ -147,31 +214,51 @@ elif st.session_state.page == "month_attendance":
         st.error("Start date cannot be after end date")
         st.stop()
 
+    # Typeahead: only matching employees instead of the full roster
+    search = st.text_input("Search Employee (code or name)").strip()
+
     with st.spinner("Fetching employees..."):
-        response = requests.post(
-            f"{BACKEND_API_URL}/employees",
-            json={
-                "mill": mill,  # ✅ mapped value
-                "start_date": start_date.isoformat(),
-                "end_date": end_date.isoformat()
-            },
-            timeout=30
-        )
+        if search:
+            response = requests.get(
+                f"{BACKEND_API_URL}/employees/search",
+                params={
+                    "mill": mill,
+                    "q": search,
+                    "limit": EMPLOYEE_SEARCH_LIMIT,
+                    "start_date": start_date.isoformat(),
+                    "end_date": end_date.isoformat()
+                },
+                timeout=30
+            )
+        else:
+            response = requests.post(
+                f"{BACKEND_API_URL}/employees",
+                json={
+                    "mill": mill,  # ✅ mapped value
+                    "start_date": start_date.isoformat(),
+                    "end_date": end_date.isoformat(),
+                    "format": RESULT_FORMAT
+                },
+                timeout=30
+            )
 
     if response.status_code != 200:
         st.error("Backend error while fetching employees")
         st.code(response.text)
         st.stop()
 
-    employees = response.json()
+    if search:
+        employees = pd.DataFrame(response.json(), columns=["ECode", "EName"])
+    else:
+        employees = columnar_to_df(response.json())
 
-    if not employees:
+    if employees.empty:
         st.warning("No employees found for selected date range.")
         st.stop()
 
     employee_map = {
-        f"{row['ECode']} - {row['EName']}": row["ECode"]
-        for row in employees
+        f"{ecode} - {ename}": ecode
+        for ecode, ename in zip(employees["ECode"], employees["EName"])
     }
 
     selected_employee = st.selectbox(
@@ -189,7 +276,8 @@ elif st.session_state.page == "month_attendance":
                     "mill": mill,  # ✅ mapped value
                     "start_date": start_date.isoformat(),
                     "end_date": end_date.isoformat(),
-                    "ecode": selected_ecode
+                    "ecode": selected_ecode,
+                    "format": RESULT_FORMAT
                 },
                 timeout=30
             )
@@ -199,15 +287,14 @@ elif st.session_state.page == "month_attendance":
             st.code(response.text)
             st.stop()
 
-        data = response.json()
-
-        df = pd.DataFrame(data)
+        df = columnar_to_df(response.json())
         df["Month"] = df["mon"].apply(lambda x: date(1900, x, 1).strftime("%B"))
 
         df = df.rename(columns={
+            "year": "Year",
             "work_days": "Total Working Days",
             "attn_days": "Attendance Days"
         })
 
         st.success("Month-wise attendance calculated")
-        st.dataframe(df[["Month", "Total Working Days", "Attendance Days"]], use_container_width=True)
+        st.dataframe(df[["Year", "Month", "Total Working Days", "Attendance Days"]], use_container_width=True)
@@ -1,28 +1,151 @@
-from fastapi import FastAPI, HTTPException
+import datetime
+import json
+import time
+
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse
+)
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from typing import List, Optional
 import pandas as pd
 
-from core.query_runner import handle_question
+from core.async_runner import (
+    handle_question_async,
+    iterate_on_db_executor,
+    run_db,
+    shutdown_executor,
+    stream_question_async
+)
+from core.batch_runner import handle_batch_async
+from core.fanout import handle_question_all_mills_async, is_all_mills
+from core.query_runner import json_default
+from core.logger import shutdown_logger
+from core.intent_matcher import get_fast_path_stats
+from core.wire_format import (
+    FORMAT_ARROW,
+    FORMAT_COLUMNAR,
+    FORMAT_RECORDS,
+    MEDIA_TYPES,
+    arrow_available,
+    negotiate_format,
+    to_arrow_ipc,
+    to_columnar
+)
+from core.result_cache import RESULT_CACHE
+from core.rollups import get_rollup_stats, refresh_rollups
+from core.replica import get_replica_stats, sync_replica
+from core.employee_index import (
+    get_employee_index,
+    get_employee_index_stats,
+    search_employees
+)
+from core.sql_guard import get_sql_guard_stats
+from core.single_flight import get_single_flight_stats
+from core.llm_resilience import get_llm_resilience_stats
+from core.llm_engine import (
+    clear_llm_cache,
+    get_llm_cache_stats,
+    reload_prompt_files
+)
 from core.db import (
+    close_all_pools,
     get_employees_by_date_range,
-    get_monthwise_attendance
+    get_monthwise_attendance,
+    get_pool_stats,
+    invalidate_schema_cache,
+    iter_monthwise_attendance_bulk,
+    normalize_mill
+)
+from core.exports import (
+    EXPORT_CSV,
+    EXPORT_MEDIA_TYPES,
+    EXPORT_XLSX,
+    export_format,
+    iter_csv,
+    iter_export,
+    iter_ndjson,
+    write_xlsx
+)
+from core.metrics import (
+    HTTP_REQUEST_SECONDS,
+    counter_lines,
+    gauge_lines,
+    register_collector,
+    render_prometheus
 )
 
 app = FastAPI(title="SmartEye Backend API")
 
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """
+    Records end-to-end latency per route (for /metrics).
+    """
+    start = time.perf_counter()
+    response = await call_next(request)
+
+    # Route template keeps label cardinality bounded
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - start, path=path, status=response.status_code
+    )
+    return response
+
+
+@app.on_event("shutdown")
+def shutdown():
+    """
+    Closes pooled DB connections on server shutdown
+    and drains pending audit log entries.
+    """
+    shutdown_executor()
+    close_all_pools()
+    shutdown_logger()
+
 # ============================================================
 # REQUEST MODELS
 # ============================================================
 
 class QueryRequest(BaseModel):
     question: str
+    # "all" runs the question on every mill (merged, "Mill" column)
     mill: str = "hastings"
+    bypass_cache: bool = False
+    # Stream rows as NDJSON instead of one JSON body
+    stream: bool = False
+    # Cursor-style pagination (ignored when streaming)
+    page_size: Optional[int] = None
+    page_token: Optional[str] = None
+    # Result encoding: records | columnar | arrow (else Accept header)
+    format: Optional[str] = None
+
+
+class BatchItem(BaseModel):
+    question: str
+    mill: str = "hastings"
+
+
+class BatchQueryRequest(BaseModel):
+    items: List[BatchItem]
+    bypass_cache: bool = False
+    # records | columnar (arrow cannot hold several results)
+    format: Optional[str] = None
 
 
 class EmployeeRequest(BaseModel):
     mill: str
     start_date: str
     end_date: str
+    format: Optional[str] = None
 
 
 class MonthwiseAttendanceRequest(BaseModel):
@@ -30,6 +153,43 @@ class MonthwiseAttendanceRequest(BaseModel):
     start_date: str
     end_date: str
     ecode: str
+    format: Optional[str] = None
+
+
+class BulkMonthwiseRequest(BaseModel):
+    mill: str
+    start_date: str
+    end_date: str
+    # None = every employee with attendance in the range
+    ecodes: Optional[List[str]] = None
+    # ndjson (default) | csv | xlsx
+    format: Optional[str] = None
+
+
+class SchemaInvalidateRequest(BaseModel):
+    mill: Optional[str] = None
+
+
+class ResultCacheInvalidateRequest(BaseModel):
+    mill: Optional[str] = None
+
+
+class EmployeeIndexRefreshRequest(BaseModel):
+    mill: str
+    # Rebuild (drops rows deleted at source)
+    full: bool = False
+
+
+class RollupRefreshRequest(BaseModel):
+    mill: str
+    # Rebuild from scratch (after corrections older than the lag window)
+    full: bool = False
+
+
+class ReplicaSyncRequest(BaseModel):
+    mill: str
+    # Copy the table again (after corrections older than the lag window)
+    full: bool = False
 
 
 # ============================================================
@@ -52,20 +212,133 @@ def make_json_safe(obj):
     return obj
 
 
+def choose_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """
+    Resolves the response format (request field, then Accept header).
+    Fails early with 400 / 406 before any work is done.
+    """
+    try:
+        fmt = negotiate_format(requested, accept)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if fmt == FORMAT_ARROW and not arrow_available():
+        raise HTTPException(
+            status_code=406,
+            detail="Arrow format is not available on this server"
+        )
+
+    return fmt
+
+
+def render_rows(records, fmt: str):
+    """
+    Encodes a list of row dicts in the negotiated format.
+    """
+    if fmt == FORMAT_RECORDS:
+        return make_json_safe(records)
+
+    columnar = to_columnar(records)
+
+    # Arrow keeps native types (dates stay dates)
+    if fmt == FORMAT_ARROW:
+        values = [list(column) for column in zip(*columnar["rows"])]
+        if not values:
+            values = [[] for _ in columnar["columns"]]
+        return Response(
+            content=to_arrow_ipc(columnar["columns"], values),
+            media_type=MEDIA_TYPES[FORMAT_ARROW]
+        )
+
+    return JSONResponse(
+        content=jsonable_encoder(columnar),
+        media_type=MEDIA_TYPES[FORMAT_COLUMNAR]
+    )
+
+
+async def _ndjson(items):
+    """
+    Serializes an async stream of dicts as newline-delimited JSON.
+    """
+    async for item in items:
+        yield json.dumps(item, default=json_default) + "\n"
+
+
 # ============================================================
 # QUERY ENDPOINT (LLM-BASED)
 # ============================================================
 
 @app.post("/query")
-def run_query(req: QueryRequest):
+async def run_query(req: QueryRequest, accept: Optional[str] = Header(None)):
     """
     Receives question + mill from UI,
     processes it safely,
     and returns structured JSON response.
+
+    Async: waiting on the LLM / DB does not occupy a worker
+    thread, so the analytics endpoints below stay responsive.
+
+    - stream=true    → application/x-ndjson, rows sent as fetched
+    - page_size=N    → first N rows + next_page_token
+    - format / Accept → records (default), columnar or arrow
+    - mill="all"     → SQL resolved once, run on every mill concurrently
+                       (no streaming; page_size is ignored)
     """
+    fmt = choose_format(req.format, accept)
+    all_mills = is_all_mills(req.mill)
+
+    if all_mills and req.stream:
+        raise HTTPException(
+            status_code=400,
+            detail="Streaming is not supported for all mills"
+        )
+
     try:
-        result = handle_question(req.question, req.mill)
-        return make_json_safe(result)
+        if all_mills:
+            result = await handle_question_all_mills_async(
+                req.question,
+                use_cache=not req.bypass_cache,
+                result_format=fmt
+            )
+
+        elif req.stream:
+            return StreamingResponse(
+                _ndjson(stream_question_async(
+                    req.question,
+                    req.mill,
+                    use_cache=not req.bypass_cache
+                )),
+                media_type="application/x-ndjson"
+            )
+
+        else:
+            result = await handle_question_async(
+                req.question,
+                req.mill,
+                use_cache=not req.bypass_cache,
+                page_size=req.page_size,
+                page_token=req.page_token,
+                result_format=fmt
+            )
+
+        if result.get("status") != "executed":
+            return make_json_safe(result)
+
+        # Executed rows are already encoded (JSON-safe) by the runner:
+        # serialize once, without another encoder pass
+        if fmt == FORMAT_ARROW:
+            colset = result.pop("data")
+            return Response(
+                content=to_arrow_ipc(
+                    colset["columns"], colset["values"], metadata=result
+                ),
+                media_type=MEDIA_TYPES[FORMAT_ARROW]
+            )
+
+        if fmt == FORMAT_COLUMNAR:
+            result["format"] = fmt
+
+        return JSONResponse(content=result, media_type=MEDIA_TYPES[fmt])
 
     except Exception as e:
         raise HTTPException(
@@ -74,22 +347,60 @@ def run_query(req: QueryRequest):
         )
 
 
+@app.post("/query/batch")
+async def run_query_batch(req: BatchQueryRequest):
+    """
+    Answers many (question, mill) pairs in one call.
+
+    Identical questions run once, items run concurrently (bounded
+    per mill) and every item gets its own /query response shape
+    under "result"; one failing item does not fail the batch.
+    """
+    fmt = choose_format(req.format, None)
+    if fmt == FORMAT_ARROW:
+        raise HTTPException(
+            status_code=400,
+            detail="Batch results support records or columnar format"
+        )
+
+    try:
+        batch = await handle_batch_async(
+            [{"question": i.question, "mill": i.mill} for i in req.items],
+            use_cache=not req.bypass_cache,
+            result_format=fmt
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    for entry in batch["results"]:
+        result = entry["result"]
+        if result.get("status") != "executed":
+            entry["result"] = make_json_safe(result)
+        elif fmt == FORMAT_COLUMNAR:
+            result["format"] = fmt
+
+    # Executed rows are already JSON-safe (see /query)
+    return JSONResponse(content=batch)
+
+
 # ============================================================
 # EMPLOYEE LIST ENDPOINT (NO LLM)
 # ============================================================
 
 @app.post("/employees")
-def get_employees(req: EmployeeRequest):
+def get_employees(req: EmployeeRequest, accept: Optional[str] = Header(None)):
     """
     Returns list of employees for a given date range.
     """
+    fmt = choose_format(req.format, accept)
+
     try:
         data = get_employees_by_date_range(
             req.mill,
             req.start_date,
             req.end_date
         )
-        return make_json_safe(data)
+        return render_rows(data, fmt)
 
     except Exception as e:
         raise HTTPException(
@@ -98,15 +409,44 @@ def get_employees(req: EmployeeRequest):
         )
 
 
+@app.get("/employees/search")
+def employee_search(
+    mill: str,
+    q: str,
+    limit: int = 20,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+):
+    """
+    Typeahead over the in-memory employee index:
+    ECode / name prefix matches first, then substring matches.
+    With start_date + end_date only employees present in the range.
+    """
+    try:
+        return search_employees(mill, q, limit, start_date, end_date)
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+
+
 # ============================================================
 # MONTH-WISE ATTENDANCE ENDPOINT (NO LLM)
 # ============================================================
 
 @app.post("/monthwise-attendance")
-def monthwise_attendance(req: MonthwiseAttendanceRequest):
+def monthwise_attendance(
+    req: MonthwiseAttendanceRequest,
+    accept: Optional[str] = Header(None)
+):
     """
-    Returns month-wise attendance for a selected employee.
+    Returns month-wise attendance (per year and month)
+    for a selected employee.
     """
+    fmt = choose_format(req.format, accept)
+
     try:
         data = get_monthwise_attendance(
             req.mill,
@@ -114,10 +454,312 @@ def monthwise_attendance(req: MonthwiseAttendanceRequest):
             req.end_date,
             req.ecode
         )
-        return make_json_safe(data)
+        return render_rows(data, fmt)
 
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=str(e)
         )
+
+
+MONTHWISE_COLUMNS = ["ECode", "year", "mon", "work_days", "attn_days"]
+
+
+@app.post("/monthwise-attendance/bulk")
+async def monthwise_attendance_bulk(req: BulkMonthwiseRequest):
+    """
+    Month-wise attendance for all employees (or a list of ECodes)
+    from one grouped scan instead of one call per employee.
+
+    - ndjson / csv → streamed as rows are produced
+    - xlsx         → Excel workbook download
+    """
+    try:
+        fmt = export_format(req.format)
+        mill = normalize_mill(req.mill)
+        datetime.date.fromisoformat(req.start_date)
+        datetime.date.fromisoformat(req.end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filename = f"monthwise-{mill}-{req.start_date}-{req.end_date}.{fmt}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    def rows():
+        return iter_monthwise_attendance_bulk(
+            mill, req.start_date, req.end_date, req.ecodes
+        )
+
+    if fmt == EXPORT_XLSX:
+        try:
+            workbook = await run_db(
+                mill, write_xlsx, rows(), MONTHWISE_COLUMNS, "Monthwise"
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        return StreamingResponse(
+            iter(lambda: workbook.read(65536), b""),
+            media_type=EXPORT_MEDIA_TYPES[fmt],
+            headers=headers,
+            background=BackgroundTask(workbook.close)
+        )
+
+    if fmt == EXPORT_CSV:
+        chunks = iter_csv(rows(), MONTHWISE_COLUMNS)
+    else:
+        chunks = iter_ndjson(rows())
+
+    # Holds the mill's DB limit while streaming; a mid-scan
+    # failure ends the body with an error line / row
+    return StreamingResponse(
+        iterate_on_db_executor(mill, iter_export(chunks, fmt)),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers=headers
+    )
+
+
+# ============================================================
+# ADMIN ENDPOINTS
+# ============================================================
+
+@app.post("/admin/schema-cache/invalidate")
+def invalidate_schema(req: SchemaInvalidateRequest):
+    """
+    Drops cached schema metadata for one mill (or all mills)
+    after a schema change.
+    """
+    try:
+        removed = invalidate_schema_cache(req.mill)
+        return {"invalidated": removed}
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+
+
+@app.post("/admin/prompts/reload")
+def reload_prompts():
+    """
+    Re-reads the llm/*.md prompt files immediately
+    (otherwise they are reloaded when their mtimes change).
+    """
+    return {"prompt_version": reload_prompt_files()}
+
+
+@app.get("/admin/llm-cache")
+def llm_cache_stats():
+    """
+    Hit / miss counters of the question → SQL cache.
+    """
+    return get_llm_cache_stats()
+
+
+@app.post("/admin/llm-cache/clear")
+def llm_cache_clear():
+    """
+    Empties the question → SQL cache.
+    """
+    clear_llm_cache()
+    return {"cleared": True}
+
+
+@app.get("/admin/fast-path")
+def fast_path_stats():
+    """
+    Fast-path coverage: questions answered without the LLM.
+    """
+    return get_fast_path_stats()
+
+
+@app.get("/admin/result-cache")
+def result_cache_stats():
+    """
+    Size and hit / miss counters of the query result cache.
+    """
+    return RESULT_CACHE.stats()
+
+
+@app.post("/admin/result-cache/invalidate")
+def result_cache_invalidate(req: ResultCacheInvalidateRequest):
+    """
+    Drops cached query results for one mill (or all mills),
+    e.g. after attendance data was corrected.
+    """
+    return {"invalidated": RESULT_CACHE.invalidate(req.mill)}
+
+
+@app.get("/admin/employee-index")
+def employee_index_stats():
+    """
+    Size and refresh state of each mill's employee index.
+    """
+    return get_employee_index_stats()
+
+
+@app.post("/admin/employee-index/refresh")
+def employee_index_refresh(req: EmployeeIndexRefreshRequest):
+    """
+    Brings a mill's employee index up to date now
+    (normally refreshed in the background).
+    """
+    try:
+        return get_employee_index(req.mill).refresh(full=req.full)
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+
+
+@app.get("/admin/rollups")
+def rollup_stats():
+    """
+    Watermark and size of each mill's monthly rollups.
+    """
+    return get_rollup_stats()
+
+
+@app.post("/admin/rollups/refresh")
+def rollup_refresh(req: RollupRefreshRequest):
+    """
+    Brings a mill's monthly rollups up to date now
+    (normally refreshed in the background).
+    """
+    try:
+        return refresh_rollups(req.mill, full=req.full)
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+
+
+@app.get("/admin/replica")
+def replica_stats():
+    """
+    Watermark and row count of each mill's analytics replica.
+    """
+    return get_replica_stats()
+
+
+@app.post("/admin/replica/sync")
+def replica_sync(req: ReplicaSyncRequest):
+    """
+    Brings a mill's analytics replica up to date now
+    (normally synced in the background).
+    """
+    try:
+        return sync_replica(req.mill, full=req.full)
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+
+
+# ============================================================
+# METRICS (Prometheus text format)
+# ============================================================
+
+@register_collector
+def _cache_and_pool_gauges():
+    """
+    Cache / pool state, read at scrape time: point-in-time values
+    as gauges, cumulative hit / miss / eviction counts as counters.
+    """
+    llm = get_llm_cache_stats()
+    results = RESULT_CACHE.stats()
+    guard = get_sql_guard_stats()
+    fast_path = get_fast_path_stats()
+    pools = get_pool_stats()
+    flights = get_single_flight_stats()
+    llm_calls = get_llm_resilience_stats()
+
+    yield from gauge_lines(
+        "smarteye_cache_entries",
+        "Entries held per cache",
+        [({"cache": "llm"}, llm["entries"]),
+         ({"cache": "result"}, results["entries"]),
+         ({"cache": "sql_guard"}, guard["entries"])],
+    )
+    caches = (("llm", llm), ("result", results), ("sql_guard", guard))
+    for kind in ("hits", "misses", "evictions"):
+        yield from counter_lines(
+            f"smarteye_cache_{kind}_total",
+            f"Cache {kind} since start",
+            [({"cache": cache}, stats[kind]) for cache, stats in caches],
+        )
+    yield from gauge_lines(
+        "smarteye_result_cache_bytes",
+        "Estimated size of the result cache",
+        [({}, results["bytes"])],
+    )
+    yield from gauge_lines(
+        "smarteye_fast_path_coverage",
+        "Share of questions answered without the LLM",
+        [({}, fast_path["coverage"])],
+    )
+    yield from gauge_lines(
+        "smarteye_db_pool_connections",
+        "Pooled DB connections per mill and state",
+        [({"mill": mill, "state": state}, stats[state])
+         for mill, stats in pools.items()
+         for state in ("idle", "in_use")],
+    )
+    for kind, help_text in (
+        ("hits", "DB pool checkouts that reused an idle connection"),
+        ("misses", "DB pool checkouts that opened a new connection"),
+        ("evictions", "Pooled DB connections closed as expired or broken"),
+    ):
+        yield from counter_lines(
+            f"smarteye_db_pool_{kind}_total",
+            help_text,
+            [({"mill": mill}, stats[kind]) for mill, stats in pools.items()],
+        )
+    yield from counter_lines(
+        "smarteye_single_flight_calls_total",
+        "Coalesced calls since start (leaders ran, coalesced waited)",
+        [({"group": group, "role": role}, stats[role])
+         for group, stats in flights.items()
+         for role in ("leaders", "coalesced", "timeouts")],
+    )
+    yield from gauge_lines(
+        "smarteye_single_flight_inflight",
+        "Shared calls currently running",
+        [({"group": group}, stats["inflight"]) for group, stats in flights.items()],
+    )
+    yield from counter_lines(
+        "smarteye_llm_calls_total",
+        "LLM calls, retries, hedges and breaker rejections since start",
+        [({"event": event}, llm_calls[event])
+         for event in ("calls", "retries", "hedges", "hedge_wins", "failures", "rejected")],
+    )
+    yield from gauge_lines(
+        "smarteye_llm_circuit_open",
+        "1 while the LLM circuit breaker refuses calls",
+        [({}, int(llm_calls["breaker"] == "open"))],
+    )
+    yield from gauge_lines(
+        "smarteye_llm_hedge_delay_seconds",
+        "Current delay before a hedged LLM request",
+        [({}, llm_calls["hedge_delay"])],
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Stage latency histograms, outcome / row / token counters
+    and cache gauges in Prometheus text exposition format.
+    """
+    return PlainTextResponse(
+        render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,8 @@
+"""
+Offline benchmarks for the SmartEye backend.
+
+No OpenAI key or mill database needed:
+- benchmarks.stub_llm        : deterministic stand-in for the OpenAI clients
+- benchmarks.sqlite_backend  : synthetic AttendanceReport in SQLite
+- benchmarks.run_bench       : load driver (python -m benchmarks.run_bench)
+"""
@@ -0,0 +1,196 @@
+"""
+Prompt slimming evaluation
+Purpose:
+- Run a fixed question set (prompt_eval_questions.jsonl) through the
+  full prompt and the slim prompt (core.prompt_selector)
+- Report answer accuracy against the expected SQL + params and the
+  average prompt size of each variant, so PROMPT_EXAMPLES_TOP_K /
+  PROMPT_TOKEN_BUDGET can be tuned without losing accuracy
+
+Usage:
+    python -m benchmarks.eval_prompt                 (OpenAI, synthetic schema)
+    python -m benchmarks.eval_prompt --mill shjm     (schema from the mill DB)
+    python -m benchmarks.eval_prompt --llm none      (prompt sizes only)
+
+--llm stub answers with benchmarks.stub_llm (checks the harness, not
+the prompt). Answers are compared after whitespace / case
+normalization of the SQL; params are compared as strings.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+from benchmarks.run_bench import RESULTS_DIR
+
+QUESTIONS_FILE = Path(__file__).resolve().parent / "prompt_eval_questions.jsonl"
+
+VARIANTS = {"full": False, "slim": True}
+
+
+def load_questions(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_schema_text() -> str:
+    """AttendanceReport schema as get_schema_text() formats it."""
+    from benchmarks.sqlite_backend import ATTENDANCE_COLUMNS
+
+    lines = ["Table: AttendanceReport", "Columns:"]
+    lines += [f"- {name} ({dtype})" for name, dtype in ATTENDANCE_COLUMNS]
+    lines.append("")
+    return "\n".join(lines)
+
+# ============================================================
+# SCORING
+# ============================================================
+
+def normalize_sql(sql: str) -> str:
+    sql = re.sub(r"\s+", " ", str(sql or "")).strip().rstrip(";").strip()
+    # "( SELECT" / "SELECT )" spacing varies between answers
+    sql = re.sub(r"\(\s+", "(", sql)
+    sql = re.sub(r"\s+\)", ")", sql)
+    return sql.lower()
+
+
+def normalize_params(params) -> list:
+    return [str(p).strip().lower() for p in (params or [])]
+
+
+def is_correct(answer: dict, expected: dict) -> bool:
+    if expected.get("unsupported"):
+        return bool(answer.get("unsupported"))
+    if answer.get("unsupported"):
+        return False
+    return (
+        normalize_sql(answer.get("sql")) == normalize_sql(expected["sql"])
+        and normalize_params(answer.get("params")) == normalize_params(expected["params"])
+    )
+
+# ============================================================
+# EVALUATION
+# ============================================================
+
+def ask(question: str, schema_text: str, slim: bool) -> dict:
+    import core.llm_engine as llm_engine
+    import core.llm_resilience as llm_resilience
+
+    return llm_resilience.call_llm(
+        lambda **kwargs: llm_engine.client.chat.completions.create(**kwargs),
+        llm_engine._chat_request(question, schema_text, slim),
+        llm_engine.parse_llm_response,
+    )
+
+
+def evaluate(questions, schema_text: str, call_llm: bool) -> dict:
+    from core.llm_engine import build_prompt
+    from core.prompt_selector import estimate_tokens
+
+    report = {}
+    for name, slim in VARIANTS.items():
+        tokens, seconds, correct, failures = [], [], 0, []
+
+        for item in questions:
+            question = item["question"]
+            tokens.append(estimate_tokens(build_prompt(question, schema_text, slim)))
+            if not call_llm:
+                continue
+
+            start = time.perf_counter()
+            try:
+                answer = ask(question, schema_text, slim)
+            except ValueError as e:
+                answer = {"error": str(e)}
+            seconds.append(time.perf_counter() - start)
+
+            if is_correct(answer, item["expected"]):
+                correct += 1
+            else:
+                failures.append({"question": question, "answer": answer})
+
+        report[name] = {
+            "questions": len(questions),
+            "avg_prompt_tokens": round(sum(tokens) / len(tokens), 1) if tokens else None,
+            "max_prompt_tokens": max(tokens) if tokens else None,
+        }
+        if call_llm:
+            report[name].update(
+                correct=correct,
+                accuracy=round(correct / len(questions), 3) if questions else None,
+                avg_llm_seconds=round(sum(seconds) / len(seconds), 3) if seconds else None,
+                failures=failures,
+            )
+
+    return report
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Full vs slim prompt accuracy")
+    parser.add_argument("--questions", default=str(QUESTIONS_FILE))
+    parser.add_argument("--mill", default=None,
+                        help="read the schema from this mill (default: synthetic)")
+    parser.add_argument("--llm", choices=("openai", "stub", "none"), default="openai")
+    parser.add_argument("--output", default=str(RESULTS_DIR))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.llm != "openai":
+        # No requests reach OpenAI, but client construction needs a key
+        os.environ.setdefault("OPENAI_API_KEY", "bench-stub")
+    if args.llm == "stub":
+        from benchmarks.stub_llm import install_stub_llm
+        install_stub_llm(0.0, 0.0)
+
+    from core.llm_engine import get_prompt_version, slimming_config
+
+    if args.mill:
+        from core.db import get_schema_text
+        schema_text = get_schema_text(["AttendanceReport"], args.mill)
+    else:
+        schema_text = synthetic_schema_text()
+
+    questions = load_questions(args.questions)
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "questions": args.questions,
+            "mill": args.mill,
+            "llm": args.llm,
+            "prompt_version": get_prompt_version(),
+            **{f"slimming_{k}": v for k, v in slimming_config().items()},
+        },
+        "variants": evaluate(questions, schema_text, args.llm != "none"),
+    }
+
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    stamp = report["timestamp"].replace(":", "").replace("-", "")
+    out_file = output / f"prompt-eval-{stamp}.json"
+    out_file.write_text(json.dumps(report, indent=2, default=str))
+
+    print(f"{'variant':<8}{'questions':>10}{'avg tokens':>12}{'max tokens':>12}{'accuracy':>10}")
+    for name, stats in report["variants"].items():
+        accuracy = stats.get("accuracy")
+        print(
+            f"{name:<8}{stats['questions']:>10}{stats['avg_prompt_tokens']:>12}"
+            f"{stats['max_prompt_tokens']:>12}"
+            f"{'-' if accuracy is None else f'{accuracy:.1%}':>10}"
+        )
+    print(f"\nsaved {out_file}")
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
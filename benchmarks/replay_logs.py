@@ -0,0 +1,394 @@
+"""
+Log replay load generator
+Purpose:
+- Rebuild the real question stream from the audit logs
+  (logs/YYYY-MM-DD.log and rotated YYYY-MM-DD.N.log files)
+- Replay it with the original inter-arrival timing, scaled by a
+  speed-up factor, against a running backend (--url) or the
+  in-process handle_question
+- Compare latency, outcome and row counts with the recorded run
+
+Usage:
+    python -m benchmarks.replay_logs --logs logs --since 2025-12-01 \\
+        --speedup 10 --url http://localhost:8000
+
+    python -m benchmarks.replay_logs --offline --speedup 0
+
+Questions rejected as unsupported without any SQL leave no audit
+event and are therefore not replayed.
+
+--speedup 0 sends as fast as --concurrency allows.
+--offline replays in-process against the benchmark stubs
+(stub LLM + synthetic SQLite), so row counts will not match.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from benchmarks.run_bench import RESULTS_DIR, percentile, summarize
+
+_LOG_NAME = re.compile(r"^(\d{4}-\d{2}-\d{2})(?:\.(\d+))?\.log$")
+
+# Events that end a question without SQL being executed
+_TERMINAL_WITHOUT_EXECUTION = {
+    "llm_unstructured_output": "unsupported",
+    "sql_generated_but_blocked": "generated",
+}
+
+# SQL rewritten by core.pagination (replayed unpaged, rows not comparable)
+_PAGED = re.compile(r"OFFSET \? ROWS FETCH NEXT \? ROWS ONLY\s*$")
+
+
+# ============================================================
+# READING LOGS
+# ============================================================
+
+def log_files(log_dir, since: str = None, until: str = None):
+    """
+    Audit log files in chronological order.
+    Rotated parts (day.1.log, day.2.log, ...) precede day.log.
+    """
+    found = []
+    for path in Path(log_dir).glob("*.log"):
+        match = _LOG_NAME.match(path.name)
+        if not match:
+            continue
+        day, part = match.group(1), match.group(2)
+        if (since and day < since) or (until and day > until):
+            continue
+        # Current file is the newest part of its day
+        found.append((day, int(part) if part else float("inf"), path))
+
+    return [path for _, _, path in sorted(found)]
+
+
+def read_events(paths):
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partially written line
+
+
+def _key(payload: dict):
+    return (
+        payload.get("question"),
+        payload.get("mill"),
+        payload.get("sql"),
+        json.dumps(payload.get("params"), default=str),
+    )
+
+
+def reconstruct(events, mills=None, limit: int = None):
+    """
+    Turns log events into replayable questions, in arrival order:
+    {"at", "question", "mill", "sql", "params", "outcome",
+     "rows", "latency", "cached", "paged", "streamed"}
+
+    sql_execution_started / sql_executed (or sql_execution_error) are
+    paired FIFO per (question, mill, sql, params); "latency" is the
+    recorded execution time between the two.
+    """
+    items = []
+    pending = defaultdict(deque)
+    # question/mill → started items (errors carry no SQL)
+    pending_by_question = defaultdict(deque)
+
+    events = sorted(events, key=lambda e: e.get("timestamp", ""))
+
+    for event in events:
+        kind = event.get("event")
+        payload = event.get("payload") or {}
+        if mills and str(payload.get("mill", "")).lower() not in mills:
+            continue
+
+        at = datetime.datetime.fromisoformat(event["timestamp"])
+
+        if kind == "sql_execution_started":
+            item = {
+                "at": at,
+                "question": payload.get("question"),
+                "mill": payload.get("mill"),
+                "sql": payload.get("sql"),
+                "params": payload.get("params"),
+                "outcome": None,
+                "rows": None,
+                "latency": None,
+                "cached": None,
+                "paged": bool(_PAGED.search(payload.get("sql") or "")),
+                "streamed": bool(payload.get("streamed")),
+            }
+            items.append(item)
+            pending[_key(payload)].append(item)
+            pending_by_question[(item["question"], item["mill"])].append(item)
+
+        elif kind == "sql_executed":
+            queue = pending.get(_key(payload))
+            if queue:
+                item = queue.popleft()
+                pending_by_question[(item["question"], item["mill"])].remove(item)
+                item.update(
+                    outcome="executed",
+                    rows=payload.get("rows_returned"),
+                    latency=(at - item["at"]).total_seconds(),
+                    cached=payload.get("cached"),
+                )
+
+        elif kind == "sql_execution_error":
+            queue = pending_by_question.get((payload.get("question"), payload.get("mill")))
+            if queue:
+                item = queue.popleft()
+                pending[_key(item)].remove(item)
+                item.update(outcome="error", latency=(at - item["at"]).total_seconds())
+            else:
+                # Failed before execution (LLM / validation)
+                items.append(_unexecuted(at, payload, "error"))
+
+        elif kind in _TERMINAL_WITHOUT_EXECUTION:
+            items.append(_unexecuted(at, payload, _TERMINAL_WITHOUT_EXECUTION[kind]))
+
+    items.sort(key=lambda item: item["at"])
+    return items[:limit] if limit else items
+
+
+def _unexecuted(at, payload: dict, outcome: str) -> dict:
+    return {
+        "at": at,
+        "question": payload.get("question"),
+        "mill": payload.get("mill"),
+        "sql": payload.get("sql"),
+        "params": payload.get("params"),
+        "outcome": outcome,
+        "rows": None,
+        "latency": None,
+        "cached": None,
+        "paged": False,
+        "streamed": False,
+    }
+
+
+# ============================================================
+# REPLAY TARGETS
+# ============================================================
+
+def _outcome(response: dict) -> str:
+    if response.get("status") in ("executed", "generated"):
+        return response["status"]
+    # failure_response() shape (see core.query_runner)
+    if str(response.get("message", "")).startswith("Query execution failed"):
+        return "error"
+    return "unsupported"
+
+
+def http_target(url: str, bypass_cache: bool):
+    import httpx
+
+    client = httpx.Client(base_url=url, timeout=120)
+
+    def send(item):
+        response = client.post("/query", json={
+            "question": item["question"],
+            "mill": item["mill"],
+            "bypass_cache": bypass_cache,
+        })
+        response.raise_for_status()
+        return response.json()
+
+    return send
+
+
+def in_process_target(bypass_cache: bool):
+    from core.query_runner import handle_question
+
+    def send(item):
+        return handle_question(item["question"], item["mill"], use_cache=not bypass_cache)
+
+    return send
+
+
+# ============================================================
+# REPLAY
+# ============================================================
+
+def replay(items, send, speedup: float = 1.0, concurrency: int = 16):
+    """
+    Sends every item at its original offset divided by `speedup`
+    (speedup 0 = no pacing). Returns one result dict per item.
+    """
+    results = [None] * len(items)
+    lock = threading.Lock()
+
+    def run(index, item):
+        start = time.perf_counter()
+        try:
+            response = send(item)
+            outcome, rows, error = _outcome(response), response.get("rows"), None
+        except Exception as e:
+            outcome, rows, error = "error", None, str(e)
+        with lock:
+            results[index] = {
+                "question": item["question"],
+                "mill": item["mill"],
+                "recorded_outcome": item["outcome"],
+                "replay_outcome": outcome,
+                "recorded_rows": item["rows"],
+                "replay_rows": rows,
+                "recorded_latency": item["latency"],
+                "replay_latency": time.perf_counter() - start,
+                "paged": item["paged"],
+                "error": error,
+            }
+
+    if not items:
+        return []
+
+    origin = items[0]["at"]
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for index, item in enumerate(items):
+            if speedup > 0:
+                due = (item["at"] - origin).total_seconds() / speedup
+                delay = due - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(run, index, item)
+
+    return results
+
+
+def compare(results, elapsed: float) -> dict:
+    """Latency summary plus outcome / row-count mismatches."""
+    replay_latency = [r["replay_latency"] for r in results]
+    recorded = sorted(r["recorded_latency"] * 1000 for r in results
+                      if r["recorded_latency"] is not None)
+
+    outcome_mismatches = [
+        r for r in results
+        if r["recorded_outcome"] and r["recorded_outcome"] != r["replay_outcome"]
+    ]
+    row_mismatches = [
+        r for r in results
+        if r["recorded_outcome"] == "executed" and r["replay_outcome"] == "executed"
+        and not r["paged"] and r["recorded_rows"] != r["replay_rows"]
+    ]
+
+    return {
+        "replay": summarize(replay_latency, sum(r["error"] is not None for r in results), elapsed),
+        # Recorded latency covers DB execution only (started → executed)
+        "recorded_execution": {
+            "p50_ms": percentile(recorded, 0.50),
+            "p95_ms": percentile(recorded, 0.95),
+            "p99_ms": percentile(recorded, 0.99),
+        },
+        "outcome_mismatches": len(outcome_mismatches),
+        "row_mismatches": len(row_mismatches),
+        "examples": [
+            {k: r[k] for k in ("question", "mill", "recorded_outcome", "replay_outcome",
+                               "recorded_rows", "replay_rows", "error")}
+            for r in (outcome_mismatches + row_mismatches)[:20]
+        ],
+    }
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded /query traffic")
+    parser.add_argument("--logs", default="logs", help="audit log directory")
+    parser.add_argument("--since", default=None, help="YYYY-MM-DD (inclusive)")
+    parser.add_argument("--until", default=None, help="YYYY-MM-DD (inclusive)")
+    parser.add_argument("--mills", default=None, help="comma separated filter")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--speedup", type=float, default=1.0,
+                        help="time compression factor (0 = no pacing)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--bypass-cache", action="store_true")
+    parser.add_argument("--url", default=None, help="replay against a running server")
+    parser.add_argument("--offline", action="store_true",
+                        help="in-process with the benchmark stubs")
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    parser.add_argument("--output", default=str(RESULTS_DIR))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mills = {m.strip().lower() for m in args.mills.split(",")} if args.mills else None
+
+    paths = log_files(args.logs, args.since, args.until)
+    items = reconstruct(read_events(paths), mills, args.limit)
+    print(f"{len(items)} questions from {len(paths)} log files")
+
+    if args.url:
+        send = http_target(args.url, args.bypass_cache)
+    else:
+        if args.offline:
+            from benchmarks.sqlite_backend import install
+            from benchmarks.stub_llm import install_stub_llm
+            import core.logger as logger
+
+            os.environ.setdefault("OPENAI_API_KEY", "bench-stub")
+            data_dir = Path(tempfile.mkdtemp(prefix="smarteye-replay-"))
+            # Never append replayed traffic to the logs being replayed
+            logger.LOG_DIR = data_dir / "logs"
+            logger.LOG_DIR.mkdir(parents=True, exist_ok=True)
+            install(data_dir)
+            install_stub_llm(args.llm_latency)
+        send = in_process_target(args.bypass_cache)
+
+    started = time.perf_counter()
+    results = replay(items, send, args.speedup, args.concurrency)
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "logs": [str(p) for p in paths],
+            "speedup": args.speedup,
+            "concurrency": args.concurrency,
+            "bypass_cache": args.bypass_cache,
+            "target": args.url or ("offline" if args.offline else "in-process"),
+        },
+        **compare(results, elapsed),
+    }
+
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    stamp = report["timestamp"].replace(":", "").replace("-", "")
+    out_file = output / f"replay-{stamp}.json"
+    out_file.write_text(json.dumps(report, indent=2, default=str))
+
+    stats = report["replay"]
+    print(f"replayed {stats['requests']} in {stats['seconds']}s "
+          f"({stats['rps']} rps, {stats['errors']} errors)")
+    if stats["p50_ms"] is None:
+        print("latency p50/p95/p99 ms: n/a (nothing replayed)")
+    else:
+        print(f"latency p50/p95/p99 ms: {stats['p50_ms']:.1f} / "
+              f"{stats['p95_ms']:.1f} / {stats['p99_ms']:.1f}")
+    print(f"outcome mismatches: {report['outcome_mismatches']}, "
+          f"row mismatches: {report['row_mismatches']}")
+    print(f"saved {out_file}")
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
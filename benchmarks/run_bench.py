@@ -0,0 +1,323 @@
+"""
+Offline end-to-end benchmark
+Purpose:
+- Drive /query, /employees and /monthwise-attendance at a fixed
+  concurrency, fully offline (stub LLM + SQLite AttendanceReport)
+- Report p50 / p95 / p99 latency, requests per second, errors
+  and peak memory per endpoint
+- Store every run as JSON and compare against a previous run
+
+Usage:
+    python -m benchmarks.run_bench --employees 1000 --days 180 \\
+        --concurrency 16 --requests 300 --llm-latency 0.8
+
+    python -m benchmarks.run_bench --compare benchmarks/results/<old>.json
+
+With --url the requests go to a running server instead (the stubs
+then have to be installed in that server's process).
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Fast-path shapes ({ecode}, {dept}, {start}, {end} filled per request)
+RULE_QUESTIONS = [
+    "how many outsiders today",
+    "overtime today",
+    "double duty yesterday",
+    "show attendance of {ecode}",
+    "attendance of {ecode} on {day}",
+    "{dept} department attendance today",
+    "show outsider attendance in {dept} department between {start} to {end}",
+]
+
+# Answered by the stub LLM only (see benchmarks.stub_llm.CANNED_ANSWERS)
+LLM_QUESTIONS = [
+    "department wise attendance today",
+    "shift wise attendance yesterday",
+    "monthly man days this year",
+    "top 20 employees by overtime hours",
+    "delete all attendance",
+    "who was absent yesterday",
+]
+
+DEPT_NAMES = ["jute", "spinning", "weaving hessian", "finishing", "carding"]
+
+
+# ============================================================
+# WORKLOAD
+# ============================================================
+
+def build_workload(endpoint: str, count: int, mills, employees: int,
+                   days: int, llm_share: float, seed: int, bypass_cache: bool):
+    """
+    Returns [(path, json_body), ...] for one endpoint.
+    """
+    from benchmarks.sqlite_backend import MILL_PREFIXES
+
+    rng = random.Random(f"{seed}:{endpoint}")
+    today = datetime.date.today()
+
+    def random_day():
+        return today - datetime.timedelta(days=rng.randrange(days))
+
+    def random_ecode(mill):
+        return f"{MILL_PREFIXES.get(mill, 'X')}{rng.randint(1, employees):05d}"
+
+    def random_range():
+        a, b = sorted((random_day(), random_day()))
+        return a, b
+
+    requests = []
+    for _ in range(count):
+        mill = rng.choice(mills)
+
+        if endpoint == "query":
+            if rng.random() < llm_share:
+                question = rng.choice(LLM_QUESTIONS)
+            else:
+                start, end = random_range()
+                question = rng.choice(RULE_QUESTIONS).format(
+                    ecode=random_ecode(mill),
+                    dept=rng.choice(DEPT_NAMES),
+                    day=random_day().strftime("%d/%m/%Y"),
+                    start=start.strftime("%d/%m/%Y"),
+                    end=end.strftime("%d/%m/%Y"),
+                )
+            body = {"question": question, "mill": mill, "bypass_cache": bypass_cache}
+            requests.append(("/query", body))
+
+        elif endpoint == "employees":
+            start, end = random_range()
+            requests.append(("/employees", {
+                "mill": mill,
+                "start_date": start.isoformat(),
+                "end_date": end.isoformat(),
+            }))
+
+        elif endpoint == "monthwise":
+            start, end = random_range()
+            requests.append(("/monthwise-attendance", {
+                "mill": mill,
+                "start_date": start.isoformat(),
+                "end_date": end.isoformat(),
+                "ecode": random_ecode(mill),
+            }))
+
+        else:
+            raise ValueError(f"Unknown endpoint: {endpoint}")
+
+    return requests
+
+
+# ============================================================
+# MEASUREMENT
+# ============================================================
+
+def percentile(sorted_values, q: float):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, min(len(sorted_values), int(round(q * len(sorted_values) + 0.5))))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, errors: int, elapsed: float) -> dict:
+    ms = sorted(value * 1000 for value in latencies)
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(ms) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else None,
+        "p50_ms": percentile(ms, 0.50),
+        "p95_ms": percentile(ms, 0.95),
+        "p99_ms": percentile(ms, 0.99),
+        "max_ms": ms[-1] if ms else None,
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_phase(client, requests, concurrency: int) -> dict:
+    """Sends all requests with `concurrency` workers and times each."""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def send(item):
+        nonlocal errors
+        path, body = item
+        start = time.perf_counter()
+        try:
+            response = client.post(path, json=body)
+            failed = response.status_code >= 400
+        except Exception:
+            failed = True
+        took = time.perf_counter() - start
+        with lock:
+            latencies.append(took)
+            errors += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, requests))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+# ============================================================
+# REPORTING
+# ============================================================
+
+def print_report(result: dict):
+    print(f"\nrun {result['timestamp']}  (peak RSS {result['peak_rss_mb']} MB"
+          + (f", traced peak {result['traced_peak_mb']} MB" if result.get("traced_peak_mb") else "")
+          + ")")
+    print(f"{'endpoint':<12}{'req':>7}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, stats in result["endpoints"].items():
+        print(
+            f"{name:<12}{stats['requests']:>7}{stats['errors']:>6}{stats['rps']:>9}"
+            f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+        )
+
+
+def compare(current: dict, baseline: dict):
+    """Prints the relative change of each endpoint metric vs a baseline run."""
+    print(f"\nvs baseline {baseline['timestamp']}")
+    for name, stats in current["endpoints"].items():
+        old = baseline.get("endpoints", {}).get(name)
+        if not old:
+            continue
+        changes = []
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            if old.get(metric):
+                delta = (stats[metric] - old[metric]) / old[metric] * 100
+                changes.append(f"{metric} {delta:+.1f}%")
+        print(f"  {name:<12}" + "  ".join(changes))
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mills", default="shjm,sgjm,mijm")
+    parser.add_argument("--employees", type=int, default=500, help="per mill")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--endpoints", default="query,employees,monthwise")
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="seconds")
+    parser.add_argument("--llm-share", type=float, default=0.3,
+                        help="share of /query questions that need the LLM")
+    parser.add_argument("--bypass-cache", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=None,
+                        help="where the SQLite files go (default: temp dir)")
+    parser.add_argument("--reuse-data", action="store_true",
+                        help="keep existing SQLite files in --data-dir")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also report tracemalloc peak (slower)")
+    parser.add_argument("--url", default=None, help="benchmark a running server")
+    parser.add_argument("--output", default=str(RESULTS_DIR))
+    parser.add_argument("--compare", default=None, help="baseline result JSON")
+    parser.add_argument("--tag", default="", help="label stored with the run")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mills = [m.strip().lower() for m in args.mills.split(",") if m.strip()]
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    data_dir = Path(args.data_dir or tempfile.mkdtemp(prefix="smarteye-bench-"))
+
+    if args.url:
+        import httpx
+        client = httpx.Client(base_url=args.url, timeout=120)
+        setup_seconds = 0.0
+    else:
+        # The stub replaces the client, but construction needs a key
+        os.environ.setdefault("OPENAI_API_KEY", "bench-stub")
+
+        from benchmarks.sqlite_backend import install
+        from benchmarks.stub_llm import install_stub_llm
+        import core.logger as logger
+
+        # Keep synthetic traffic out of the real audit log
+        logger.LOG_DIR = data_dir / "logs"
+        logger.LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+        started = time.perf_counter()
+        install(data_dir, mills, args.employees, args.days, args.seed, args.reuse_data)
+        setup_seconds = time.perf_counter() - started
+        install_stub_llm(args.llm_latency, args.llm_jitter, args.seed)
+
+        from fastapi.testclient import TestClient
+        import backend_api
+        client = TestClient(backend_api.app)
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    result = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "tag": args.tag,
+        "config": {
+            key: getattr(args, key)
+            for key in ("mills", "employees", "days", "endpoints", "requests",
+                        "concurrency", "llm_latency", "llm_jitter", "llm_share",
+                        "bypass_cache", "seed", "url")
+        },
+        "setup_seconds": round(setup_seconds, 2),
+        "endpoints": {},
+    }
+
+    with client:
+        for endpoint in endpoints:
+            workload = build_workload(
+                endpoint, args.requests, mills, args.employees, args.days,
+                args.llm_share, args.seed, args.bypass_cache,
+            )
+            result["endpoints"][endpoint] = run_phase(client, workload, args.concurrency)
+
+    result["peak_rss_mb"] = peak_rss_mb()
+    if args.trace_memory:
+        result["traced_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        tracemalloc.stop()
+
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    stamp = result["timestamp"].replace(":", "").replace("-", "")
+    out_file = output / f"bench-{stamp}{'-' + args.tag if args.tag else ''}.json"
+    out_file.write_text(json.dumps(result, indent=2))
+
+    print_report(result)
+    print(f"\nsaved {out_file}")
+
+    if args.compare:
+        compare(result, json.loads(Path(args.compare).read_text()))
+
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+SQLite stand-in for the mill databases
+Purpose:
+- One SQLite file per mill with a synthetic AttendanceReport
+  (employees × days, realistic Work_Type / Work_HR mix)
+- Queried through core.sql_dialect (T-SQL rewritten to SQLite)
+- install() swaps core.db.get_conn and core.db.fetch_schema_columns
+  and keeps the monthly rollups and replicas next to the SQLite files
+"""
+
+import datetime
+import random
+import sqlite3
+from pathlib import Path
+
+from core.sql_dialect import SQLiteConnection
+
+# Column layout mirrors the production AttendanceReport
+ATTENDANCE_COLUMNS = [
+    ("ECode", "varchar"),
+    ("OrgECode", "varchar"),
+    ("EName", "varchar"),
+    ("UName", "varchar"),
+    ("Dept_Code", "int"),
+    ("DeptName", "varchar"),
+    ("SecCode", "int"),
+    ("SecName", "varchar"),
+    ("mch1_code", "varchar"),
+    ("mch2_code", "varchar"),
+    ("mch3_code", "varchar"),
+    ("Job1_Code", "varchar"),
+    ("Job2_Code", "varchar"),
+    ("M_Designation", "varchar"),
+    ("M_Department", "varchar"),
+    ("Work_Type", "varchar"),
+    ("WShift", "varchar"),
+    ("WTime", "varchar"),
+    ("MainShift", "varchar"),
+    ("WDate", "date"),
+    ("Work_HR", "decimal"),
+    ("DUTY", "int"),
+]
+
+_SQLITE_TYPES = {"varchar": "TEXT", "int": "INTEGER", "date": "TEXT", "decimal": "REAL"}
+
+DEPARTMENTS = {
+    1: "JUTE", 2: "BATCHING", 3: "CARDING", 4: "DRAWING", 5: "SPINNING",
+    6: "WINDING", 7: "WEAVING SACKING", 8: "MILL MECHANIC", 9: "BEAMING",
+    10: "WEAVING HESSIAN", 11: "FINISHING", 12: "SEWING",
+}
+
+# (Work_Type, weight, Work_HR choices)
+WORK_TYPES = [
+    ("RG", 80, (8,)),
+    ("VOUCHER", 10, (8, 4)),
+    ("SO", 5, (8, 16)),
+    ("WO", 5, (8, 16)),
+]
+
+MILL_PREFIXES = {"shjm": "H", "sgjm": "G", "mijm": "I"}
+
+
+# ============================================================
+# SYNTHETIC DATA
+# ============================================================
+
+def _employees(mill: str, count: int, rng: random.Random):
+    prefix = MILL_PREFIXES.get(mill, "X")
+    for n in range(1, count + 1):
+        dept = rng.randint(1, len(DEPARTMENTS))
+        yield {
+            "ECode": f"{prefix}{n:05d}",
+            "EName": f"EMPLOYEE {prefix}{n:05d}",
+            "Dept_Code": dept,
+            "DeptName": DEPARTMENTS[dept],
+            "SecCode": dept * 10 + rng.randint(1, 3),
+            "Shift": rng.choice("ABC"),
+        }
+
+
+def seed_database(path, mill: str, employees: int = 500, days: int = 90,
+                  seed: int = 0, end_date: datetime.date = None) -> int:
+    """
+    (Re)creates an AttendanceReport for one mill.
+    Rows cover `days` days ending at end_date (default today).
+    Returns the number of rows written.
+    """
+    rng = random.Random(f"{seed}:{mill}")
+    end_date = end_date or datetime.date.today()
+
+    path = Path(path)
+    if path.exists():
+        path.unlink()
+
+    conn = sqlite3.connect(str(path))
+    columns = ", ".join(f"{name} {_SQLITE_TYPES[t]}" for name, t in ATTENDANCE_COLUMNS)
+    conn.execute(f"CREATE TABLE AttendanceReport ({columns})")
+
+    placeholders = ", ".join("?" for _ in ATTENDANCE_COLUMNS)
+    insert = f"INSERT INTO AttendanceReport VALUES ({placeholders})"
+
+    types = [t for t, _, _ in WORK_TYPES]
+    weights = [w for _, w, _ in WORK_TYPES]
+    hours = {t: h for t, _, h in WORK_TYPES}
+
+    roster = list(_employees(mill, employees, rng))
+    total = 0
+    batch = []
+
+    for offset in range(days - 1, -1, -1):
+        wdate = (end_date - datetime.timedelta(days=offset)).isoformat()
+
+        # Sundays are mostly off
+        if datetime.date.fromisoformat(wdate).weekday() == 6 and rng.random() < 0.9:
+            continue
+
+        for emp in roster:
+            if rng.random() > 0.88:
+                continue
+            work_type = rng.choices(types, weights)[0]
+            batch.append((
+                emp["ECode"], emp["ECode"], emp["EName"], "system",
+                emp["Dept_Code"], emp["DeptName"],
+                emp["SecCode"], f"SECTION {emp['SecCode']}",
+                f"M{rng.randint(1, 400):03d}", None, None,
+                f"J{emp['Dept_Code']:02d}", None,
+                "WORKER", emp["DeptName"],
+                work_type, emp["Shift"], "06:00", emp["Shift"],
+                wdate, float(rng.choice(hours[work_type])), 1,
+            ))
+            if len(batch) >= 10000:
+                conn.executemany(insert, batch)
+                total += len(batch)
+                batch = []
+
+    if batch:
+        conn.executemany(insert, batch)
+        total += len(batch)
+
+    for column in ("WDate", "ECode", "Dept_Code"):
+        conn.execute(f"CREATE INDEX ix_{column} ON AttendanceReport ({column})")
+
+    conn.commit()
+    conn.close()
+    return total
+
+
+# ============================================================
+# INSTALL INTO core.db
+# ============================================================
+
+def install(data_dir, mills=None, employees: int = 500, days: int = 90,
+            seed: int = 0, reuse: bool = False) -> dict:
+    """
+    Seeds one SQLite file per mill and points core.db at them.
+
+    Returns {mill: path}.
+    """
+    import core.db as db
+    import core.replica as replica
+    import core.rollups as rollups
+
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = {}
+    for mill in mills or list(db.MILL_DB_MAP):
+        path = data_dir / f"{mill}.sqlite"
+        if not (reuse and path.exists()):
+            seed_database(path, mill, employees, days, seed)
+            # Rollups / replicas of previously seeded data are stale
+            for derived in ("rollups", "replica"):
+                for stale in (data_dir / derived).glob(f"{mill}.sqlite*"):
+                    stale.unlink()
+        paths[mill] = path
+
+    def get_conn(mill: str):
+        return SQLiteConnection(paths[db.normalize_mill(mill)])
+
+    def fetch_schema_columns(table_names, mill: str):
+        conn = sqlite3.connect(str(paths[db.normalize_mill(mill)]))
+        try:
+            declared = dict(ATTENDANCE_COLUMNS)
+            columns = {}
+            for table in table_names:
+                info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+                columns[table] = [(row[1], declared.get(row[1], row[2])) for row in info]
+            return columns
+        finally:
+            conn.close()
+
+    rollups.ROLLUP_DIR = data_dir / "rollups"
+    replica.REPLICA_DIR = data_dir / "replica"
+    db.get_conn = get_conn
+    db.fetch_schema_columns = fetch_schema_columns
+    db.close_all_pools()
+    db.invalidate_schema_cache()
+
+    return paths
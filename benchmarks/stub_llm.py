@@ -0,0 +1,161 @@
+"""
+Stub LLM
+Purpose:
+- Deterministic replacement for core.llm_engine.client / async_client
+- Configurable latency (base + jitter) to mimic the OpenAI round trip
+- Answers with the same JSON contract as the real model
+
+Answers:
+- Questions in CANNED_ANSWERS get their canned SQL
+- Questions the fast-path matcher understands get its SQL
+  (what a correct model would return)
+- Anything else gets the FAIL-SAFE "unsupported" JSON
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from core.intent_matcher import match_intent
+
+# Questions outside the fast path (exercise the full LLM path)
+CANNED_ANSWERS = {
+    "department wise attendance today": {
+        "sql": (
+            "SELECT Dept_Code, DeptName, SUM(Work_HR) / 8 AS Present "
+            "FROM AttendanceReport WHERE WDate = CAST(GETDATE() AS DATE) "
+            "GROUP BY Dept_Code, DeptName ORDER BY Dept_Code"
+        ),
+        "params": [],
+    },
+    "shift wise attendance yesterday": {
+        "sql": (
+            "SELECT WShift, COUNT(DISTINCT ECode) AS Employees "
+            "FROM AttendanceReport WHERE WDate = CAST(GETDATE()-1 AS DATE) "
+            "GROUP BY WShift ORDER BY WShift"
+        ),
+        "params": [],
+    },
+    "monthly man days this year": {
+        "sql": (
+            "SELECT MONTH(WDate) AS mon, SUM(Work_HR) / 8 AS Man_Days "
+            "FROM AttendanceReport WHERE YEAR(WDate) = YEAR(GETDATE()) "
+            "GROUP BY MONTH(WDate) ORDER BY mon"
+        ),
+        "params": [],
+    },
+    "top 20 employees by overtime hours": {
+        "sql": (
+            "SELECT TOP 20 ECode, EName, SUM(Work_HR) AS Hours "
+            "FROM AttendanceReport WHERE Work_Type IN (?, ?) "
+            "GROUP BY ECode, EName ORDER BY Hours DESC"
+        ),
+        "params": ["SO", "WO"],
+    },
+    "delete all attendance": {
+        "sql": "DELETE FROM AttendanceReport",
+        "params": [],
+    },
+}
+
+UNSUPPORTED = {
+    "unsupported": True,
+    "message": "This query is not supported yet. We will work on that.",
+}
+
+
+def extract_question(prompt: str) -> str:
+    """Pulls the user question back out of a prompt from build_prompt()."""
+    tail = prompt.rsplit("USER QUESTION:", 1)[-1]
+    return tail.split("Return ONLY valid JSON", 1)[0].strip()
+
+
+def answer_for(question: str) -> dict:
+    canned = CANNED_ANSWERS.get(question.lower().strip().rstrip(" ?.!"))
+    if canned is not None:
+        return canned
+
+    matched = match_intent(question)
+    if matched is not None:
+        return matched[1]
+
+    return UNSUPPORTED
+
+
+def _completion(kwargs) -> SimpleNamespace:
+    prompt = kwargs["messages"][-1]["content"]
+    content = json.dumps(answer_for(extract_question(prompt)))
+
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        # Rough token estimate (~4 characters per token)
+        usage=SimpleNamespace(
+            prompt_tokens=len(prompt) // 4,
+            completion_tokens=len(content) // 4,
+        ),
+    )
+
+
+class _Latency:
+    """Base latency plus uniform jitter, reproducible per seed."""
+
+    def __init__(self, latency: float, jitter: float, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def next(self) -> float:
+        with self._lock:
+            self.calls += 1
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+
+class _Completions:
+    def __init__(self, latency: _Latency, is_async: bool):
+        self._latency = latency
+        self._async = is_async
+
+    def create(self, **kwargs):
+        if self._async:
+            return self._create_async(kwargs)
+        time.sleep(self._latency.next())
+        return _completion(kwargs)
+
+    async def _create_async(self, kwargs):
+        await asyncio.sleep(self._latency.next())
+        return _completion(kwargs)
+
+
+class StubLLMClient:
+    """
+    Mimics the parts of OpenAI / AsyncOpenAI used by core.llm_engine:
+    client.chat.completions.create(**kwargs)
+    """
+
+    def __init__(self, latency: float = 0.8, jitter: float = 0.2,
+                 seed: int = 0, is_async: bool = False, timing: _Latency = None):
+        self.timing = timing or _Latency(latency, jitter, seed)
+        self.chat = SimpleNamespace(completions=_Completions(self.timing, is_async))
+
+    @property
+    def calls(self) -> int:
+        return self.timing.calls
+
+
+def install_stub_llm(latency: float = 0.8, jitter: float = 0.2, seed: int = 0):
+    """
+    Replaces core.llm_engine.client and async_client with stubs
+    sharing one latency model. Returns the sync stub.
+    """
+    import core.llm_engine as llm_engine
+
+    sync_client = StubLLMClient(latency, jitter, seed)
+    llm_engine.client = sync_client
+    llm_engine.async_client = StubLLMClient(timing=sync_client.timing, is_async=True)
+
+    return sync_client
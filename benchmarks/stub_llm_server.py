@@ -0,0 +1,207 @@
+"""
+Stub OpenAI-compatible server
+Purpose:
+- Serve POST /v1/chat/completions over HTTP with the stub LLM's
+  answers (benchmarks.stub_llm), so the real OpenAI client and the
+  resilience layer (timeouts, retries, hedging, circuit breaker)
+  can be exercised end to end, offline
+- Inject provider trouble: slow tail, 5xx errors, invalid JSON,
+  or a full outage
+
+Usage:
+    python -m benchmarks.stub_llm_server --port 8900 \\
+        --latency 0.8 --slow-rate 0.05 --slow-latency 20 --error-rate 0.1
+
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=stub \\
+        uvicorn backend_api:app
+
+The fault settings can be changed while running:
+    curl -X POST localhost:8900/faults -d '{"down": true}'
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.stub_llm import answer_for, extract_question
+
+
+class Faults:
+    """Latency model and injected failures (shared by all requests)."""
+
+    FIELDS = (
+        "latency", "jitter", "slow_rate", "slow_latency",
+        "error_rate", "invalid_json_rate", "down",
+    )
+
+    def __init__(self, latency=0.8, jitter=0.2, slow_rate=0.0, slow_latency=20.0,
+                 error_rate=0.0, invalid_json_rate=0.0, down=False, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.invalid_json_rate = invalid_json_rate
+        self.down = down
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def update(self, changes: dict):
+        with self._lock:
+            for name, value in changes.items():
+                if name not in self.FIELDS:
+                    raise ValueError(f"Unknown fault setting: {name}")
+                setattr(self, name, type(getattr(self, name))(value))
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.FIELDS} | {"requests": self.requests}
+
+    def draw(self):
+        """(delay seconds, outcome) for the next request."""
+        with self._lock:
+            self.requests += 1
+            r = self._random.random
+            if self.down:
+                return 0.0, "error"
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            if r() < self.slow_rate:
+                delay = self.slow_latency
+            if r() < self.error_rate:
+                return delay, "error"
+            if r() < self.invalid_json_rate:
+                return delay, "invalid_json"
+            return delay, "ok"
+
+
+def completion_body(request: dict, content: str) -> dict:
+    prompt = request["messages"][-1]["content"]
+    return {
+        "id": f"chatcmpl-stub-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        # Rough token estimate (~4 characters per token)
+        "usage": {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (len(prompt) + len(content)) // 4,
+        },
+    }
+
+
+def make_handler(faults: Faults):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _send(self, status: int, body: dict):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                # Client gave up (timeout / hedge won)
+                pass
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if self.path == "/faults":
+                self._send(200, faults.as_dict())
+            else:
+                self._send(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if self.path == "/faults":
+                try:
+                    faults.update(self._read_json())
+                except (ValueError, TypeError) as e:
+                    self._send(400, {"error": {"message": str(e)}})
+                    return
+                self._send(200, faults.as_dict())
+                return
+
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send(404, {"error": {"message": "not found"}})
+                return
+
+            request = self._read_json()
+            delay, outcome = faults.draw()
+            time.sleep(delay)
+
+            if outcome == "error":
+                self._send(503, {"error": {"message": "stub: service unavailable",
+                                           "type": "server_error"}})
+                return
+
+            if outcome == "invalid_json":
+                content = "Sure! Here is the SQL you asked for."
+            else:
+                prompt = request["messages"][-1]["content"]
+                content = json.dumps(answer_for(extract_question(prompt)))
+
+            self._send(200, completion_body(request, content))
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def serve(host: str, port: int, faults: Faults) -> ThreadingHTTPServer:
+    """Starts the server on a background thread and returns it."""
+    server = ThreadingHTTPServer((host, port), make_handler(faults))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-llm-server", daemon=True).start()
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.8, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.0,
+                        help="share of requests taking --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=20.0, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share answered with 503")
+    parser.add_argument("--invalid-json-rate", type=float, default=0.0,
+                        help="share answered with non-JSON text")
+    parser.add_argument("--down", action="store_true", help="answer every request with 503")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    faults = Faults(
+        latency=args.latency, jitter=args.jitter,
+        slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+        error_rate=args.error_rate, invalid_json_rate=args.invalid_json_rate,
+        down=args.down, seed=args.seed,
+    )
+    server = serve(args.host, args.port, faults)
+    print(f"Stub LLM on http://{args.host}:{args.port}/v1  faults={faults.as_dict()}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
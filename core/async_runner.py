@@ -0,0 +1,277 @@
+"""
+Async query runner.
+
+Same safety pipeline as core.query_runner.handle_question, but:
+- LLM calls use the async OpenAI client (no thread held while waiting)
+- Blocking pyodbc work runs on a bounded, dedicated executor
+- Separate per-mill concurrency limits for LLM and DB work
+- Identical concurrent LLM calls are coalesced (core.single_flight)
+
+Purpose:
+- /query concurrency scales without starving the
+  cheap non-LLM analytics endpoints of worker threads
+"""
+
+import asyncio
+import copy
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+
+from core.db import normalize_mill
+from core.intent_matcher import match_intent
+from core.llm_engine import (
+    generate_sql_from_question_async,
+    get_cached_sql,
+    llm_cache_key,
+    store_cached_sql,
+)
+from core.llm_resilience import LLMUnavailableError
+from core.metrics import time_stage
+from core.single_flight import LLM_FLIGHTS, SINGLE_FLIGHT_LLM_TIMEOUT
+from core.query_runner import (
+    check_llm_result,
+    execute_sql,
+    failure_response,
+    is_cacheable_llm_result,
+    load_schema_context,
+    stream_sql,
+)
+
+# -------------------------
+# Concurrency settings
+# -------------------------
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "16"))
+LLM_CONCURRENCY_PER_MILL = int(os.getenv("LLM_CONCURRENCY_PER_MILL", "8"))
+DB_CONCURRENCY_PER_MILL = int(os.getenv("DB_CONCURRENCY_PER_MILL", "4"))
+
+# Dedicated threads for blocking DB calls
+# (separate from the web server's own threadpool)
+_DB_EXECUTOR = ThreadPoolExecutor(
+    max_workers=DB_EXECUTOR_WORKERS,
+    thread_name_prefix="smarteye-db",
+)
+
+# event loop → {(kind, mill): asyncio.Semaphore}
+# (semaphores belong to the loop they are used on)
+_LIMITS = weakref.WeakKeyDictionary()
+_LIMITS_LOCK = threading.Lock()
+
+
+def _limit(kind: str, mill: str) -> asyncio.Semaphore:
+    """
+    Per-mill semaphore for "llm" or "db" work on the running loop.
+    Unknown mills raise ValueError (core.db.normalize_mill), so only
+    configured mills get a semaphore.
+    """
+    key = (kind, normalize_mill(mill))
+    loop = asyncio.get_running_loop()
+
+    with _LIMITS_LOCK:
+        limits = _LIMITS.get(loop)
+        if limits is None:
+            limits = _LIMITS[loop] = {}
+
+        sem = limits.get(key)
+        if sem is None:
+            size = LLM_CONCURRENCY_PER_MILL if kind == "llm" else DB_CONCURRENCY_PER_MILL
+            sem = limits[key] = asyncio.Semaphore(size)
+
+    return sem
+
+
+async def run_db(mill: str, func, *args, **kwargs):
+    """
+    Runs a blocking DB function on the DB executor,
+    limited to DB_CONCURRENCY_PER_MILL calls per mill.
+    """
+    async with _limit("db", mill):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _DB_EXECUTOR, partial(func, *args, **kwargs)
+        )
+
+
+def shutdown_executor():
+    """Stops the DB executor (application shutdown)."""
+    _DB_EXECUTOR.shutdown(wait=False)
+
+
+# ============================================================
+# MAIN ENTRY POINT
+# ============================================================
+
+async def resolve_question_async(
+    question: str,
+    mill: str,
+    use_cache: bool = True,
+):
+    """
+    Async equivalent of core.query_runner.resolve_question.
+    Returns (source, llm_result).
+    """
+
+    # STEP 1️⃣ : Fast path (pure CPU, microseconds)
+    with time_stage("fast_path", mill):
+        matched = match_intent(question)
+
+    if matched is not None:
+        return "rule", matched[1]
+
+    # STEP 1️⃣b : schema (cached; DB only on a miss)
+    with time_stage("schema", mill):
+        schema_text, schema_fp = await run_db(mill, load_schema_context, mill)
+
+    # STEP 2️⃣ : LLM (cached or async call)
+    if use_cache:
+        with time_stage("llm_cache", mill):
+            cached = get_cached_sql(question, mill, schema_fp)
+        if cached is not None:
+            return "llm_cache", cached
+
+    async def generate():
+        async with _limit("llm", mill):
+            with time_stage("llm", mill):
+                result = await generate_sql_from_question_async(
+                    question,
+                    schema_text
+                )
+        # Validated before caching: a bad answer is not served again
+        if is_cacheable_llm_result(result):
+            store_cached_sql(question, mill, schema_fp, result)
+        return result
+
+    # The same question asked concurrently shares one LLM call
+    try:
+        llm_result = await LLM_FLIGHTS.run_async(
+            llm_cache_key(question, mill, schema_fp), generate, SINGLE_FLIGHT_LLM_TIMEOUT
+        )
+    except LLMUnavailableError:
+        # Circuit open: a cached answer beats none (even if bypassed)
+        cached = get_cached_sql(question, mill, schema_fp)
+        if cached is None:
+            raise
+        return "llm_cache", cached
+
+    return "llm", copy.deepcopy(llm_result)
+
+
+async def handle_question_async(
+    question: str,
+    mill: str = "hastings",
+    use_cache: bool = True,
+    page_size: int = None,
+    page_token: str = None,
+    result_format: str = "records",
+):
+    """
+    Async equivalent of core.query_runner.handle_question.
+    Returns exactly the same response shapes.
+    """
+
+    source = None
+
+    try:
+        # Unknown mills fail here, before any per-mill limit
+        mill = normalize_mill(mill)
+
+        # STEPS 1️⃣–2️⃣ : fast path / cached LLM / LLM
+        source, llm_result = await resolve_question_async(
+            question, mill, use_cache
+        )
+
+        # STEPS 3️⃣–4️⃣ : contract + safety validation
+        response, sql, params = check_llm_result(
+            question, mill, llm_result, source
+        )
+        if response is not None:
+            return response
+
+        # STEPS 5️⃣–6️⃣ : execution on the DB executor
+        return await run_db(
+            mill, execute_sql, question, mill, source, sql, params,
+            use_cache, page_size, page_token, result_format
+        )
+
+    except Exception as e:
+        return failure_response(question, mill, source, e)
+
+
+# ============================================================
+# STREAMING
+# ============================================================
+
+def _close_iterator(iterator, step):
+    """Closes a blocking iterator once its in-flight next() has returned."""
+    if step is not None:
+        wait([step])
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        close()
+
+
+async def iterate_on_db_executor(mill: str, iterator):
+    """
+    Drives a blocking iterator (e.g. stream_sql) from the DB executor,
+    yielding its items asynchronously.
+
+    The iterator holds a DB connection until exhausted or closed, so
+    the mill's DB limit is held for the whole stream.
+    """
+    loop = asyncio.get_running_loop()
+    done = object()
+    step = None
+
+    async with _limit("db", mill):
+        try:
+            while True:
+                step = _DB_EXECUTOR.submit(next, iterator, done)
+                item = await asyncio.wrap_future(step)
+                if item is done:
+                    break
+                yield item
+        finally:
+            # Releases the pooled connection if the client went away.
+            # Closed on the executor, after any next() still running
+            # there (cancelling the await does not stop the thread).
+            await asyncio.shield(loop.run_in_executor(
+                _DB_EXECUTOR, _close_iterator, iterator, step
+            ))
+
+
+async def stream_question_async(
+    question: str,
+    mill: str = "hastings",
+    use_cache: bool = True,
+):
+    """
+    Resolves the question, then streams its rows.
+
+    Yields the same items as core.query_runner.stream_sql.
+    If nothing is executed (unsupported / blocked / failed), yields
+    one {"type": "result", ...} item carrying the usual response.
+    """
+
+    source = None
+
+    try:
+        mill = normalize_mill(mill)
+        source, llm_result = await resolve_question_async(
+            question, mill, use_cache
+        )
+        response, sql, params = check_llm_result(
+            question, mill, llm_result, source
+        )
+    except Exception as e:
+        response = failure_response(question, mill, source, e)
+
+    if response is not None:
+        yield {"type": "result", **response}
+        return
+
+    async for item in iterate_on_db_executor(
+        mill, stream_sql(question, mill, source, sql, params)
+    ):
+        yield item
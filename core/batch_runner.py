@@ -0,0 +1,103 @@
+"""
+Batch query runner
+Purpose:
+- Answer many (question, mill) pairs in one request
+- Identical questions (same normalized text and mill) run once
+- Items run concurrently, at most BATCH_CONCURRENCY_PER_MILL at a
+  time per mill (on top of the global per-mill LLM / DB limits)
+- A failing item yields the usual failure response; the rest of
+  the batch is unaffected
+- Mill "all" items fan out to every mill (core.fanout)
+"""
+
+import asyncio
+import os
+import time
+
+from core.async_runner import handle_question_async
+from core.fanout import handle_question_all_mills_async, is_all_mills
+from core.llm_engine import normalize_question
+from core.query_runner import failure_response
+
+# Max items accepted per batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "200"))
+# Concurrent questions per mill within one batch
+BATCH_CONCURRENCY_PER_MILL = int(os.getenv("BATCH_CONCURRENCY_PER_MILL", "4"))
+
+
+def batch_key(question: str, mill: str) -> tuple:
+    """Items with the same key are answered once."""
+    return normalize_question(question), str(mill).lower().strip()
+
+
+async def handle_batch_async(
+    items,
+    use_cache: bool = True,
+    result_format: str = "records",
+):
+    """
+    Runs a batch of {"question", "mill"} items.
+
+    Returns:
+    {
+        "results": [
+            {"index": int, "question": str, "mill": str,
+             "result": {...}}   (handle_question response shape)
+        ],
+        "items": int,
+        "unique": int,          (questions actually run)
+        "seconds": float
+    }
+
+    Results are in request order; duplicates share their result.
+    """
+    items = list(items)
+    if len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f"Batch too large: {len(items)} items (max {BATCH_MAX_ITEMS})")
+
+    started = time.perf_counter()
+
+    # key → first item with that key
+    unique = {}
+    for item in items:
+        unique.setdefault(batch_key(item["question"], item["mill"]), item)
+
+    limits = {}
+
+    async def run(item):
+        mill = str(item["mill"]).lower().strip()
+        limit = limits.setdefault(mill, asyncio.Semaphore(BATCH_CONCURRENCY_PER_MILL))
+        async with limit:
+            try:
+                if is_all_mills(mill):
+                    return await handle_question_all_mills_async(
+                        item["question"],
+                        use_cache=use_cache,
+                        result_format=result_format,
+                    )
+                return await handle_question_async(
+                    item["question"],
+                    item["mill"],
+                    use_cache=use_cache,
+                    result_format=result_format,
+                )
+            except Exception as e:
+                return failure_response(item["question"], item["mill"], None, e)
+
+    answers = await asyncio.gather(*(run(item) for item in unique.values()))
+    by_key = dict(zip(unique, answers))
+
+    return {
+        "results": [
+            {
+                "index": index,
+                "question": item["question"],
+                "mill": item["mill"],
+                "result": by_key[batch_key(item["question"], item["mill"])],
+            }
+            for index, item in enumerate(items)
+        ],
+        "items": len(items),
+        "unique": len(unique),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,91 @@
+"""
+In-memory cache primitives
+Purpose:
+- Bounded LRU cache with per-entry TTL
+- Hit / miss / eviction counters for monitoring
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Sentinel for "not in cache" (None is a valid cached value)
+MISSING = object()
+
+
+class LRUTTLCache:
+    """
+    Thread-safe LRU cache where every entry also expires
+    after `ttl` seconds (or a per-entry ttl passed to set()).
+    """
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 3600.0):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        # key → (value, expires_at_monotonic)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        """Returns the cached value, or `default` if missing/expired."""
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = item
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            # Mark as most recently used
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """Stores a value, evicting least recently used entries."""
+        ttl = self.ttl if ttl is None else ttl
+
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -4,17 +4,27 @@ DB utilities for SmartEye Attendance Bot
 Responsibilities:
 - Load environment variables
 - Create SQL Server connection (mill-specific)
-- Fetch schema metadata
+- Pool connections per mill
+- Fetch schema metadata (cached per mill)
 - Test database connectivity
 """
 
 # -------------------------
 # Standard imports
 # -------------------------
+import hashlib
 import os
+import threading
+import time
+from contextlib import contextmanager
+
 import pyodbc
 from dotenv import load_dotenv
 
+from core.db_pool import ConnectionPool
+from core.metrics import record_rows, time_stage
+from core.query_governor import query_timeout, statement_timeout
+
 # -------------------------
 # Load environment variables
 # -------------------------
@@ -40,17 +50,28 @@ MILL_DB_MAP = {
     "mijm": "Smart_Eye_Jute_STIL_India_Live",
 }
 
+# -------------------------
+# Connection pool settings (per mill)
+# -------------------------
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+DB_POOL_HEALTH_CHECK_AFTER = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "30"))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "10"))
+
+# -------------------------
+# Schema cache settings
+# -------------------------
+# Schema changes a couple of times a year; refresh hourly by default
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "3600"))
+
 # ============================================================
 # DATABASE CONNECTION
 # ============================================================
 
-def get_conn(mill: str):
+def normalize_mill(mill: str) -> str:
     """
-    Creates and returns a SQL Server connection
-    for the given mill.
-
-    Safety:
-    - Only predefined mills are allowed
+    Normalizes a mill name and rejects unknown mills.
     """
 
     # Normalize input
@@ -60,6 +81,22 @@ def get_conn(mill: str):
     if mill not in MILL_DB_MAP:
         raise ValueError(f"Invalid mill name: {mill}")
 
+    return mill
+
+
+def get_conn(mill: str):
+    """
+    Creates and returns a NEW SQL Server connection
+    for the given mill.
+
+    Prefer db_connection(), which reuses pooled connections.
+
+    Safety:
+    - Only predefined mills are allowed
+    """
+
+    mill = normalize_mill(mill)
+
     # Build secure ODBC connection string
     conn_str = (
         f"DRIVER={{{DB_DRIVER}}};"
@@ -74,6 +111,72 @@ def get_conn(mill: str):
     # Return live DB connection
     return pyodbc.connect(conn_str)
 
+# ============================================================
+# CONNECTION POOLING
+# ============================================================
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(mill: str) -> ConnectionPool:
+    """
+    Returns the connection pool for a mill (created on first use).
+    """
+    mill = normalize_mill(mill)
+
+    with _POOLS_LOCK:
+        pool = _POOLS.get(mill)
+        if pool is None:
+            pool = ConnectionPool(
+                # Looked up at call time so get_conn can be swapped
+                lambda: get_conn(mill),
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                idle_timeout=DB_POOL_IDLE_TIMEOUT,
+                health_check_after=DB_POOL_HEALTH_CHECK_AFTER,
+                acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+            )
+            _POOLS[mill] = pool
+
+    return pool
+
+
+@contextmanager
+def db_connection(mill: str):
+    """
+    Checks out a pooled connection for the given mill:
+
+        with db_connection(mill) as conn:
+            cursor = conn.cursor()
+            ...
+
+    The connection is returned to the pool on exit
+    (or discarded if the block raised).
+    """
+    with get_pool(mill).connection() as conn:
+        yield conn
+
+
+def get_pool_stats() -> dict:
+    """
+    Open / idle / in-use connections per mill, plus cumulative
+    checkout hits (idle connection reused), misses (new connection
+    opened) and evictions.
+    """
+    with _POOLS_LOCK:
+        pools = dict(_POOLS)
+    return {mill: pool.stats() for mill, pool in pools.items()}
+
+
+def close_all_pools():
+    """Closes every pool (used on application shutdown)."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
+
 # ============================================================
 # CONNECTION TESTING
 # ============================================================
@@ -82,57 +185,159 @@ def test_db_connection(mill: str = "SHJM"):
     """
     Tests DB connectivity using a lightweight query.
     Used during app startup to fail fast if DB is down.
+    Also warms the mill's pool up to its minimum size.
     """
-    conn = get_conn(mill)
-    cursor = conn.cursor()
+    pool = get_pool(mill)
+    pool.warm_up()
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("SELECT 1")  # minimal safe query
-    cursor.fetchone()
+        cursor.execute("SELECT 1")  # minimal safe query
+        cursor.fetchone()
 
-    conn.close()
     return True
 
 # ============================================================
 # SCHEMA EXTRACTION (FOR LLM CONTEXT)
 # ============================================================
 
-def get_schema_text(table_names, mill: str):
+# (mill, tables) → {"text", "fingerprint", "fetched_at"}
+_SCHEMA_CACHE = {}
+_SCHEMA_LOCK = threading.Lock()
+
+
+def schema_fingerprint(schema_text: str) -> str:
     """
-    Fetches column names and datatypes for given tables.
+    Short stable hash of a schema description.
+    Downstream caches key on it so they expire when the schema changes.
+    """
+    return hashlib.sha256(schema_text.encode("utf-8")).hexdigest()[:16]
 
-    Purpose:
-    - Helps LLM understand DB structure
-    - Prevents hallucinated column names
+
+def fetch_schema_columns(table_names, mill: str):
     """
+    Fetches column names and datatypes for ALL given tables
+    in a single INFORMATION_SCHEMA round trip.
 
-    conn = get_conn(mill)
-    cursor = conn.cursor()
+    Returns:
+    - {table_name: [(column, datatype), ...]} in ordinal order
+    """
 
-    lines = []
+    table_names = list(table_names)
+    columns = {table: [] for table in table_names}
 
-    for table in table_names:
-        lines.append(f"Table: {table}")
-        lines.append("Columns:")
+    if not table_names:
+        return columns
+
+    # Table names may differ in case from INFORMATION_SCHEMA
+    by_lower = {table.lower(): table for table in table_names}
+    placeholders = ", ".join("?" for _ in table_names)
+
+    with time_stage("schema_fetch", mill), db_connection(mill) as conn:
+        cursor = conn.cursor()
 
         # Query SQL Server metadata
         cursor.execute(
-            """
-            SELECT COLUMN_NAME, DATA_TYPE
+            f"""
+            SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE
             FROM INFORMATION_SCHEMA.COLUMNS
-            WHERE TABLE_NAME = ?
-            ORDER BY ORDINAL_POSITION
+            WHERE TABLE_NAME IN ({placeholders})
+            ORDER BY TABLE_NAME, ORDINAL_POSITION
             """,
-            table,
+            *table_names,
         )
 
+        for table, col, dtype in cursor.fetchall():
+            key = by_lower.get(str(table).lower())
+            if key is not None:
+                columns[key].append((col, dtype))
+
+    return columns
+
+
+def _load_schema(table_names, mill: str) -> dict:
+    """
+    Returns the cached schema entry, refreshing it when expired.
+    """
+
+    mill = normalize_mill(mill)
+    key = (mill, tuple(table_names))
+
+    with _SCHEMA_LOCK:
+        entry = _SCHEMA_CACHE.get(key)
+    if entry and time.monotonic() - entry["fetched_at"] < SCHEMA_CACHE_TTL:
+        return entry
+
+    columns = fetch_schema_columns(table_names, mill)
+
+    lines = []
+    for table in table_names:
+        lines.append(f"Table: {table}")
+        lines.append("Columns:")
+
         # Append each column definition
-        for col, dtype in cursor.fetchall():
+        for col, dtype in columns[table]:
             lines.append(f"- {col} ({dtype})")
 
         lines.append("")
 
-    conn.close()
-    return "\n".join(lines)
+    text = "\n".join(lines)
+    entry = {
+        "columns": columns,
+        "text": text,
+        "fingerprint": schema_fingerprint(text),
+        "fetched_at": time.monotonic(),
+    }
+
+    with _SCHEMA_LOCK:
+        _SCHEMA_CACHE[key] = entry
+
+    return entry
+
+
+def get_schema_text(table_names, mill: str):
+    """
+    Fetches column names and datatypes for given tables.
+
+    Purpose:
+    - Helps LLM understand DB structure
+    - Prevents hallucinated column names
+
+    Served from a per-mill cache (SCHEMA_CACHE_TTL seconds);
+    the database is only hit on first use or after expiry.
+    """
+    return _load_schema(table_names, mill)["text"]
+
+
+def get_schema_columns(table_names, mill: str) -> dict:
+    """
+    Cached {table: [(column, data_type), ...]} of the mill.
+    """
+    return _load_schema(table_names, mill)["columns"]
+
+
+def get_schema_fingerprint(table_names, mill: str) -> str:
+    """
+    Returns the fingerprint of the (cached) schema text.
+    """
+    return _load_schema(table_names, mill)["fingerprint"]
+
+
+def invalidate_schema_cache(mill: str = None) -> int:
+    """
+    Drops cached schema for one mill (or all mills).
+    Returns the number of entries removed.
+    """
+    if mill is not None:
+        mill = normalize_mill(mill)
+
+    with _SCHEMA_LOCK:
+        keys = [k for k in _SCHEMA_CACHE if mill is None or k[0] == mill]
+        for k in keys:
+            del _SCHEMA_CACHE[k]
+
+    return len(keys)
 
 # ============================================================
 # ANALYTICS HELPERS (NO LLM USED)
@@ -142,26 +347,40 @@ def get_employees_by_date_range(mill: str, start_date: str, end_date: str):
     """
     Returns list of employees who have attendance
     between given dates.
+
+    Served from the in-memory employee index (core.employee_index)
+    once it covers the range, else read from the local replica
+    (core.replica) or live.
     """
+    from core.employee_index import lookup_employees
+    from core.replica import analytics_connection
 
-    conn = get_conn(mill)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """
-        SELECT DISTINCT
-            ECode,
-            EName
-        FROM AttendanceReport
-        WHERE WDate BETWEEN ? AND ?
-        ORDER BY EName
-        """,
-        start_date,
-        end_date,
-    )
+    with time_stage("employees", mill):
+        indexed = lookup_employees(mill, start_date, end_date)
+    if indexed is not None:
+        record_rows(mill, "employees", len(indexed))
+        return indexed
+
+    with time_stage("employees", mill), analytics_connection(mill, end_date) as conn, \
+            statement_timeout(conn, query_timeout(mill)):
+        cursor = conn.cursor()
+
+        cursor.execute(
+            """
+            SELECT DISTINCT
+                ECode,
+                EName
+            FROM AttendanceReport
+            WHERE WDate BETWEEN ? AND ?
+            ORDER BY EName
+            """,
+            start_date,
+            end_date,
+        )
 
-    rows = cursor.fetchall()
-    conn.close()
+        rows = cursor.fetchall()
+
+    record_rows(mill, "employees", len(rows))
 
     # Convert DB rows to clean dictionaries
     return [
@@ -171,61 +390,37 @@ def get_employees_by_date_range(mill: str, start_date: str, end_date: str):
 
 def get_monthwise_attendance(mill: str, start_date: str, end_date: str, ecode: str):
     """
-    Calculates:
-    - Total working days per month
+    Calculates per (year, month):
+    - Total working days in the mill
     - Actual attendance days for an employee
+
+    Whole months come from the local rollups (core.rollups),
+    only edge months and the recent tail are read live.
     """
+    from core.rollups import monthwise_attendance
 
-    conn = get_conn(mill)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """
-        SELECT
-            A.mon,
-            A.work_days,
-            B.attn_days
-        FROM
-        (
-            -- Total working days in mill
-            SELECT
-                MONTH(WDate) AS mon,
-                COUNT(DISTINCT WDate) AS work_days
-            FROM AttendanceReport
-            WHERE WDate BETWEEN ? AND ?
-            GROUP BY MONTH(WDate)
-            HAVING SUM(DUTY) > 0
-        ) A
-        JOIN
-        (
-            -- Employee attendance days
-            SELECT
-                MONTH(WDate) AS mon,
-                COUNT(DISTINCT WDate) AS attn_days
-            FROM AttendanceReport
-            WHERE WDate BETWEEN ? AND ?
-              AND ECode = ?
-            GROUP BY MONTH(WDate)
-            HAVING SUM(DUTY) > 0
-        ) B
-        ON A.mon = B.mon
-        ORDER BY A.mon
-        """,
-        start_date,
-        end_date,
-        start_date,
-        end_date,
-        ecode,
-    )
+    with time_stage("monthwise", mill):
+        rows = monthwise_attendance(mill, start_date, end_date, ecode)
 
-    rows = cursor.fetchall()
-    conn.close()
+    record_rows(mill, "monthwise", len(rows))
 
-    return [
-        {
-            "mon": row[0],
-            "work_days": row[1],
-            "attn_days": row[2],
-        }
-        for row in rows
-    ]
+    return rows
+
+
+def iter_monthwise_attendance_bulk(mill: str, start_date: str, end_date: str, ecodes=None):
+    """
+    Month-wise attendance of every employee (or the given ECodes)
+    from one grouped scan; rows are yielded as they are built.
+
+    Rows: {"ECode", "year", "mon", "work_days", "attn_days"}
+    """
+    from core.rollups import monthwise_attendance_bulk
+
+    rows = 0
+    try:
+        with time_stage("monthwise_bulk", mill):
+            for row in monthwise_attendance_bulk(mill, start_date, end_date, ecodes):
+                rows += 1
+                yield row
+    finally:
+        record_rows(mill, "monthwise_bulk", rows)
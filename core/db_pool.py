@@ -0,0 +1,233 @@
+"""
+Connection Pool
+Purpose:
+- Reuse SQL Server connections instead of paying a full
+  TLS/login handshake on every request
+- Cap concurrent connections per mill (prevents login storms)
+- Health-check connections on checkout
+- Evict connections that sat idle for too long
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeoutError(RuntimeError):
+    """Raised when no connection becomes available in time."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections for ONE database.
+
+    Parameters:
+    - factory             : zero-arg callable returning a new connection
+    - min_size            : connections kept open even when idle
+    - max_size            : hard cap on open connections
+    - idle_timeout        : seconds before an idle connection is closed
+    - health_check_after  : idle seconds after which a connection is
+                            pinged ("SELECT 1") before being handed out
+    - acquire_timeout     : seconds to wait for a free connection
+    """
+
+    def __init__(
+        self,
+        factory,
+        min_size: int = 1,
+        max_size: int = 10,
+        idle_timeout: float = 300.0,
+        health_check_after: float = 30.0,
+        acquire_timeout: float = 10.0,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size configuration")
+
+        self._factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.acquire_timeout = acquire_timeout
+
+        # Idle connections as (conn, last_used_monotonic)
+        self._idle = deque()
+        # Connections currently open (idle + checked out)
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Cumulative checkout / eviction counts (see stats())
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # --------------------------------------------------------
+    # Internal helpers
+    # --------------------------------------------------------
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle_locked(self):
+        """Close idle connections above min_size that expired."""
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size:
+            conn, last_used = self._idle[0]
+            if now - last_used < self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self.evictions += 1
+            self._close_quietly(conn)
+
+    # --------------------------------------------------------
+    # Public API
+    # --------------------------------------------------------
+
+    def acquire(self):
+        """
+        Checks out a healthy connection.
+        Opens a new one if the pool is below max_size,
+        otherwise waits up to acquire_timeout.
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+
+                self._evict_idle_locked()
+
+                if self._idle:
+                    # Most recently used first (warmest connection)
+                    conn, last_used = self._idle.pop()
+                    stale = time.monotonic() - last_used >= self.health_check_after
+                    self.hits += 1
+                elif self._size < self.max_size:
+                    # Reserve a slot, connect outside the lock
+                    self._size += 1
+                    self.misses += 1
+                    conn, stale = None, False
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            "Timed out waiting for a database connection"
+                        )
+                    self._cond.wait(remaining)
+                    continue
+
+            if conn is None:
+                try:
+                    return self._factory()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if not stale or self._is_healthy(conn):
+                return conn
+
+            # Broken connection: drop it and try again
+            self._discard(conn)
+
+    def release(self, conn):
+        """Returns a connection to the pool."""
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                self._close_quietly(conn)
+                return
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn):
+        """Closes a connection that must not be reused."""
+        self._close_quietly(conn)
+        with self._cond:
+            self._size -= 1
+            self.evictions += 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager:
+
+            with pool.connection() as conn:
+                ...
+
+        If the block raises (or a generator holding the connection
+        is closed early), the connection is discarded instead of
+        being returned to the pool.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self._discard(conn)
+            raise
+        else:
+            # Never hand out a connection with an open transaction
+            try:
+                conn.rollback()
+            except Exception:
+                self._discard(conn)
+                return
+            self.release(conn)
+
+    def warm_up(self):
+        """Opens connections until min_size is reached."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._factory()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            self.release(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "open": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def close(self):
+        """Closes all idle connections and rejects new checkouts."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._size -= 1
+                self._close_quietly(conn)
+            self._cond.notify_all()
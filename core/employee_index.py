@@ -0,0 +1,328 @@
+"""
+Employee directory index
+Purpose:
+- Keep every mill's employees in memory: ECode, EName, first and
+  last seen WDate and a per-day attendance bitmap
+- Answer /employees (who has attendance between two dates) and the
+  typeahead search without touching the database
+- Refresh incrementally in the background (only days since the
+  last refresh are read)
+
+The bitmap covers EMPLOYEE_INDEX_DAYS before the first build, so
+date-range membership is exact; older ranges are read live.
+Rows deleted at source are only dropped by a full rebuild.
+"""
+
+import datetime
+import os
+import threading
+import time
+
+from core.db import db_connection, normalize_mill
+from core.logger import log_event
+from core.metrics import time_stage
+from core.query_governor import statement_timeout
+
+# -------------------------
+# Index settings
+# -------------------------
+EMPLOYEE_INDEX_ENABLED = os.getenv("EMPLOYEE_INDEX_ENABLED", "1") == "1"
+# Days of history loaded by a full build
+EMPLOYEE_INDEX_DAYS = int(os.getenv("EMPLOYEE_INDEX_DAYS", "730"))
+# Seconds between background refreshes per mill
+EMPLOYEE_INDEX_REFRESH_INTERVAL = float(os.getenv("EMPLOYEE_INDEX_REFRESH_INTERVAL", "300"))
+# Statement timeout of index queries (a full build reads the whole history)
+EMPLOYEE_INDEX_TIMEOUT = int(os.getenv("EMPLOYEE_INDEX_TIMEOUT", "600"))
+# Largest typeahead result
+EMPLOYEE_SEARCH_MAX_RESULTS = int(os.getenv("EMPLOYEE_SEARCH_MAX_RESULTS", "50"))
+
+
+def _as_date(value) -> datetime.date:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def _sort_key(entry: dict):
+    return (str(entry["EName"] or "").casefold(), str(entry["ECode"]))
+
+# ============================================================
+# INDEX
+# ============================================================
+
+class EmployeeIndex:
+    """
+    In-memory directory of one mill.
+
+    entries: ECode → {"ECode", "EName", "first", "last", "days"}
+    where bit i of "days" is set if the employee has attendance
+    on origin + i days.
+    """
+
+    def __init__(self, mill: str):
+        self.mill = mill
+        self.entries = {}
+        self.origin = None       # first indexed day
+        self.watermark = None    # last refreshed day
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._scheduled_at = None
+
+    @property
+    def ready(self) -> bool:
+        return self.origin is not None
+
+    # -------------------------
+    # Refresh
+    # -------------------------
+    def refresh(self, full: bool = False) -> dict:
+        """
+        Reads the days since the watermark (the watermark day is read
+        again, it may have grown) up to today; full=True rebuilds.
+        """
+        with self._refresh_lock:
+            today = datetime.date.today()
+            rebuild = full or not self.ready
+            origin = today - datetime.timedelta(days=EMPLOYEE_INDEX_DAYS) if rebuild else self.origin
+            since = origin if rebuild else self.watermark
+
+            entries = {} if rebuild else None
+            updates = {}
+            rows = 0
+
+            with time_stage("employee_index_refresh", self.mill), \
+                    db_connection(self.mill) as conn, \
+                    statement_timeout(conn, EMPLOYEE_INDEX_TIMEOUT):
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT DISTINCT ECode, EName, WDate
+                    FROM AttendanceReport
+                    WHERE WDate >= ? AND WDate <= ?
+                    """,
+                    since.isoformat(),
+                    today.isoformat(),
+                )
+
+                while True:
+                    batch = cursor.fetchmany(5000)
+                    if not batch:
+                        break
+                    rows += len(batch)
+                    for ecode, ename, wdate in batch:
+                        day = _as_date(wdate)
+                        update = updates.get(ecode)
+                        if update is None:
+                            update = updates[ecode] = {
+                                "EName": ename, "first": day, "last": day, "days": 0,
+                                "name_day": day,
+                            }
+                        update["first"] = min(update["first"], day)
+                        update["last"] = max(update["last"], day)
+                        update["days"] |= 1 << (day - origin).days
+                        # Latest spelling of the name wins
+                        if day >= update["name_day"]:
+                            update["EName"], update["name_day"] = ename, day
+
+            with self._lock:
+                if rebuild:
+                    self.entries = entries
+                    self.origin = origin
+                for ecode, update in updates.items():
+                    entry = self.entries.get(ecode)
+                    if entry is None:
+                        self.entries[ecode] = {
+                            "ECode": ecode,
+                            "EName": update["EName"],
+                            "first": update["first"],
+                            "last": update["last"],
+                            "days": update["days"],
+                        }
+                        continue
+                    if update["last"] >= entry["last"]:
+                        entry["EName"] = update["EName"]
+                    entry["first"] = min(entry["first"], update["first"])
+                    entry["last"] = max(entry["last"], update["last"])
+                    entry["days"] |= update["days"]
+                self.watermark = today
+                self.refreshed_at = time.time()
+
+        return {
+            "mill": self.mill,
+            "full": rebuild,
+            "from": since.isoformat(),
+            "to": today.isoformat(),
+            "rows": rows,
+            "employees": len(self.entries),
+        }
+
+    def schedule_refresh(self):
+        """Background refresh, at most every EMPLOYEE_INDEX_REFRESH_INTERVAL."""
+        now = time.monotonic()
+        with self._lock:
+            if self._scheduled_at is not None and \
+                    now - self._scheduled_at < EMPLOYEE_INDEX_REFRESH_INTERVAL:
+                return
+            self._scheduled_at = now
+
+        def run():
+            try:
+                result = self.refresh()
+                log_event("employee_index_refreshed", result)
+            except Exception as e:
+                log_event(
+                    "employee_index_refresh_error",
+                    {"mill": self.mill, "error": str(e)},
+                    level="error",
+                )
+
+        threading.Thread(
+            target=run, name=f"smarteye-employees-{self.mill}", daemon=True
+        ).start()
+
+    # -------------------------
+    # Lookups
+    # -------------------------
+    def covers(self, start, end) -> bool:
+        return self.ready and self.origin <= start and end <= self.watermark
+
+    def _present(self, entry: dict, start, end) -> bool:
+        if entry["last"] < start or entry["first"] > end:
+            return False
+        low = (start - self.origin).days
+        width = (end - start).days + 1
+        return bool((entry["days"] >> low) & ((1 << width) - 1))
+
+    def between(self, start, end) -> list:
+        """Employees with attendance in [start, end], ordered by name."""
+        with self._lock:
+            found = [e for e in self.entries.values() if self._present(e, start, end)]
+        found.sort(key=_sort_key)
+        return [{"ECode": e["ECode"], "EName": e["EName"]} for e in found]
+
+    def search(self, query: str, limit: int, start=None, end=None) -> list:
+        """
+        Typeahead: ECode / name prefix matches first, then substring
+        matches; optionally only employees present in [start, end].
+        """
+        needle = query.strip().casefold()
+        if not needle:
+            return []
+
+        ranked = []
+        with self._lock:
+            for entry in self.entries.values():
+                code = str(entry["ECode"]).casefold()
+                name = str(entry["EName"] or "").casefold()
+
+                if code == needle:
+                    rank = 0
+                elif code.startswith(needle):
+                    rank = 1
+                elif name.startswith(needle):
+                    rank = 2
+                elif any(word.startswith(needle) for word in name.split()):
+                    rank = 3
+                elif needle in code or needle in name:
+                    rank = 4
+                else:
+                    continue
+
+                if start is not None and not self._present(entry, start, end):
+                    continue
+                ranked.append((rank, _sort_key(entry), entry))
+
+        ranked.sort(key=lambda item: item[:2])
+        return [
+            {
+                "ECode": entry["ECode"],
+                "EName": entry["EName"],
+                "first_seen": entry["first"].isoformat(),
+                "last_seen": entry["last"].isoformat(),
+            }
+            for _, _, entry in ranked[:limit]
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "employees": len(self.entries),
+            "origin": self.origin.isoformat() if self.origin else None,
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "refreshed_at": self.refreshed_at,
+        }
+
+# ============================================================
+# PER-MILL REGISTRY
+# ============================================================
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_employee_index(mill: str) -> EmployeeIndex:
+    mill = normalize_mill(mill)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(mill)
+        if index is None:
+            index = _INDEXES[mill] = EmployeeIndex(mill)
+    return index
+
+
+def lookup_employees(mill: str, start_date, end_date):
+    """
+    Employees with attendance between the dates from the index,
+    or None when the index does not cover the range yet
+    (the caller then runs the live query).
+    """
+    if not EMPLOYEE_INDEX_ENABLED:
+        return None
+
+    index = get_employee_index(mill)
+    index.schedule_refresh()
+
+    start, end = _as_date(start_date), _as_date(end_date)
+    if start > end:
+        return []
+
+    if not index.ready:
+        return None
+
+    # Days after the last refresh had no data at refresh time
+    end = min(end, index.watermark)
+    if start > end or not index.covers(start, end):
+        return None
+
+    return index.between(start, end)
+
+
+def search_employees(mill: str, query: str, limit: int = 20,
+                     start_date=None, end_date=None) -> list:
+    """
+    Top `limit` employees whose ECode / EName match `query`
+    (optionally only those present between the dates).
+
+    Raises ValueError while the index is still being built.
+    """
+    index = get_employee_index(mill)
+    index.schedule_refresh()
+    if not index.ready:
+        raise ValueError("Employee index is still being built, retry shortly")
+
+    limit = max(1, min(int(limit), EMPLOYEE_SEARCH_MAX_RESULTS))
+    start = end = None
+    if start_date and end_date:
+        start, end = _as_date(start_date), _as_date(end_date)
+        start, end = max(start, index.origin), min(end, index.watermark)
+        if start > end:
+            return []
+
+    return index.search(query, limit, start, end)
+
+
+def get_employee_index_stats() -> dict:
+    with _INDEXES_LOCK:
+        indexes = dict(_INDEXES)
+    return {mill: index.stats() for mill, index in indexes.items()}
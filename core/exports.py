@@ -0,0 +1,110 @@
+"""
+Report exports
+Purpose:
+- Serialize a stream of row dicts as NDJSON, CSV or Excel (.xlsx)
+- NDJSON / CSV are produced incrementally (constant memory)
+- Excel uses openpyxl's write-only mode and a spooled temp file
+- A streamed export that fails midway ends with an error trailer
+"""
+
+import csv
+import io
+import json
+import tempfile
+
+from core.logger import log_event
+
+EXPORT_NDJSON = "ndjson"
+EXPORT_CSV = "csv"
+EXPORT_XLSX = "xlsx"
+
+EXPORT_MEDIA_TYPES = {
+    EXPORT_NDJSON: "application/x-ndjson",
+    EXPORT_CSV: "text/csv; charset=utf-8",
+    EXPORT_XLSX: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Spooled in memory up to this size, then on disk
+_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+def export_format(requested: str = None) -> str:
+    """
+    Validates an export format (default ndjson).
+    Raises ValueError for an unknown format.
+    """
+    fmt = (requested or EXPORT_NDJSON).lower().strip()
+    if fmt not in EXPORT_MEDIA_TYPES:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    return fmt
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
+
+
+def iter_csv(rows, columns, batch_size: int = 1000):
+    """
+    CSV text in chunks of `batch_size` rows (header first).
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def error_trailer(fmt: str, message: str) -> str:
+    """
+    Last chunk of a stream that failed after the 200 headers were sent:
+    - ndjson : {"type": "error", "message": ...}
+    - csv    : a "#ERROR,<message>" row
+    """
+    if fmt == EXPORT_CSV:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(["#ERROR", message])
+        return buffer.getvalue()
+    return json.dumps({"type": "error", "message": message}) + "\n"
+
+
+def iter_export(chunks, fmt: str):
+    """
+    Passes NDJSON / CSV chunks through; a failure ends the stream
+    in-band with error_trailer() instead of silently truncating it.
+    """
+    try:
+        yield from chunks
+    except Exception as e:
+        log_event("export_failed", {"format": fmt, "error": str(e)}, level="error")
+        yield error_trailer(fmt, str(e))
+
+
+def write_xlsx(rows, columns, sheet_title: str = "Report"):
+    """
+    Writes the rows to an .xlsx workbook.
+    Returns a file object positioned at the start.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title[:31])
+    sheet.append(list(columns))
+    for row in rows:
+        sheet.append([row.get(col) for col in columns])
+
+    out = tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES)
+    workbook.save(out)
+    out.seek(0)
+    return out
@@ -0,0 +1,183 @@
+"""
+Cross-mill fan-out
+Purpose:
+- Answer one question for every mill in MILL_DB_MAP (mill "all")
+- Resolve the SQL once (fast path / LLM cache / one LLM call,
+  against the first mill's schema) and execute it concurrently on
+  every mill's database (usual per-mill DB limits, row caps and
+  timeouts)
+- Merge the rows with a leading "Mill" column and report each mill's
+  status, rows and timing; one failing mill does not fail the others
+
+The mills share the AttendanceReport schema, so SQL generated for one
+runs on all of them. Pagination and streaming are single-mill only.
+"""
+
+import asyncio
+import time
+
+from core.async_runner import resolve_question_async, run_db
+from core.db import MILL_DB_MAP, normalize_mill
+from core.logger import log_event
+from core.query_runner import (
+    check_llm_result,
+    execute_sql,
+    failure_response,
+)
+from core.result_fetch import json_safe_values, row_count, to_columnar, to_records
+
+ALL_MILLS = "all"
+MILL_COLUMN = "Mill"
+
+
+def is_all_mills(mill) -> bool:
+    return str(mill).lower().strip() == ALL_MILLS
+
+
+def merge_colsets(parts) -> dict:
+    """
+    Concatenates [(mill, colset), ...] (same columns) into one column
+    set with a leading Mill column. A column whose type differs between
+    mills is merged as JSON-safe values.
+    """
+    first = parts[0][1]
+    columns = [MILL_COLUMN] + list(first["columns"])
+    types = [str]
+    values = [[mill for mill, colset in parts for _ in range(row_count(colset))]]
+
+    safe = {}
+    for i in range(len(first["columns"])):
+        kinds = {colset["types"][i] for _, colset in parts}
+        if len(kinds) == 1:
+            types.append(kinds.pop())
+            values.append([v for _, colset in parts for v in colset["values"][i]])
+            continue
+
+        merged = []
+        for mill, colset in parts:
+            if mill not in safe:
+                safe[mill] = json_safe_values(colset)
+            merged.extend(safe[mill][i])
+        types.append(None)
+        values.append(merged)
+
+    return {"columns": columns, "types": types, "values": values}
+
+
+async def handle_question_all_mills_async(
+    question: str,
+    use_cache: bool = True,
+    result_format: str = "records",
+    mills=None,
+):
+    """
+    Runs one question on every mill (or only `mills`).
+
+    Returns:
+    {
+        "status": "executed",
+        "mill": "all",
+        "source", "sql", "params",
+        "rows": int,
+        "data": ...,             (result_format, "Mill" column first)
+        "truncated": bool,       (some mill hit its row cap)
+        "mills": [
+            {"mill", "status": "executed" | "blocked" | "failed",
+             "rows", "seconds", "cached", "truncated", "replica",
+             "error"}            (error only when not executed)
+        ],
+        "seconds": float
+    }
+
+    A question that cannot be answered (unsupported / blocked before
+    execution) gets the usual single-mill response; if every mill
+    fails, an "unsupported" response carrying "mills".
+    """
+    started = time.perf_counter()
+    mills = [normalize_mill(m) for m in (mills or MILL_DB_MAP)]
+    primary = mills[0]
+    source = None
+
+    # STEPS 1️⃣–4️⃣ : once, for all mills
+    try:
+        source, llm_result = await resolve_question_async(question, primary, use_cache)
+        response, sql, params = check_llm_result(question, primary, llm_result, source)
+    except Exception as e:
+        return failure_response(question, primary, source, e)
+
+    if response is not None:
+        return response
+
+    # STEPS 5️⃣–6️⃣ : every mill concurrently
+    async def run(mill):
+        began = time.perf_counter()
+        try:
+            result = await run_db(
+                mill, execute_sql, question, mill, source, sql, params,
+                use_cache, None, None, "arrow"
+            )
+            error = result.get("blocked_reason") or result.get("message")
+        except Exception as e:
+            failure_response(question, mill, source, e)
+            result, error = {"status": "failed"}, str(e)
+        return mill, result, error, round(time.perf_counter() - began, 3)
+
+    outcomes = await asyncio.gather(*(run(mill) for mill in mills))
+
+    parts, summary = [], []
+    for mill, result, error, seconds in outcomes:
+        entry = {"mill": mill, "seconds": seconds}
+
+        if result.get("status") == "executed" and parts and \
+                list(result["data"]["columns"]) != list(parts[0][1]["columns"]):
+            result, error = {"status": "failed"}, "Result columns differ from the other mills"
+
+        if result.get("status") == "executed":
+            parts.append((mill, result["data"]))
+            entry.update(
+                status="executed",
+                rows=result["rows"],
+                cached=result["cached"],
+                truncated=result["truncated"],
+                replica=result.get("replica", False),
+            )
+        else:
+            entry.update(
+                status="blocked" if result.get("status") == "generated" else "failed",
+                rows=0,
+                error=error,
+            )
+        summary.append(entry)
+
+    log_event(
+        "fanout_executed",
+        {"question": question, "source": source, "sql": sql, "mills": summary},
+    )
+
+    if not parts:
+        return {
+            "unsupported": True,
+            "message": "Query execution failed on every mill.",
+            "mills": summary,
+        }
+
+    colset = merge_colsets(parts)
+    if result_format == "columnar":
+        data = to_columnar(colset)
+    elif result_format == "arrow":
+        data = colset
+    else:
+        data = to_records(colset)
+
+    return {
+        "status": "executed",
+        "mill": ALL_MILLS,
+        "source": source,
+        "sql": sql,
+        "params": params,
+        "rows": row_count(colset),
+        "data": data,
+        "truncated": any(e.get("truncated") for e in summary),
+        "mills": summary,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
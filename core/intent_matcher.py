@@ -0,0 +1,365 @@
+"""
+Fast-path Intent Matcher
+Purpose:
+- Answer well-known question shapes WITHOUT calling the LLM
+- Produce the exact same {"sql", "params"} contract as the LLM
+- Mirror the patterns in llm/examples.md and llm/instructions.md
+
+Supported intents:
+- Employee attendance      (ECode [+ department] [+ date / range])
+- Department attendance    (department [+ date / range])
+- Outsider attendance      (VOUCHER man-days)
+- Double duty              (list / count)
+- Overtime                 (list / count)
+
+Anything not recognised word-for-word returns None,
+so the question falls back to the LLM.
+"""
+
+import os
+import re
+import threading
+from datetime import date
+
+# Allow switching the fast path off without a deploy
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "1") == "1"
+
+# ============================================================
+# REFERENCE DATA (from llm/instructions.md)
+# ============================================================
+
+# Authoritative department mapping
+DEPT_CODES = {
+    "jute": 1,
+    "batching": 2,
+    "carding": 3,
+    "drawing": 4,
+    "spinning": 5,
+    "winding": 6,
+    "weaving sacking": 7,
+    "mill mechanic": 8,
+    "beaming": 9,
+    "weaving hessian": 10,
+    "finishing": 11,
+    "sewing": 12,
+    "dornier weaving": 13,
+    "baling/press": 14,
+    "factory mechanic": 15,
+    "shipping": 16,
+    "weaving modern/rapier": 17,
+    "weaving s4a": 18,
+    "work shop": 19,
+    "power house & gen. house": 20,
+    "pump house": 21,
+    "boiler house": 22,
+    "s.q.c.": 24,
+    "general outside": 25,
+}
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+# Words that carry no meaning for the supported intents.
+# Any OTHER leftover word means "not understood" → use the LLM.
+FILLER_WORDS = {
+    "show", "me", "the", "display", "list", "give", "get", "all",
+    "attendance", "records", "record", "of", "for", "in", "on", "at",
+    "department", "dept", "employee", "emp", "ecode", "code",
+    "worker", "workers", "present", "are", "is", "were", "was",
+    "how", "many", "count", "total", "number", "a", "please",
+    "what", "details", "labour", "labours", "duty", "there",
+}
+
+COUNT_PHRASES = ("how many", "count", "total", "number of")
+
+# ============================================================
+# SQL TEMPLATES (identical to llm/examples.md)
+# ============================================================
+
+TODAY_SQL = "WDate = CAST(GETDATE() AS DATE)"
+YESTERDAY_SQL = "WDate = CAST(GETDATE()-1 AS DATE)"
+
+# ============================================================
+# PARSING HELPERS
+# ============================================================
+
+_DATE = (
+    r"(\d{1,2}[/-]\d{1,2}[/-]\d{4}"
+    r"|\d{1,2}(?:st|nd|rd|th)?\s+[a-z]{3,9}\.?,?\s+\d{4})"
+)
+_RANGE_RE = re.compile(
+    rf"\b(?:between|from)\s+{_DATE}\s+(?:to|and|till|until|-)\s+{_DATE}"
+)
+_SINGLE_DATE_RE = re.compile(rf"{_DATE}")
+# Bare 4-digit years (1900–2100) are not employee codes
+_ECODE_RE = re.compile(r"^(?!(?:19\d\d|20\d\d|2100)$)[a-z]{0,3}\d{3,}$")
+
+
+def _parse_date(text: str):
+    """
+    Parses DD/MM/YYYY, DD-MM-YYYY or '10 dec 2025' into ISO format.
+    Returns None if the date is not valid.
+    """
+    text = text.strip()
+
+    m = re.fullmatch(r"(\d{1,2})[/-](\d{1,2})[/-](\d{4})", text)
+    if m:
+        day, month, year = (int(g) for g in m.groups())
+    else:
+        m = re.fullmatch(
+            r"(\d{1,2})(?:st|nd|rd|th)?\s+([a-z]{3,9})\.?,?\s+(\d{4})", text
+        )
+        if not m or m.group(2)[:3] not in MONTHS:
+            return None
+        day, month, year = int(m.group(1)), MONTHS[m.group(2)[:3]], int(m.group(3))
+
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def _compact(text: str) -> str:
+    """Case- and space-insensitive form used for department names."""
+    return re.sub(r"\s+", "", text.lower())
+
+
+# Longest names first so "weaving hessian" wins over shorter names
+_DEPT_PATTERNS = [
+    (
+        re.compile(
+            r"(?<![a-z0-9])"
+            + r"\s*".join(re.escape(ch) for ch in _compact(name))
+            + r"(?![a-z0-9])"
+        ),
+        code,
+    )
+    for name, code in sorted(DEPT_CODES.items(), key=lambda kv: -len(kv[0]))
+]
+
+
+def _extract_departments(text: str):
+    codes = []
+    for pattern, code in _DEPT_PATTERNS:
+        if pattern.search(text):
+            codes.append(code)
+            text = pattern.sub(" ", text)
+    return codes, text
+
+
+# ============================================================
+# COVERAGE COUNTERS
+# ============================================================
+
+_STATS = {"matched": {}, "fallback": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def _record(intent):
+    with _STATS_LOCK:
+        if intent is None:
+            _STATS["fallback"] += 1
+        else:
+            _STATS["matched"][intent] = _STATS["matched"].get(intent, 0) + 1
+
+
+def get_fast_path_stats() -> dict:
+    """Matched questions per intent and LLM fallbacks."""
+    with _STATS_LOCK:
+        matched = dict(_STATS["matched"])
+        fallback = _STATS["fallback"]
+
+    total = sum(matched.values()) + fallback
+    return {
+        "matched": matched,
+        "fallback": fallback,
+        "coverage": (sum(matched.values()) / total) if total else 0.0,
+    }
+
+# ============================================================
+# MATCHER
+# ============================================================
+
+def _parse_question(question: str):
+    """
+    Breaks a question into recognised parts.
+    Returns None as soon as something is not understood.
+    """
+    text = question.lower().strip().rstrip(" ?.!")
+    parts = {"date": None, "range": None, "dept": None, "ecode": None}
+
+    # ---- Date range (DD/MM/YYYY, always day first) ----
+    ranges = _RANGE_RE.findall(text)
+    if len(ranges) > 1:
+        return None
+    if ranges:
+        start, end = (_parse_date(d) for d in ranges[0])
+        if not start or not end:
+            return None
+        parts["range"] = (start, end)
+        text = _RANGE_RE.sub(" ", text)
+
+    # ---- Single date / relative date ----
+    singles = _SINGLE_DATE_RE.findall(text)
+    relative = re.findall(r"\b(today|yesterday)\b", text)
+    if len(singles) + len(relative) + bool(ranges) > 1:
+        return None
+    if singles:
+        parts["date"] = _parse_date(singles[0])
+        if not parts["date"]:
+            return None
+        text = _SINGLE_DATE_RE.sub(" ", text)
+    elif relative:
+        parts["date"] = relative[0]
+        text = re.sub(r"\b(today|yesterday)\b", " ", text)
+
+    # ---- Department ----
+    depts, text = _extract_departments(text)
+    if len(depts) > 1:
+        return None
+    if depts:
+        parts["dept"] = depts[0]
+
+    # ---- Intent keywords ----
+    is_count = any(re.search(rf"\b{p}\b", text) for p in COUNT_PHRASES)
+
+    intents = set()
+    for pattern, intent in (
+        (r"\b(outsiders?|voucher)\b", "outsider"),
+        (r"\b(double\s+duty|dd)\b", "double_duty"),
+        (r"\b(overtime|ot)\b", "overtime"),
+    ):
+        if re.search(pattern, text):
+            intents.add(intent)
+            text = re.sub(pattern, " ", text)
+    if len(intents) > 1:
+        return None
+
+    # ---- Remaining words: one optional ECode + filler only ----
+    for token in re.findall(r"[a-z0-9&./]+", text):
+        token = token.strip("./")
+        if not token or token in FILLER_WORDS:
+            continue
+        if _ECODE_RE.match(token) and parts["ecode"] is None:
+            parts["ecode"] = token.upper()
+            continue
+        return None
+
+    parts["intent"] = intents.pop() if intents else "attendance"
+    parts["count"] = is_count
+    return parts
+
+
+def _filters(parts, leading):
+    """
+    Builds the AND-ed WHERE filters in the order used by the examples:
+    leading filters → Dept_Code → WDate.
+    """
+    clauses, params = list(leading[0]), list(leading[1])
+
+    if parts["dept"] is not None:
+        clauses.append("Dept_Code = ?")
+        params.append(parts["dept"])
+
+    if parts["range"]:
+        clauses.append("WDate BETWEEN ? AND ?")
+        params.extend(parts["range"])
+    elif parts["date"] == "today":
+        clauses.append(TODAY_SQL)
+    elif parts["date"] == "yesterday":
+        clauses.append(YESTERDAY_SQL)
+    elif parts["date"]:
+        clauses.append("WDate = ?")
+        params.append(parts["date"])
+
+    return " AND ".join(clauses), params
+
+
+def match_intent(question: str):
+    """
+    Tries to answer a question deterministically.
+
+    Returns:
+    - (intent_name, {"sql": ..., "params": [...]}) on a match
+    - None if the LLM must handle the question
+    """
+    if not FAST_PATH_ENABLED:
+        return None
+
+    parts = _parse_question(question)
+    result = _build(parts) if parts else None
+
+    intent = result[0] if result else None
+    _record(intent)
+    return result
+
+
+def _build(parts):
+    intent = parts["intent"]
+
+    # Only attendance can be filtered by employee
+    if parts["ecode"] and intent != "attendance":
+        return None
+
+    if intent == "outsider":
+        where, params = _filters(parts, (["Work_Type = ?"], ["VOUCHER"]))
+        return "outsider", {
+            "sql": (
+                "SELECT SUM(Work_HR) / 8 AS Outsider_Present "
+                f"FROM AttendanceReport WHERE {where}"
+            ),
+            "params": params,
+        }
+
+    if intent == "overtime":
+        where, params = _filters(parts, (["Work_Type IN (?, ?)"], ["SO", "WO"]))
+        if parts["count"]:
+            return "overtime_count", {
+                "sql": (
+                    "SELECT SUM(WORK_HR)/8 AS Overtime_Count "
+                    f"FROM AttendanceReport WHERE {where}"
+                ),
+                "params": params,
+            }
+        return "overtime_list", {
+            "sql": f"SELECT * FROM AttendanceReport WHERE {where}",
+            "params": params,
+        }
+
+    if intent == "double_duty":
+        where, params = _filters(
+            parts, (["Work_Type NOT IN (?, ?)"], ["SO", "WO"])
+        )
+        having = "HAVING SUM(Work_HR) > ? AND SUM(Work_HR) <= ?"
+        params = params + [8, 16]
+        if parts["count"]:
+            return "double_duty_count", {
+                "sql": (
+                    "SELECT COUNT(*) AS Double_Duty_Count FROM "
+                    "(SELECT WDate, ECode FROM AttendanceReport "
+                    f"WHERE {where} GROUP BY WDate, ECode {having}) t"
+                ),
+                "params": params,
+            }
+        return "double_duty_list", {
+            "sql": (
+                "SELECT wdate, ECode FROM AttendanceReport "
+                f"WHERE {where} GROUP BY WDate, ECode {having}"
+            ),
+            "params": params,
+        }
+
+    # Plain attendance needs an employee or a department,
+    # and counting attendance is left to the LLM
+    if parts["count"] or (parts["ecode"] is None and parts["dept"] is None):
+        return None
+
+    leading = (["ECode = ?"], [parts["ecode"]]) if parts["ecode"] else ([], [])
+    where, params = _filters(parts, leading)
+    name = "employee_attendance" if parts["ecode"] else "department_attendance"
+    return name, {
+        "sql": f"SELECT * FROM AttendanceReport WHERE {where}",
+        "params": params,
+    }
@@ -3,15 +3,70 @@ LLM Engine
 Purpose:
 - Converts natural language questions into SQL JSON
 - Uses strict instructions + schema + examples
+- Keeps the static prompt parts in memory (hot-reloaded on file change)
+- Caches LLM results for repeated questions
+- Calls go through core.llm_resilience (deadline, retries,
+  hedging, circuit breaker)
 """
 
 import os
+import re
+import copy
 import json
+import hashlib
+import threading
+import time
 from pathlib import Path
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+
+from core.cache import LRUTTLCache
+from core.llm_resilience import LLMInvalidJSONError, call_llm, call_llm_async
+from core.metrics import record_llm_usage
+from core.prompt_selector import (
+    ExampleIndex,
+    estimate_tokens,
+    parse_column_hints,
+    parse_examples,
+    select_examples,
+    select_schema,
+)
 
 # Initialize OpenAI client using API key
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# (OPENAI_BASE_URL points it elsewhere, e.g. benchmarks/stub_llm_server.py;
+# retries are done by core.llm_resilience)
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+# Async client for the async request pipeline (core.async_runner)
+async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+# Model + fixed messages shared by sync and async calls
+LLM_MODEL = "gpt-4o-mini"
+SYSTEM_MESSAGE = "You generate SQL only."
+
+# Prompt files live in <repo>/llm
+PROMPT_DIR = Path(__file__).resolve().parent.parent / "llm"
+PROMPT_FILES = {
+    "instructions": "instructions.md",
+    "rules": "sql_rules.md",
+    "examples": "examples.md",
+}
+
+# Minimum seconds between mtime checks of the prompt files
+PROMPT_RELOAD_CHECK_INTERVAL = float(
+    os.getenv("PROMPT_RELOAD_CHECK_INTERVAL", "5")
+)
+
+# Prompt slimming: only relevant examples / schema columns
+PROMPT_SLIMMING = os.getenv("PROMPT_SLIMMING", "0") == "1"
+PROMPT_EXAMPLES_TOP_K = int(os.getenv("PROMPT_EXAMPLES_TOP_K", "6"))
+# Whole-prompt token budget for slim prompts (0 = no budget)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "0"))
+# Non-mandatory schema columns kept per question (0 = all matches)
+PROMPT_MAX_EXTRA_COLUMNS = int(os.getenv("PROMPT_MAX_EXTRA_COLUMNS", "0"))
+
+# LLM result cache (question → SQL JSON)
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
 
 # ============================================================
 # LOAD PROMPT FILES
@@ -27,58 +82,268 @@ def load_llm_files():
     These guide the LLM to behave safely.
     """
 
-    base = Path(__file__).resolve().parent.parent / "llm"
-
     return {
-        "instructions": (base / "instructions.md").read_text(encoding="utf-8"),
-        "rules": (base / "sql_rules.md").read_text(encoding="utf-8"),
-        "examples": (base / "examples.md").read_text(encoding="utf-8"),
+        key: (PROMPT_DIR / name).read_text(encoding="utf-8")
+        for key, name in PROMPT_FILES.items()
     }
 
 # ============================================================
-# GENERATE SQL FROM USER QUESTION
+# PROMPT TEMPLATE CACHE
 # ============================================================
 
-def generate_sql_from_question(question: str, schema_text: str):
-    """
-    Sends structured prompt to LLM and returns parsed JSON.
+# Pre-assembled static prompt parts + file mtimes they were built from
+_PROMPT_CACHE = {
+    "mtimes": None,
+    "checked_at": 0.0,
+    "head": None,
+    "middle": None,
+    "version": None,
+    # Prompt slimming
+    "preamble": None,
+    "index": None,
+    "hints": None,
+}
+_EXAMPLES_PREFIX = """
+
+        EXAMPLES:
+        """
+_QUESTION_PREFIX = """
+
+        USER QUESTION:
+        """
+_PROMPT_LOCK = threading.Lock()
+
+
+def _prompt_mtimes():
+    return tuple(
+        (PROMPT_DIR / name).stat().st_mtime_ns
+        for name in PROMPT_FILES.values()
+    )
 
-    Output format enforced:
-    {
-        "sql": "...",
-        "params": []
-    }
-    """
 
+def _assemble_prompt_cache(mtimes):
+    """
+    Reads the prompt files once and pre-builds everything
+    around the per-request SCHEMA and USER QUESTION slots.
+    """
     files = load_llm_files()
 
-    # Construct prompt with strict structure
-    prompt = f"""
+    head = f"""
         {files['instructions']}
 
         {files['rules']}
 
         SCHEMA:
-        {schema_text}
+        """
+    middle = _EXAMPLES_PREFIX + files["examples"] + _QUESTION_PREFIX
 
-        EXAMPLES:
-        {files['examples']}
+    preamble, examples = parse_examples(files["examples"])
+
+    digest = hashlib.sha256()
+    for key in PROMPT_FILES:
+        digest.update(files[key].encode("utf-8"))
+        digest.update(b"\0")
+    # Slimming settings change the prompts, so they are part of the version
+    digest.update(repr(slimming_config()).encode("utf-8"))
+
+    _PROMPT_CACHE.update(
+        mtimes=mtimes,
+        checked_at=time.monotonic(),
+        head=head,
+        middle=middle,
+        version=digest.hexdigest()[:16],
+        preamble=preamble,
+        index=ExampleIndex(examples),
+        hints=parse_column_hints(files["instructions"]),
+    )
+
+
+def _get_prompt_cache(force_reload: bool = False) -> dict:
+    """
+    Returns the in-memory prompt parts.
+    Re-reads the files only when their mtimes changed
+    (checked at most every PROMPT_RELOAD_CHECK_INTERVAL seconds).
+    """
+    with _PROMPT_LOCK:
+        now = time.monotonic()
+        due = now - _PROMPT_CACHE["checked_at"] >= PROMPT_RELOAD_CHECK_INTERVAL
+
+        if force_reload or _PROMPT_CACHE["head"] is None or due:
+            mtimes = _prompt_mtimes()
+            if force_reload or mtimes != _PROMPT_CACHE["mtimes"]:
+                _assemble_prompt_cache(mtimes)
+            else:
+                _PROMPT_CACHE["checked_at"] = now
+
+        return dict(_PROMPT_CACHE)
+
+
+def reload_prompt_files() -> str:
+    """
+    Forces a reload of the prompt files.
+    Returns the new prompt version.
+    """
+    return _get_prompt_cache(force_reload=True)["version"]
+
+
+def get_prompt_version() -> str:
+    """
+    Hash of the current prompt files.
+    Changes whenever instructions, rules or examples change,
+    so it can be used as a cache key for LLM output.
+    """
+    return _get_prompt_cache()["version"]
+
+
+def slimming_config() -> dict:
+    return {
+        "enabled": PROMPT_SLIMMING,
+        "top_k": PROMPT_EXAMPLES_TOP_K,
+        "token_budget": PROMPT_TOKEN_BUDGET,
+        "max_extra_columns": PROMPT_MAX_EXTRA_COLUMNS,
+    }
+
+
+def build_slim_prompt(question: str, schema_text: str) -> str:
+    """
+    Prompt with all instructions and rules, but only the schema
+    columns and the top-k examples relevant to the question.
+    """
+    cache = _get_prompt_cache()
+
+    schema = select_schema(
+        schema_text, question, cache["hints"], PROMPT_MAX_EXTRA_COLUMNS
+    )
+    tail = f"""{question}
+
+        Return ONLY valid JSON.
+    """
+    fixed = (
+        cache["head"] + schema + _EXAMPLES_PREFIX + cache["preamble"]
+        + _QUESTION_PREFIX + tail
+    )
+
+    examples = select_examples(
+        cache["index"],
+        question,
+        PROMPT_EXAMPLES_TOP_K,
+        PROMPT_TOKEN_BUDGET,
+        estimate_tokens(fixed),
+    )
+    examples_text = "\n\n---\n\n".join(e["text"] for e in examples)
+
+    return (
+        cache["head"]
+        + schema
+        + _EXAMPLES_PREFIX
+        + cache["preamble"] + "\n\n" + examples_text
+        + _QUESTION_PREFIX
+        + tail
+    )
 
-        USER QUESTION:
-        {question}
+
+def build_prompt(question: str, schema_text: str, slim: bool = None) -> str:
+    """
+    Assembles the full prompt from the cached static parts.
+    With slimming (PROMPT_SLIMMING or slim=True) see build_slim_prompt.
+    """
+    if PROMPT_SLIMMING if slim is None else slim:
+        return build_slim_prompt(question, schema_text)
+
+    cache = _get_prompt_cache()
+
+    return (
+        cache["head"]
+        + schema_text
+        + cache["middle"]
+        + f"""{question}
 
         Return ONLY valid JSON.
     """
+    )
+
+# ============================================================
+# LLM RESULT CACHE
+# ============================================================
+
+# Relative dates are emitted as GETDATE() expressions, so cached
+# SQL stays correct across days. Entries are keyed on the schema
+# fingerprint and prompt version, so schema/prompt edits miss.
+_LLM_CACHE = LRUTTLCache(maxsize=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL)
+
+
+def normalize_question(question: str) -> str:
+    """
+    Canonical form of a question for cache lookups:
+    case-insensitive, whitespace-collapsed, trailing punctuation dropped.
+    """
+    text = re.sub(r"\s+", " ", question.strip().lower())
+    return text.rstrip(" ?.!")
+
+
+def llm_cache_key(question: str, mill: str, schema_fp: str) -> tuple:
+    return (
+        normalize_question(question),
+        mill.lower().strip(),
+        schema_fp,
+        get_prompt_version(),
+    )
+
+
+def get_cached_sql(question: str, mill: str, schema_fp: str):
+    """
+    Returns a cached LLM result (a fresh copy) or None.
+    """
+    cached = _LLM_CACHE.get(llm_cache_key(question, mill, schema_fp), None)
+    return copy.deepcopy(cached) if cached is not None else None
+
+
+def store_cached_sql(question: str, mill: str, schema_fp: str, llm_result: dict):
+    """
+    Caches a parsed LLM result. Non-dict output is never cached.
+    """
+    if isinstance(llm_result, dict):
+        _LLM_CACHE.set(
+            llm_cache_key(question, mill, schema_fp),
+            copy.deepcopy(llm_result),
+        )
+
+
+def get_llm_cache_stats() -> dict:
+    return _LLM_CACHE.stats()
+
+
+def clear_llm_cache():
+    _LLM_CACHE.clear()
+
+# ============================================================
+# GENERATE SQL FROM USER QUESTION
+# ============================================================
 
-    # Call OpenAI chat completion
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "You generate SQL only."},
+def _chat_request(question: str, schema_text: str, slim: bool = None) -> dict:
+    """
+    Keyword arguments for chat.completions.create (sync or async).
+    """
+
+    # Construct prompt with strict structure
+    prompt = build_prompt(question, schema_text, slim)
+
+    return {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_MESSAGE},
             {"role": "user", "content": prompt}
         ],
-        temperature=0  # deterministic output
-    )
+        "temperature": 0  # deterministic output
+    }
+
+
+def parse_llm_response(response):
+    """
+    Extracts and parses the JSON answer of a chat completion
+    (and counts its prompt / completion tokens).
+    """
+    record_llm_usage(getattr(response, "usage", None))
 
     raw = response.choices[0].message.content.strip()
 
@@ -86,6 +351,38 @@ def generate_sql_from_question(question: str, schema_text: str):
     try:
         parsed = json.loads(raw)
     except json.JSONDecodeError:
-        raise ValueError(f"LLM returned invalid JSON: {raw}")
+        raise LLMInvalidJSONError(f"LLM returned invalid JSON: {raw}")
 
     return parsed
+
+
+def generate_sql_from_question(question: str, schema_text: str):
+    """
+    Sends structured prompt to LLM and returns parsed JSON.
+
+    Output format enforced:
+    {
+        "sql": "...",
+        "params": []
+    }
+    """
+
+    # Call OpenAI chat completion (deadline / retries / breaker)
+    return call_llm(
+        lambda **kwargs: client.chat.completions.create(**kwargs),
+        _chat_request(question, schema_text),
+        parse_llm_response,
+    )
+
+
+async def generate_sql_from_question_async(question: str, schema_text: str):
+    """
+    Async version of generate_sql_from_question.
+    Does not block the event loop while waiting for the LLM.
+    """
+
+    return await call_llm_async(
+        lambda **kwargs: async_client.chat.completions.create(**kwargs),
+        _chat_request(question, schema_text),
+        parse_llm_response,
+    )
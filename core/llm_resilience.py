@@ -0,0 +1,371 @@
+"""
+Resilient LLM calls
+Purpose:
+- Bound every SQL-generation call by a deadline (LLM_DEADLINE)
+- Retry transient provider errors and invalid JSON with jittered
+  exponential backoff, within the deadline
+- Optionally hedge: send a second identical request when the first
+  is slower than the observed p95 (or LLM_HEDGE_DELAY), first
+  answer wins
+- Circuit breaker: after LLM_BREAKER_FAILURES failed calls in a row
+  the LLM is skipped for LLM_BREAKER_COOLDOWN seconds (one probe
+  call then decides); questions are still answered by the fast path
+  and the LLM cache
+
+Used by core.llm_engine for both the sync and the async client.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import openai
+
+from core.logger import log_event
+
+# -------------------------
+# Resilience settings
+# -------------------------
+# Seconds one generate_sql call may take, retries included
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "4"))
+# Hedged second request (doubles the cost of slow calls)
+LLM_HEDGING = os.getenv("LLM_HEDGING", "0") == "1"
+# Seconds before hedging, or "p95" of recent call latencies
+LLM_HEDGE_DELAY = os.getenv("LLM_HEDGE_DELAY", "p95")
+# Hedge delay until enough latencies are observed / lower bound
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "3"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# Latencies kept for the hedge p95
+_LATENCY_WINDOW = 200
+_LATENCY_MIN_SAMPLES = 20
+
+# Sync hedging runs the attempts on these threads
+_HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="smarteye-llm")
+
+
+class LLMInvalidJSONError(ValueError):
+    """The model answered, but not with valid JSON (retried)."""
+
+
+class LLMUnavailableError(RuntimeError):
+    """The circuit breaker is open: the LLM is not called."""
+
+
+def is_provider_failure(error: Exception) -> bool:
+    """Timeouts, connection errors, rate limits and 5xx responses."""
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError,
+                          openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409) or error.status_code >= 500
+    return False
+
+
+def is_retryable(error: Exception) -> bool:
+    return is_provider_failure(error) or isinstance(error, LLMInvalidJSONError)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry `attempt` (0-based)."""
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+
+# ============================================================
+# CIRCUIT BREAKER
+# ============================================================
+
+class CircuitBreaker:
+    """
+    closed    : calls go through; consecutive failures are counted
+    open      : calls are refused until the cooldown has passed
+    half-open : one probe call; success closes, failure re-opens
+    """
+
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._consecutive = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.cooldown:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def record(self, failed: bool):
+        with self._lock:
+            self._probing = False
+            if not failed:
+                self._consecutive = 0
+                self._opened_at = None
+                return
+
+            self._consecutive += 1
+            if self._opened_at is not None or self._consecutive >= self.failures:
+                opened = self._opened_at is None
+                self._opened_at = time.monotonic()
+                if opened:
+                    log_event(
+                        "llm_circuit_opened",
+                        {"failures": self._consecutive, "cooldown": self.cooldown},
+                        level="error",
+                    )
+
+    def release(self):
+        """The call ended without a verdict on the provider: frees the probe slot."""
+        with self._lock:
+            self._probing = False
+
+    def reset(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._probing = False
+
+
+BREAKER = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+
+_latencies = deque(maxlen=_LATENCY_WINDOW)
+_counters = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0, "rejected": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def hedge_delay() -> float:
+    """Seconds to wait before hedging the current call."""
+    if LLM_HEDGE_DELAY != "p95":
+        return float(LLM_HEDGE_DELAY)
+    with _counters_lock:
+        samples = sorted(_latencies)
+    if len(samples) < _LATENCY_MIN_SAMPLES:
+        return LLM_HEDGE_DEFAULT_DELAY
+    return max(LLM_HEDGE_MIN_DELAY, samples[int(0.95 * (len(samples) - 1))])
+
+
+def _observe(seconds: float):
+    with _counters_lock:
+        _latencies.append(seconds)
+
+# ============================================================
+# SYNC CALLS
+# ============================================================
+
+def _attempt(create, request: dict, parse, timeout: float):
+    started = time.monotonic()
+    result = parse(create(**request, timeout=timeout))
+    _observe(time.monotonic() - started)
+    return result
+
+
+def _hedged(create, request: dict, parse, deadline: float):
+    remaining = deadline - time.monotonic()
+    if not LLM_HEDGING:
+        return _attempt(create, request, parse, remaining)
+
+    first = _HEDGE_EXECUTOR.submit(_attempt, create, request, parse, remaining)
+    pending = {first}
+    done, _ = wait(pending, timeout=min(hedge_delay(), remaining))
+    if not done:
+        _count("hedges")
+        pending.add(_HEDGE_EXECUTOR.submit(
+            _attempt, create, request, parse, deadline - time.monotonic()
+        ))
+
+    error = None
+    while pending:
+        done, pending = wait(
+            pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED
+        )
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                if future is not first:
+                    _count("hedge_wins")
+                return future.result()
+            error = future.exception()
+
+    if error is not None and not pending:
+        raise error
+    raise TimeoutError(f"LLM call exceeded its {LLM_DEADLINE:g}s deadline")
+
+
+def call_llm(create, request: dict, parse):
+    """
+    Runs create(**request, timeout=...) and parse() on the answer with
+    deadline, retries, hedging and the circuit breaker.
+
+    Raises LLMUnavailableError while the breaker is open, else the
+    last error once retries / the deadline are exhausted.
+    """
+    if not BREAKER.allow():
+        _count("rejected")
+        raise LLMUnavailableError("LLM temporarily unavailable (circuit open)")
+
+    _count("calls")
+    deadline = time.monotonic() + LLM_DEADLINE
+    attempt = 0
+    recorded = False
+
+    try:
+        while True:
+            try:
+                if deadline <= time.monotonic():
+                    raise TimeoutError(f"LLM call exceeded its {LLM_DEADLINE:g}s deadline")
+                result = _hedged(create, request, parse, deadline)
+            except Exception as e:
+                delay = backoff_delay(attempt)
+                if is_retryable(e) and attempt < LLM_MAX_RETRIES \
+                        and time.monotonic() + delay < deadline:
+                    _count("retries")
+                    log_event("llm_retry", {"attempt": attempt + 1, "error": str(e)}, level="warning")
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+
+                _count("failures")
+                if is_provider_failure(e):
+                    BREAKER.record(failed=True)
+                    recorded = True
+                raise
+
+            BREAKER.record(failed=False)
+            recorded = True
+            return result
+    finally:
+        # No verdict on the provider (e.g. 400 / 401, invalid JSON):
+        # only the half-open probe slot is freed
+        if not recorded:
+            BREAKER.release()
+
+# ============================================================
+# ASYNC CALLS
+# ============================================================
+
+async def _attempt_async(create, request: dict, parse, timeout: float):
+    started = time.monotonic()
+    response = await asyncio.wait_for(create(**request, timeout=timeout), timeout)
+    result = parse(response)
+    _observe(time.monotonic() - started)
+    return result
+
+
+async def _hedged_async(create, request: dict, parse, deadline: float):
+    remaining = deadline - time.monotonic()
+    if not LLM_HEDGING:
+        return await _attempt_async(create, request, parse, remaining)
+
+    first = asyncio.ensure_future(_attempt_async(create, request, parse, remaining))
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=min(hedge_delay(), remaining))
+        if not done:
+            _count("hedges")
+            pending.add(asyncio.ensure_future(
+                _attempt_async(create, request, parse, deadline - time.monotonic())
+            ))
+
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=max(0, deadline - time.monotonic()),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                break
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        _count("hedge_wins")
+                    return task.result()
+                error = task.exception()
+
+        if error is not None and not pending:
+            raise error
+        raise TimeoutError(f"LLM call exceeded its {LLM_DEADLINE:g}s deadline")
+    finally:
+        # The losing request is not needed any more
+        for task in pending:
+            task.cancel()
+
+
+async def call_llm_async(create, request: dict, parse):
+    """Async version of call_llm (create returns an awaitable)."""
+    if not BREAKER.allow():
+        _count("rejected")
+        raise LLMUnavailableError("LLM temporarily unavailable (circuit open)")
+
+    _count("calls")
+    deadline = time.monotonic() + LLM_DEADLINE
+    attempt = 0
+    recorded = False
+
+    try:
+        while True:
+            try:
+                if deadline <= time.monotonic():
+                    raise TimeoutError(f"LLM call exceeded its {LLM_DEADLINE:g}s deadline")
+                result = await _hedged_async(create, request, parse, deadline)
+            except Exception as e:
+                delay = backoff_delay(attempt)
+                if is_retryable(e) and attempt < LLM_MAX_RETRIES \
+                        and time.monotonic() + delay < deadline:
+                    _count("retries")
+                    log_event("llm_retry", {"attempt": attempt + 1, "error": str(e)}, level="warning")
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+
+                _count("failures")
+                if is_provider_failure(e):
+                    BREAKER.record(failed=True)
+                    recorded = True
+                raise
+
+            BREAKER.record(failed=False)
+            recorded = True
+            return result
+    finally:
+        # Cancelled (also during a backoff sleep) or no verdict on the
+        # provider (400 / 401, invalid JSON): only the probe slot is freed
+        if not recorded:
+            BREAKER.release()
+
+
+def get_llm_resilience_stats() -> dict:
+    with _counters_lock:
+        counters = dict(_counters)
+    return {
+        **counters,
+        "breaker": BREAKER.state,
+        "hedge_delay": round(hedge_delay(), 3),
+    }
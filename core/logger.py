@@ -4,24 +4,238 @@ Purpose:
 - Track LLM requests
 - Track SQL execution
 - Provide audit trail for debugging & compliance
+
+Writes are NON-BLOCKING:
+- log_event() serializes the entry and enqueues the line (later
+  changes to the caller's payload do not leak into the log)
+- A background thread batches entries and appends them to the
+  daily log file (flushed every LOG_FLUSH_INTERVAL seconds or
+  LOG_FLUSH_BATCH entries)
+- Files rotate by day AND by size (YYYY-MM-DD.log → YYYY-MM-DD.N.log)
+- Per-event levels and sampling rates keep hot events cheap
+- Pending entries are drained on shutdown
+
+Line format is unchanged: {"timestamp", "event", "payload"}
 """
 
+import atexit
 import datetime
 import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
 from pathlib import Path
 
 # Create logs directory if missing
 LOG_DIR = Path("logs")
 LOG_DIR.mkdir(exist_ok=True)
 
-def log_event(event_type: str, payload: dict):
+# -------------------------
+# Writer settings
+# -------------------------
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1.0"))
+LOG_FLUSH_BATCH = int(os.getenv("LOG_FLUSH_BATCH", "200"))
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "100000"))
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Echo entries to stdout (live debugging only; off under load)
+LOG_ECHO = os.getenv("LOG_ECHO", "0") == "1"
+
+# -------------------------
+# Levels & sampling
+# -------------------------
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+LOG_LEVEL = LEVELS.get(os.getenv("LOG_LEVEL", "info").lower(), 20)
+
+# Default level per event type (anything else is "info")
+EVENT_LEVELS = {
+    "llm_unstructured_output": "warning",
+    "sql_generated_but_blocked": "warning",
+    "sql_execution_error": "error",
+}
+
+
+def _parse_sample_rates(raw: str) -> dict:
+    """
+    "sql_execution_started=0.1,sql_executed=0.5" → {event: rate}
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        event, _, rate = item.partition("=")
+        rates[event.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+# Fraction of events written per event type (default 1.0 = all)
+LOG_SAMPLE_RATES = _parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+
+# ============================================================
+# BACKGROUND WRITER
+# ============================================================
+
+class _LogWriter:
+    """
+    Single background thread that owns all log file I/O.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=LOG_QUEUE_MAX)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    # --------------------------------------------------------
+    # Producer side (request threads)
+    # --------------------------------------------------------
+
+    def _ensure_started(self):
+        # (Re)start lazily, also after a fork into a worker process
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=LOG_QUEUE_MAX)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="smarteye-log-writer", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, entry: tuple):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            # Never block a request on logging
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0):
+        """Blocks until everything queued so far is written."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """Drains pending entries and stops the writer thread."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # --------------------------------------------------------
+    # Consumer side (writer thread)
+    # --------------------------------------------------------
+
+    def _run(self):
+        while True:
+            batch, markers, stop = [], [], False
+
+            item = self._queue.get()
+            deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+
+            # Collect until the batch is full, the interval elapsed,
+            # or a flush / shutdown was requested
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+
+                remaining = deadline - time.monotonic()
+                if stop or markers or len(batch) >= LOG_FLUSH_BATCH or remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    # Logging must never take the service down
+                    sys.stderr.write(f"log writer error: {e}\n")
+
+            for marker in markers:
+                marker.set()
+
+            if stop:
+                return
+
+    @staticmethod
+    def _target_file(day: str, incoming: int) -> Path:
+        """
+        Daily file; rotated aside once it would exceed LOG_MAX_BYTES.
+        """
+        log_file = LOG_DIR / f"{day}.log"
+
+        if log_file.exists() and log_file.stat().st_size + incoming > LOG_MAX_BYTES:
+            n = 1
+            while (LOG_DIR / f"{day}.{n}.log").exists():
+                n += 1
+            log_file.rename(LOG_DIR / f"{day}.{n}.log")
+
+        return log_file
+
+    def _write(self, batch):
+        # Group by day (a batch may straddle midnight)
+        by_day = {}
+        for day, line in batch:
+            by_day.setdefault(day, []).append(line)
+            if LOG_ECHO:
+                print(line)
+
+        for day, lines in by_day.items():
+            text = "\n".join(lines) + "\n"
+            data = text.encode("utf-8")
+
+            # Append log entries (one write per file per batch)
+            with open(self._target_file(day, len(data)), "ab") as f:
+                f.write(data)
+
+
+_WRITER = _LogWriter()
+
+
+# ============================================================
+# PUBLIC API
+# ============================================================
+
+def log_event(event_type: str, payload: dict, level: str = None):
     """
-    Writes a structured JSON log entry
-    into a daily log file.
+    Queues a structured JSON log entry
+    for the daily log file.
+
+    - level : debug / info / warning / error
+              (default from EVENT_LEVELS, else "info")
+
+    Entries below LOG_LEVEL are skipped; non-error events are
+    sampled according to LOG_SAMPLE_RATES.
     """
 
-    # One log file per day
-    log_file = LOG_DIR / f"{datetime.date.today()}.log"
+    level = level or EVENT_LEVELS.get(event_type, "info")
+    severity = LEVELS.get(level, 20)
+
+    if severity < LOG_LEVEL:
+        return
+
+    rate = LOG_SAMPLE_RATES.get(event_type, 1.0)
+    if severity < LEVELS["error"] and rate < 1.0 and random.random() >= rate:
+        return
 
     entry = {
         "timestamp": datetime.datetime.now().isoformat(),
@@ -29,9 +243,33 @@ def log_event(event_type: str, payload: dict):
         "payload": payload
     }
 
-    # Append log entry
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry) + "\n")
+    # Serialized here, so the writer thread never reads a payload
+    # the caller may still be mutating
+    try:
+        line = json.dumps(entry, default=str)
+    except ValueError:
+        # e.g. a circular reference; keep the event, not the structure
+        entry["payload"] = repr(payload)
+        line = json.dumps(entry, default=str)
+
+    _WRITER.submit((entry["timestamp"][:10], line))
+
+
+def flush_logs(timeout: float = 5.0):
+    """Waits until all queued entries are on disk."""
+    _WRITER.flush(timeout)
+
+
+def shutdown_logger(timeout: float = 5.0):
+    """Drains the queue and stops the writer (called on shutdown)."""
+    _WRITER.close(timeout)
+
+
+def get_logger_stats() -> dict:
+    return {
+        "queued": _WRITER._queue.qsize(),
+        "dropped": _WRITER.dropped,
+    }
+
 
-    # Print for live debugging
-    print(entry)
+atexit.register(shutdown_logger)
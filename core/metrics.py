@@ -0,0 +1,259 @@
+"""
+Metrics
+Purpose:
+- Per-stage latency histograms for the query pipeline
+- Counters per mill / outcome / source, rows returned, LLM tokens
+- Prometheus text exposition (served on /metrics)
+
+Dependency-free: a small subset of the Prometheus client model
+(counters + histograms with labels).
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers cache hits (ms) up to the UI's 60s timeout
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+_REGISTRY = []
+_COLLECTORS = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key → [bucket counts..., sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def quantile(self, q: float, **labels):
+        """
+        Bucket-resolution estimate of a quantile (None if no data).
+        """
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if not state or not state[-1]:
+                return None
+            target = q * state[-1]
+            for i, bound in enumerate(self.buckets):
+                if state[i] >= target:
+                    return bound
+        return self.buckets[-1]
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for key, state in items:
+            for bound, count in zip(self.buckets, state):
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {state[-1]}"
+            plain = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{plain} {_format_value(state[-2])}"
+            yield f"{self.name}_count{plain} {state[-1]}"
+
+
+# ============================================================
+# METRICS USED BY THE SERVICE
+# ============================================================
+
+STAGE_SECONDS = Histogram(
+    "smarteye_stage_seconds",
+    "Latency of each pipeline / analytics stage",
+    ("stage", "mill"),
+)
+
+QUERIES_TOTAL = Counter(
+    "smarteye_queries_total",
+    "Questions handled, by outcome (executed/generated/unsupported/error)",
+    ("mill", "outcome", "source"),
+)
+
+ROWS_RETURNED = Histogram(
+    "smarteye_rows_returned",
+    "Rows returned per executed query / analytics call",
+    ("mill", "endpoint"),
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000, 1000000),
+)
+
+LLM_TOKENS_TOTAL = Counter(
+    "smarteye_llm_tokens_total",
+    "LLM tokens consumed",
+    ("kind",),
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "smarteye_http_request_seconds",
+    "End-to-end HTTP request latency",
+    ("path", "status"),
+)
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+
+def _mill_label(mill) -> str:
+    """
+    Normalized mill name for labels; unknown mills collapse into
+    "invalid" so user input cannot grow the label set.
+    """
+    from core.db import MILL_DB_MAP  # core.db imports this module
+
+    label = str(mill or "").lower().strip()
+    if label and label not in MILL_DB_MAP:
+        return "invalid"
+    return label
+
+
+@contextmanager
+def time_stage(stage: str, mill: str = ""):
+    """
+    Times a block into smarteye_stage_seconds:
+
+        with time_stage("db_execute", mill):
+            ...
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(
+            time.perf_counter() - start, stage=stage, mill=_mill_label(mill)
+        )
+
+
+def record_outcome(mill: str, outcome: str, source=None):
+    QUERIES_TOTAL.inc(mill=_mill_label(mill), outcome=outcome, source=source or "none")
+
+
+def record_rows(mill: str, endpoint: str, rows: int):
+    ROWS_RETURNED.observe(rows, mill=_mill_label(mill), endpoint=endpoint)
+
+
+def record_llm_usage(usage):
+    """Counts prompt / completion tokens of an OpenAI response."""
+    if usage is None:
+        return
+    LLM_TOKENS_TOTAL.inc(getattr(usage, "prompt_tokens", 0) or 0, kind="prompt")
+    LLM_TOKENS_TOTAL.inc(getattr(usage, "completion_tokens", 0) or 0, kind="completion")
+
+
+def gauge_lines(name: str, help_text: str, samples):
+    """
+    Exposition lines for a gauge computed at scrape time.
+
+    - samples : iterable of (labels_dict, value)
+    """
+    yield f"# HELP {name} {help_text}"
+    yield f"# TYPE {name} gauge"
+    for labels, value in samples:
+        names = tuple(labels)
+        yield f"{name}{_format_labels(names, [labels[n] for n in names])} {_format_value(value)}"
+
+
+def counter_lines(name: str, help_text: str, samples):
+    """
+    Exposition lines for a cumulative counter read at scrape time
+    (e.g. cache hits kept by the cache itself).
+
+    - samples : iterable of (labels_dict, value)
+    """
+    yield f"# HELP {name} {help_text}"
+    yield f"# TYPE {name} counter"
+    for labels, value in samples:
+        names = tuple(labels)
+        yield f"{name}{_format_labels(names, [labels[n] for n in names])} {_format_value(value)}"
+
+
+def register_collector(func):
+    """
+    Registers a callable returning extra exposition lines
+    (e.g. cache / pool gauges) at scrape time.
+    """
+    _COLLECTORS.append(func)
+    return func
+
+
+def render_prometheus() -> str:
+    """All metrics in Prometheus text exposition format."""
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    for collector in _COLLECTORS:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
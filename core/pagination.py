@@ -0,0 +1,166 @@
+"""
+Result pagination helpers
+Purpose:
+- Cursor-style page tokens for /query results
+- OFFSET / FETCH rewriting of validated T-SQL SELECTs
+"""
+
+import base64
+import hashlib
+import json
+import os
+
+from core.sql_guard import NUMBER, PUNCT, WORD, iter_tokens
+
+# Upper bound for a single page (protects memory and UI)
+QUERY_MAX_PAGE_SIZE = int(os.getenv("QUERY_MAX_PAGE_SIZE", "5000"))
+
+
+def query_fingerprint(sql: str, params) -> str:
+    """Identifies the query a page token belongs to."""
+    raw = json.dumps([sql.strip(), list(params)], default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def encode_page_token(sql: str, params, offset: int) -> str:
+    payload = json.dumps({"o": offset, "q": query_fingerprint(sql, params)})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_page_token(token: str, sql: str, params) -> int:
+    """
+    Returns the row offset encoded in a page token.
+    Raises ValueError if the token is malformed or was issued
+    for a different query.
+    """
+    if not token:
+        return 0
+
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        offset = int(payload["o"])
+        fingerprint = payload["q"]
+    except Exception:
+        raise ValueError("Invalid page token")
+
+    if offset < 0 or fingerprint != query_fingerprint(sql, params):
+        raise ValueError("Page token does not match this query")
+
+    return offset
+
+
+# Top-level keywords after which OFFSET / FETCH cannot simply be
+# appended: set operations, an existing OFFSET, FOR XML / JSON and
+# OPTION (...) hints (which must come last)
+_UNPAGEABLE = {"union", "except", "intersect", "offset", "for", "option"}
+
+
+def _parse_top(tokens, i: int):
+    """
+    TOP clause starting at tokens[i] ("top").
+    Returns (rows, index of its last token), or None unless it is
+    a literal TOP n / TOP (n) without PERCENT / WITH TIES.
+    """
+    shape = [t[:2] for t in tokens[i + 1:i + 4]]
+    if shape[:1] and shape[0][0] == NUMBER:
+        value, end = shape[0][1], i + 1
+    elif len(shape) == 3 and shape[0] == (PUNCT, "(") and shape[1][0] == NUMBER \
+            and shape[2] == (PUNCT, ")"):
+        value, end = shape[1][1], i + 3
+    else:
+        return None
+
+    if not value.isdigit():
+        return None
+    after = tokens[end + 1][:2] if end + 1 < len(tokens) else None
+    if after in ((WORD, "percent"), (WORD, "with")):
+        return None
+    return int(value), end
+
+
+def paginate_sql(sql: str, params, offset: int, limit: int):
+    """
+    Restricts a SELECT to rows [offset, offset + limit).
+
+    Works on core.sql_guard tokens, so comments and string literals
+    are never mistaken for clauses. The query is never wrapped in a
+    derived table, so its ORDER BY is kept and unnamed columns
+    (COUNT(*), SUM(...) / 8) stay valid:
+
+    - TOP n queries             → TOP is turned into the OFFSET/FETCH
+                                  window (never past row n)
+    - Query already ORDER BY-ed → OFFSET/FETCH appended (stable pages)
+    - DISTINCT without ORDER BY → ORDER BY 1 is added
+    - Otherwise                 → ORDER BY (SELECT NULL) is added
+
+    Returns (sql, params), or None when the query cannot be paged
+    without changing its result: set operations (UNION / EXCEPT /
+    INTERSECT), an existing OFFSET, FOR XML / JSON, OPTION hints,
+    TOP ... PERCENT / WITH TIES or a TOP that is not a literal number.
+
+    Without an ORDER BY in the original query, page order follows
+    the server's plan; add one for strictly stable paging.
+    """
+    try:
+        tokens = list(iter_tokens(sql))
+    except ValueError:
+        return None
+
+    depth = 0
+    main = None
+    has_order = False
+
+    for index, (kind, value, _, _) in enumerate(tokens):
+        if kind == PUNCT and value == "(":
+            depth += 1
+        elif kind == PUNCT and value == ")":
+            depth -= 1
+        elif kind == WORD and depth == 0:
+            # With CTEs the bodies are nested, so the first
+            # top-level SELECT is the main one
+            if value == "select" and main is None:
+                main = index
+            elif value in _UNPAGEABLE:
+                return None
+            elif value == "order" and tokens[index + 1:index + 2] \
+                    and tokens[index + 1][:2] == (WORD, "by"):
+                has_order = True
+
+    if main is None:
+        return None
+
+    # Anything after the last token (a trailing -- comment) is dropped,
+    # so the appended clause cannot end up inside it
+    sql = sql[:tokens[-1][3]]
+    params = list(params)
+
+    anchor = main
+    has_distinct = False
+    if anchor + 1 < len(tokens) and tokens[anchor + 1][:2] in (
+        (WORD, "distinct"), (WORD, "all")
+    ):
+        anchor += 1
+        has_distinct = tokens[anchor][1] == "distinct"
+
+    if anchor + 1 < len(tokens) and tokens[anchor + 1][:2] == (WORD, "top"):
+        top = _parse_top(tokens, anchor + 1)
+        if top is None:
+            return None
+
+        rows, end = top
+        head = sql[:tokens[anchor + 1][2]]
+        rest = sql[tokens[end][3]:]
+        limit = min(int(limit), rows - int(offset))
+        if limit <= 0:
+            # Past the last of the TOP rows
+            return f"{head}TOP (0){rest}", params
+        sql = f"{head.rstrip()} {rest.lstrip()}"
+
+    if not has_order:
+        # DISTINCT may only be ordered by selected columns
+        sql = f"{sql} ORDER BY {'1' if has_distinct else '(SELECT NULL)'}"
+
+    return (
+        f"{sql} OFFSET ? ROWS FETCH NEXT ? ROWS ONLY",
+        params + [int(offset), int(limit)],
+    )
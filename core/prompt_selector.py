@@ -0,0 +1,197 @@
+"""
+Prompt slimming
+Purpose:
+- Score the examples in llm/examples.md against the question with a
+  local TF-IDF index and keep only the most relevant ones
+- Keep only the schema columns the question can plausibly need
+  (mandatory columns + name / synonym matches from instructions.md)
+- Stay within a prompt token budget
+
+Instructions, SQL rules and the mandatory aggregation rules at the
+top of examples.md are always sent in full.
+"""
+
+import math
+import re
+from collections import Counter
+
+# Columns every prompt keeps (used by the mandatory rules)
+MANDATORY_COLUMNS = {"ecode", "ename", "wdate", "dept_code", "work_type", "work_hr", "duty"}
+
+_EXAMPLE_HEADER = re.compile(r"^\s*(?:#+\s*)?(?:✅\s*)?Example\b", re.IGNORECASE)
+_SEPARATOR = re.compile(r"^\s*-{3,}\s*$")
+_USER_LINE = re.compile(r"^\s*User:\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+_WORD = re.compile(r"[a-z0-9]+")
+_COLUMN_LINE = re.compile(r"^- (\S+) \((.*)\)$")
+
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "at", "to", "and", "or", "is",
+    "are", "me", "show", "give", "display", "list", "all", "what", "which",
+    "who", "with", "by", "from", "please", "get", "find", "i", "want", "my",
+}
+
+
+def words(text: str) -> list:
+    """Lower-cased word tokens without stopwords."""
+    return [w for w in _WORD.findall(text.lower()) if w not in STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Token count of a prompt part (tiktoken if installed,
+    else ~4 characters per token).
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return (len(text) + 3) // 4
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+# ============================================================
+# EXAMPLES
+# ============================================================
+
+def parse_examples(text: str):
+    """
+    Splits examples.md into (preamble, [example, ...]).
+
+    Each example: {"title", "question", "text"}; the preamble is
+    everything before the first example (mandatory rules).
+    """
+    lines = text.splitlines()
+    starts = [i for i, line in enumerate(lines) if _EXAMPLE_HEADER.match(line)]
+
+    if not starts:
+        return text, []
+
+    preamble = "\n".join(lines[:starts[0]]).rstrip()
+    examples = []
+
+    for n, start in enumerate(starts):
+        end = starts[n + 1] if n + 1 < len(starts) else len(lines)
+        block = lines[start:end]
+
+        # Separators belong between examples, not inside them
+        while block and (not block[-1].strip() or _SEPARATOR.match(block[-1])):
+            block.pop()
+
+        body = "\n".join(block)
+        user = _USER_LINE.search(body)
+        examples.append({
+            "title": block[0].strip(" #✅-"),
+            "question": user.group(1).strip() if user else "",
+            "text": body,
+        })
+
+    return preamble, examples
+
+
+class ExampleIndex:
+    """
+    TF-IDF (cosine) index over example questions and titles.
+    """
+
+    def __init__(self, examples):
+        self.examples = list(examples)
+        docs = [Counter(words(f"{e['title']} {e['question']}")) for e in self.examples]
+
+        df = Counter()
+        for doc in docs:
+            df.update(doc.keys())
+
+        n = len(docs)
+        self.idf = {term: math.log((1 + n) / (1 + count)) + 1 for term, count in df.items()}
+        self.vectors = [self._vector(doc) for doc in docs]
+
+    def _vector(self, counts: Counter) -> dict:
+        vector = {t: (1 + math.log(c)) * self.idf.get(t, 0.0) for t, c in counts.items()}
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {t: v / norm for t, v in vector.items() if v}
+
+    def rank(self, question: str):
+        """[(score, example), ...] best first (ties keep file order)."""
+        query = self._vector(Counter(words(question)))
+        scored = [
+            (sum(weight * vector.get(term, 0.0) for term, weight in query.items()), i)
+            for i, vector in enumerate(self.vectors)
+        ]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(score, self.examples[i]) for score, i in scored]
+
+# ============================================================
+# SCHEMA COLUMNS
+# ============================================================
+
+def parse_column_hints(instructions: str) -> dict:
+    """
+    "- Employee name → EName" lines of instructions.md
+    → {"employee": {"ename"}, "name": {"ename"}, ...}
+    """
+    hints = {}
+    for line in instructions.splitlines():
+        if "→" not in line:
+            continue
+        left, _, right = line.strip().lstrip("-• ").partition("→")
+        columns = {c.strip().lower() for c in re.split(r"[,/]", right) if c.strip()}
+        columns = {c for c in columns if re.fullmatch(r"[a-z0-9_]+", c)}
+        for word in words(left):
+            hints.setdefault(word, set()).update(columns)
+    return hints
+
+
+def _column_words(column: str) -> set:
+    # Dept_Code → {"dept", "code"}, mch1_code → {"mch1", "code", "mch"}
+    parts = set(words(column.replace("_", " ")))
+    parts |= {re.sub(r"\d+$", "", p) for p in parts}
+    return {p for p in parts if p}
+
+
+def select_schema(schema_text: str, question: str, hints: dict,
+                  max_columns: int = 0) -> str:
+    """
+    Keeps mandatory columns plus the columns whose name or
+    instruction synonyms share a word with the question.
+    Format of get_schema_text() is preserved.
+    """
+    asked = set(words(question))
+    wanted = set(MANDATORY_COLUMNS)
+    for word in asked:
+        wanted |= hints.get(word, set())
+
+    kept = []
+    extra = 0
+    for line in schema_text.splitlines():
+        match = _COLUMN_LINE.match(line)
+        if not match:
+            kept.append(line)
+            continue
+
+        column = match.group(1).lower()
+        if column in MANDATORY_COLUMNS:
+            kept.append(line)
+        elif column in wanted or _column_words(column) & asked:
+            if not max_columns or extra < max_columns:
+                kept.append(line)
+                extra += 1
+
+    return "\n".join(kept)
+
+# ============================================================
+# SELECTION
+# ============================================================
+
+def select_examples(index: ExampleIndex, question: str, top_k: int,
+                    token_budget: int = 0, used_tokens: int = 0):
+    """
+    Best-scoring examples (at most top_k) that fit in the budget.
+    """
+    chosen = []
+    for score, example in index.rank(question):
+        if len(chosen) >= top_k:
+            break
+        cost = estimate_tokens(example["text"])
+        if token_budget and used_tokens + cost > token_budget:
+            continue
+        chosen.append(example)
+        used_tokens += cost
+    return chosen
@@ -0,0 +1,233 @@
+"""
+Query Governor
+Purpose:
+- Cap result size: inject TOP (row cap + 1) when the query has no
+  row limit, so SQL Server can stop early; report truncation
+- Per-statement timeout on the pyodbc connection
+- Optional estimated-plan check (SHOWPLAN_XML): queries whose
+  estimated cost / row count exceed the mill's budget are rejected
+  or downgraded to a smaller row cap
+
+Every setting can be overridden per mill with a _<MILL> suffix,
+e.g. QUERY_ROW_CAP_SHJM=50000.
+"""
+
+import json
+import os
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+
+from core.cache import LRUTTLCache
+from core.sql_guard import PUNCT, WORD, iter_tokens
+
+# -------------------------
+# Defaults (all mills)
+# -------------------------
+# Max rows returned by /query (0 = unlimited)
+QUERY_ROW_CAP = int(os.getenv("QUERY_ROW_CAP", "10000"))
+# Max rows of a streamed /query (the large-export path; 0 = unlimited)
+QUERY_STREAM_ROW_CAP = int(os.getenv("QUERY_STREAM_ROW_CAP", "1000000"))
+# Per-statement timeout in seconds (0 = none)
+QUERY_TIMEOUT = int(os.getenv("QUERY_TIMEOUT", "30"))
+
+# Estimated plan check (one extra round trip per new query)
+QUERY_PLAN_CHECK = os.getenv("QUERY_PLAN_CHECK", "0") == "1"
+# Budgets (0 = no limit)
+QUERY_MAX_PLAN_COST = float(os.getenv("QUERY_MAX_PLAN_COST", "0"))
+QUERY_MAX_EST_ROWS = float(os.getenv("QUERY_MAX_EST_ROWS", "0"))
+# reject | downgrade
+QUERY_PLAN_ACTION = os.getenv("QUERY_PLAN_ACTION", "reject")
+# Row cap used for downgraded queries
+QUERY_DOWNGRADE_ROW_CAP = int(os.getenv("QUERY_DOWNGRADE_ROW_CAP", "1000"))
+# Seconds a plan estimate is reused for the same (mill, sql, params)
+QUERY_PLAN_CACHE_TTL = float(os.getenv("QUERY_PLAN_CACHE_TTL", "600"))
+
+_PLAN_CACHE = LRUTTLCache(maxsize=1000, ttl=QUERY_PLAN_CACHE_TTL)
+
+
+def _setting(name: str, mill: str, default, cast):
+    """Per-mill override NAME_<MILL>, else the global default."""
+    value = os.getenv(f"{name}_{str(mill).upper().strip()}")
+    return default if value is None else cast(value)
+
+
+def row_cap(mill: str) -> int:
+    return _setting("QUERY_ROW_CAP", mill, QUERY_ROW_CAP, int)
+
+
+def stream_row_cap(mill: str) -> int:
+    return _setting("QUERY_STREAM_ROW_CAP", mill, QUERY_STREAM_ROW_CAP, int)
+
+
+def query_timeout(mill: str) -> int:
+    return _setting("QUERY_TIMEOUT", mill, QUERY_TIMEOUT, int)
+
+
+def plan_budget(mill: str) -> dict:
+    return {
+        "enabled": _setting("QUERY_PLAN_CHECK", mill, QUERY_PLAN_CHECK, lambda v: v == "1"),
+        "max_cost": _setting("QUERY_MAX_PLAN_COST", mill, QUERY_MAX_PLAN_COST, float),
+        "max_rows": _setting("QUERY_MAX_EST_ROWS", mill, QUERY_MAX_EST_ROWS, float),
+        "action": _setting("QUERY_PLAN_ACTION", mill, QUERY_PLAN_ACTION, str).lower(),
+        "downgrade_row_cap": _setting(
+            "QUERY_DOWNGRADE_ROW_CAP", mill, QUERY_DOWNGRADE_ROW_CAP, int
+        ),
+    }
+
+# ============================================================
+# ROW CAP
+# ============================================================
+
+def inject_row_cap(sql: str, limit: int):
+    """
+    Adds TOP (limit) to the outermost SELECT.
+
+    Returns (sql, injected). Left untouched (injected=False) when the
+    query already limits rows (TOP, OFFSET/FETCH) or is a set operation
+    (UNION / EXCEPT / INTERSECT); the fetch cap still applies then.
+    """
+    tokens = list(iter_tokens(sql))
+    depth = 0
+    main = None
+
+    for index, (kind, value, _, _) in enumerate(tokens):
+        if kind == PUNCT and value == "(":
+            depth += 1
+        elif kind == PUNCT and value == ")":
+            depth -= 1
+        elif kind == WORD and depth == 0:
+            # With CTEs the bodies are nested, so the first
+            # top-level SELECT is the main one
+            if value == "select" and main is None:
+                main = index
+            elif value in ("union", "except", "intersect", "offset"):
+                return sql, False
+
+    if main is None:
+        return sql, False
+
+    anchor = main
+    if anchor + 1 < len(tokens) and tokens[anchor + 1][:2] in (
+        (WORD, "distinct"), (WORD, "all")
+    ):
+        anchor += 1
+
+    if anchor + 1 < len(tokens) and tokens[anchor + 1][:2] == (WORD, "top"):
+        return sql, False
+
+    at = tokens[anchor][3]
+    return f"{sql[:at]} TOP ({int(limit)}){sql[at:]}", True
+
+
+def apply_row_cap(rows: int, offset: int, has_more: bool, cap: int):
+    """
+    Applies the row cap to a fetched page.
+
+    - rows     : rows on this page
+    - offset   : index of the page's first row
+    - has_more : more rows exist after this page
+
+    Returns (rows_to_keep, has_more, truncated).
+    """
+    if cap and offset + rows + (1 if has_more else 0) > cap:
+        return max(0, min(rows, cap - offset)), False, True
+    return rows, has_more, False
+
+# ============================================================
+# TIMEOUT
+# ============================================================
+
+@contextmanager
+def statement_timeout(conn, seconds: int):
+    """
+    Sets the connection's query timeout (pyodbc Connection.timeout)
+    for the block and restores it afterwards (pooled connections).
+    """
+    if not seconds or not hasattr(conn, "timeout"):
+        yield conn
+        return
+
+    previous = conn.timeout
+    conn.timeout = seconds
+    try:
+        yield conn
+    finally:
+        try:
+            conn.timeout = previous
+        except Exception:
+            pass
+
+# ============================================================
+# PLAN CHECK
+# ============================================================
+
+def parse_showplan(plan_xml: str) -> dict:
+    """
+    Highest estimated subtree cost and row count over the plan's statements.
+    """
+    cost, rows = 0.0, 0.0
+    for element in ET.fromstring(plan_xml).iter():
+        if element.tag.endswith("}StmtSimple") or element.tag == "StmtSimple":
+            cost = max(cost, float(element.get("StatementSubTreeCost", 0) or 0))
+            rows = max(rows, float(element.get("StatementEstRows", 0) or 0))
+    return {"cost": cost, "rows": rows}
+
+
+def fetch_estimated_plan(conn, sql: str, params: list) -> dict:
+    """
+    Compiles (does not run) the query with SHOWPLAN_XML.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SET SHOWPLAN_XML ON")
+    try:
+        cursor.execute(sql, params)
+        plan_xml = cursor.fetchone()[0]
+        while cursor.nextset():
+            pass
+    finally:
+        cursor.execute("SET SHOWPLAN_XML OFF")
+    return parse_showplan(plan_xml)
+
+
+def review_plan(mill: str, sql: str, params: list):
+    """
+    Checks the estimated plan against the mill's budget.
+
+    Returns None when within budget (or checking is off), else
+    {"action": "reject" | "downgrade", "reason": str, "plan": {...},
+     "row_cap": int (downgrade only)}.
+    """
+    budget = plan_budget(mill)
+    if not budget["enabled"] or not (budget["max_cost"] or budget["max_rows"]):
+        return None
+
+    key = (str(mill).lower(), sql, json.dumps(params, default=str))
+    plan = _PLAN_CACHE.get(key, None)
+    if plan is None:
+        from core.db import db_connection
+
+        with db_connection(mill) as conn:
+            plan = fetch_estimated_plan(conn, sql, params)
+        _PLAN_CACHE.set(key, plan)
+
+    reasons = []
+    if budget["max_cost"] and plan["cost"] > budget["max_cost"]:
+        reasons.append(
+            f"estimated cost {plan['cost']:.2f} exceeds budget {budget['max_cost']:g}"
+        )
+    if budget["max_rows"] and plan["rows"] > budget["max_rows"]:
+        reasons.append(
+            f"estimated rows {plan['rows']:.0f} exceed budget {budget['max_rows']:g}"
+        )
+
+    if not reasons:
+        return None
+
+    decision = {
+        "action": "downgrade" if budget["action"] == "downgrade" else "reject",
+        "reason": "Query too expensive: " + "; ".join(reasons),
+        "plan": plan,
+    }
+    if decision["action"] == "downgrade":
+        decision["row_cap"] = budget["downgrade_row_cap"]
+    return decision
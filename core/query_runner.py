@@ -3,7 +3,8 @@ Query runner with full safety pipeline.
 
 Flow:
 User Question
- → LLM generates SQL (JSON)
+ → Fast-path intent matcher (known shapes, no LLM)
+ → otherwise LLM generates SQL (JSON)
  → JSON structure validation
  → SQL safety guard (READ-ONLY)
  → Database execution
@@ -23,244 +24,784 @@ Purpose:
 # External & internal imports
 # -------------------------
 
-import pandas as pd  # Used to read SQL results into DataFrame
+import copy
+import datetime
+import decimal
+import json
+import os
+from contextlib import ExitStack
 
 # Database utilities
-from core.db import get_conn, get_schema_text
+from core.db import get_schema_fingerprint, get_schema_text, normalize_mill
 
 # SQL safety firewall
-from core.sql_guard import validate_sql
+from core.sql_guard import check_sql
 
 # LLM interface
-from core.llm_engine import generate_sql_from_question
+from core.llm_engine import (
+    generate_sql_from_question,
+    get_cached_sql,
+    llm_cache_key,
+    store_cached_sql,
+)
+
+# Circuit breaker verdict (LLM skipped while the provider is degraded)
+from core.llm_resilience import LLMUnavailableError
+
+# Deterministic fast path (no LLM)
+from core.intent_matcher import match_intent
 
 # LLM output validator
 from core.validators import validate_llm_json
 
+# Cache of executed results (time-aware TTL)
+from core.result_cache import RESULT_CACHE, RESULT_CACHE_ENABLED
+
+# Cursor → column arrays → JSON-safe encoding (no pandas)
+from core.result_fetch import (
+    fetch_columns,
+    row_count,
+    slice_rows,
+    to_columnar,
+    to_records,
+)
+
+# Page tokens + OFFSET/FETCH rewriting
+from core.pagination import (
+    QUERY_MAX_PAGE_SIZE,
+    decode_page_token,
+    encode_page_token,
+    paginate_sql,
+)
+
+# Row caps, statement timeouts, plan budgets
+from core.query_governor import (
+    apply_row_cap,
+    inject_row_cap,
+    review_plan,
+    row_cap,
+    stream_row_cap,
+)
+
+# Identical concurrent LLM calls / DB executions run once
+from core.single_flight import (
+    DB_FLIGHTS,
+    LLM_FLIGHTS,
+    SINGLE_FLIGHT_DB_TIMEOUT,
+    SINGLE_FLIGHT_LLM_TIMEOUT,
+)
+
+# Local analytics replica (covered date ranges)
+from core.replica import open_query_cursor, use_replica
+
 # Central logging utility
 from core.logger import log_event
 
+# Latency histograms & counters (/metrics)
+from core.metrics import record_outcome, record_rows, time_stage
+
+
+# Rows per cursor.fetchmany() call when streaming
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
 
 # ============================================================
-# MAIN ENTRY POINT
+# HELPERS
 # ============================================================
 
-def make_json_safe(obj):
+def json_default(obj):
     """
-    Recursively convert numpy / pandas types
-    into native Python JSON-safe types.
+    json.dumps fallback for values that are not JSON-native.
     """
-    if isinstance(obj, dict):
-        return {k: make_json_safe(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [make_json_safe(v) for v in obj]
-    elif hasattr(obj, "item"):  # numpy scalar
+    if isinstance(obj, (datetime.date, datetime.datetime, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if hasattr(obj, "item"):  # numpy scalar
         return obj.item()
-    else:
-        return obj
+    return str(obj)
 
 
-def handle_question(question: str, mill: str = "hastings"):
-    """
-    Handles a user question end-to-end in a SAFE manner.
-
-    Parameters:
-    - question : Natural language user question
-    - mill     : Target mill database (default = hastings)
+# ============================================================
+# PIPELINE STAGES
+# ============================================================
+# Shared by handle_question (sync) and
+# core.async_runner.handle_question_async (async)
 
-    Possible outcomes:
+# Only table the LLM is allowed to see / query
+SCHEMA_TABLES = ["AttendanceReport"]
 
-    1️⃣ EXECUTED (Safe & successful)
-    {
-        "status": "executed",
-        "sql": "...",
-        "params": [...],
-        "rows": int,
-        "data": DataFrame
-    }
 
-    2️⃣ GENERATED BUT BLOCKED (Unsafe SQL)
-    {
-        "status": "generated",
-        "sql": "...",
-        "params": [...],
-        "message": "SQL was generated but execution was blocked"
-    }
+def load_schema_context(mill: str):
+    """
+    STEP 1️⃣b : Fetch DB schema for LLM context.
+    This prevents hallucinated columns/tables.
 
-    3️⃣ UNSUPPORTED (LLM couldn't understand)
-    {
-        "unsupported": True,
-        "message": "Query could not be understood."
-    }
+    Returns (schema_text, schema_fingerprint).
     """
+    schema_text = get_schema_text(SCHEMA_TABLES, mill)
+    schema_fp = get_schema_fingerprint(SCHEMA_TABLES, mill)
+    return schema_text, schema_fp
+
 
+def is_cacheable_llm_result(llm_result) -> bool:
+    """
+    True if fresh LLM output passes the JSON contract (with SQL) and
+    the SQL guard; anything else is never stored in the LLM cache.
+    """
     try:
-        # ====================================================
-        # STEP 1️⃣ : Fetch DB schema for LLM context
-        # ====================================================
-        # This prevents hallucinated columns/tables
-        schema_text = get_schema_text(
-            ["AttendanceReport"],  # Allowed table(s)
-            mill
-        )
+        if validate_llm_json(llm_result) != "sql":
+            return False
+    except ValueError:
+        return False
+    return check_sql(llm_result["sql"])["allowed"]
 
-        # ====================================================
-        # STEP 2️⃣ : Convert question → SQL using LLM
-        # ====================================================
-        llm_result = generate_sql_from_question(
-            question,
-            schema_text
-        )
 
-        # ----------------------------------------------------
-        # SAFETY CHECK: LLM must return a dictionary (JSON)
-        # ----------------------------------------------------
-        if not isinstance(llm_result, dict):
-            # Log unexpected LLM output
-            log_event(
-                "llm_unstructured_output",
-                {
-                    "question": question,
-                    "mill": mill,
-                    "llm_result": str(llm_result)
-                }
+def resolve_question(question: str, mill: str, use_cache: bool = True):
+    """
+    STEPS 1️⃣–2️⃣ : Turns a question into LLM-style JSON.
+
+    Returns (source, llm_result) where source is
+    "rule", "llm_cache" or "llm".
+    """
+
+    # ====================================================
+    # STEP 1️⃣ : Fast path for known question shapes
+    # ====================================================
+    # No schema fetch and no LLM call needed
+    with time_stage("fast_path", mill):
+        matched = match_intent(question)
+
+    if matched is not None:
+        return "rule", matched[1]
+
+    with time_stage("schema", mill):
+        schema_text, schema_fp = load_schema_context(mill)
+
+    # ====================================================
+    # STEP 2️⃣ : Convert question → SQL using LLM
+    # ====================================================
+    # Repeated questions are answered from the cache
+    if use_cache:
+        with time_stage("llm_cache", mill):
+            cached = get_cached_sql(question, mill, schema_fp)
+        if cached is not None:
+            return "llm_cache", cached
+
+    def generate():
+        with time_stage("llm", mill):
+            result = generate_sql_from_question(
+                question,
+                schema_text
             )
+        # Validated before caching: a bad answer is not served again
+        if is_cacheable_llm_result(result):
+            store_cached_sql(question, mill, schema_fp, result)
+        return result
 
-            # Graceful failure (no crash)
-            return {
-                "unsupported": True,
-                "message": "Query could not be understood."
-            }
+    # The same question asked concurrently shares one LLM call
+    try:
+        llm_result = LLM_FLIGHTS.run(
+            llm_cache_key(question, mill, schema_fp), generate, SINGLE_FLIGHT_LLM_TIMEOUT
+        )
+    except LLMUnavailableError:
+        # Circuit open: a cached answer beats none (even if bypassed)
+        cached = get_cached_sql(question, mill, schema_fp)
+        if cached is None:
+            raise
+        return "llm_cache", cached
 
-        # Extract SQL and parameters from LLM output
-        sql = llm_result.get("sql")
-        params = llm_result.get("params", [])
-
-        # ====================================================
-        # STEP 3️⃣ : Validate LLM JSON contract
-        # ====================================================
-        # Ensures:
-        # - SQL exists
-        # - Params are list
-        # - Unsupported queries are flagged
-        mode = validate_llm_json(llm_result)
+    return "llm", copy.deepcopy(llm_result)
 
-        # ----------------------------------------------------
-        # CASE: SQL was generated BUT execution is blocked
-        # ----------------------------------------------------
-        if mode == "unsupported" and sql:
-            log_event(
-                "sql_generated_but_blocked",
-                {
-                    "question": question,
-                    "mill": mill,
-                    "sql": sql,
-                    "params": params
-                }
-            )
 
-            return {
-                "status": "generated",
-                "sql": sql,
-                "params": params,
-                "message": (
-                    "SQL was generated but execution was blocked "
-                    "by safety rules."
-                )
-            }
+def check_llm_result(question: str, mill: str, llm_result, source: str):
+    """
+    STEPS 3️⃣–4️⃣ : Validates the LLM JSON contract and the SQL.
 
-        # ----------------------------------------------------
-        # CASE: Fully unsupported (no SQL at all)
-        # ----------------------------------------------------
-        if mode == "unsupported":
-            return {
-                "unsupported": True,
-                "message": "This query is not supported yet."
-            }
+    Returns:
+    - (response_dict, None, None) when there is nothing to execute
+    - (None, sql, params) when the SQL is safe to execute
+    """
 
-        # ====================================================
-        # STEP 4️⃣ : SQL SAFETY GUARD
-        # ====================================================
-        # Enforces:
-        # - SELECT only
-        # - No DML/DDL
-        # - No forbidden tables
-        validate_sql(sql)
-
-        # ====================================================
-        # STEP 5️⃣ : Execute SQL on database
-        # ====================================================
+    # ----------------------------------------------------
+    # SAFETY CHECK: LLM must return a dictionary (JSON)
+    # ----------------------------------------------------
+    if not isinstance(llm_result, dict):
+        # Log unexpected LLM output
         log_event(
-            "sql_execution_started",
+            "llm_unstructured_output",
             {
                 "question": question,
                 "mill": mill,
-                "sql": sql,
-                "params": params
+                "source": source,
+                "llm_result": str(llm_result)
             }
         )
 
-        # Open DB connection
-        conn = get_conn(mill)
-
-        # Execute query safely using parameterized SQL
-        df = pd.read_sql(sql, conn, params=params)
-
-        # Close DB connection immediately
-        conn.close()
+        # Graceful failure (no crash)
+        record_outcome(mill, "unsupported", source)
+        return {
+            "unsupported": True,
+            "message": "Query could not be understood."
+        }, None, None
+
+    # Extract SQL and parameters from LLM output
+    sql = llm_result.get("sql")
+    params = llm_result.get("params", [])
+
+    # ====================================================
+    # STEP 3️⃣ : Validate LLM JSON contract
+    # ====================================================
+    # Ensures:
+    # - SQL exists
+    # - Params are list
+    # - Unsupported queries are flagged
+    with time_stage("validate_json", mill):
+        mode = validate_llm_json(llm_result)
 
-        # ====================================================
-        # STEP 6️⃣ : Log successful execution
-        # ====================================================
+    # ----------------------------------------------------
+    # CASE: SQL was generated BUT execution is blocked
+    # ----------------------------------------------------
+    if mode == "unsupported" and sql:
         log_event(
-            "sql_executed",
+            "sql_generated_but_blocked",
             {
                 "question": question,
                 "mill": mill,
+                "source": source,
                 "sql": sql,
-                "params": params,
-                "rows_returned": len(df)
+                "params": params
             }
         )
 
-        # Return successful response
-        # return {
-        #     "status": "executed",
-        #     "sql": sql,
-        #     "params": params,
-        #     "rows": len(df),
-        #     "data": df
-        # }
-        data = df.to_dict(orient="records")
-        data = make_json_safe(data)
+        record_outcome(mill, "generated", source)
+        return {
+            "status": "generated",
+            "source": source,
+            "sql": sql,
+            "params": params,
+            "message": (
+                "SQL was generated but execution was blocked "
+                "by safety rules."
+            )
+        }, None, None
 
+    # ----------------------------------------------------
+    # CASE: Fully unsupported (no SQL at all)
+    # ----------------------------------------------------
+    if mode == "unsupported":
+        record_outcome(mill, "unsupported", source)
         return {
-            "status": "executed",
+            "unsupported": True,
+            "source": source,
+            "message": "This query is not supported yet."
+        }, None, None
+
+    # ====================================================
+    # STEP 4️⃣ : SQL SAFETY GUARD
+    # ====================================================
+    # Enforces:
+    # - SELECT only (CTEs allowed)
+    # - No DML/DDL, SELECT INTO, variables
+    # - No forbidden tables (FROM / JOIN / APPLY / subqueries)
+    with time_stage("validate_sql", mill):
+        verdict = check_sql(sql)
+
+    if not verdict["allowed"]:
+        return blocked_response(
+            question, mill, source, sql, params, verdict["reason"]
+        ), None, None
+
+    return None, sql, params
+
+
+def blocked_response(question, mill, source, sql, params, reason: str):
+    """
+    "generated" response for SQL that the guard or the
+    governor refused to run (with the reason).
+    """
+    log_event(
+        "sql_generated_but_blocked",
+        {
+            "question": question,
+            "mill": mill,
+            "source": source,
             "sql": sql,
             "params": params,
-            "rows": int(len(df)),
-            "data": data
+            "reason": reason
         }
+    )
+
+    record_outcome(mill, "generated", source)
+    return {
+        "status": "generated",
+        "source": source,
+        "sql": sql,
+        "params": params,
+        "message": (
+            "SQL was generated but execution was blocked "
+            "by safety rules."
+        ),
+        "blocked_reason": reason
+    }
+
+
+def execute_sql(
+    question: str,
+    mill: str,
+    source: str,
+    sql: str,
+    params: list,
+    use_cache: bool = True,
+    page_size: int = None,
+    page_token: str = None,
+    result_format: str = "records",
+):
+    """
+    STEPS 5️⃣–6️⃣ : Executes validated SQL (blocking DB I/O)
+    and builds the "executed" response.
 
+    With page_size, only one page is fetched (OFFSET/FETCH) and the
+    response carries "next_page_token" (None on the last page).
 
+    The query governor caps rows (OFFSET/FETCH window when paged,
+    TOP injection otherwise, plus a fetch cap),
+    sets a statement timeout and, if enabled, checks the estimated
+    plan against the mill's budget. "truncated" tells the caller
+    that rows beyond "row_cap" were dropped.
 
+    Queries whose WDate range the local replica covers run there
+    ("replica": True), without the plan check.
+
+    result_format decides the shape of "data":
+    - records  : [{"col": value}, ...]           (JSON-safe)
+    - columnar : {"columns": [...], "rows": [...]} (JSON-safe)
+    - arrow    : raw column set (core.result_fetch) for Arrow encoding
+    """
+
+    base_sql, base_params = sql, params
+    offset = 0
+    if page_size:
+        page_size = max(1, min(int(page_size), QUERY_MAX_PAGE_SIZE))
+        offset = decode_page_token(page_token, base_sql, base_params)
+
+    # ====================================================
+    # STEP 4️⃣b : Query governor
+    # ====================================================
+    cap = row_cap(mill)
+    downgraded = False
+    replica = use_replica(mill, base_sql, base_params)
+
+    decision = None
+    if not replica:
+        with time_stage("plan_check", mill):
+            decision = review_plan(mill, base_sql, base_params)
+
+    if decision is not None:
+        if decision["action"] == "reject":
+            return blocked_response(
+                question, mill, source, base_sql, base_params, decision["reason"]
+            )
+        cap, downgraded = decision["row_cap"], True
+
+    # Pagination: fetch one extra row to know if more pages exist;
+    # the cap bounds the FETCH window (offset + fetch <= cap + 1)
+    fetch_rows = None
+    if page_size:
+        fetch_rows = page_size + 1
+        if cap:
+            fetch_rows = max(1, min(fetch_rows, cap + 1 - offset))
+        paged = paginate_sql(sql, base_params, offset, fetch_rows)
+        if paged is None:
+            # Not pageable as written: one page with every (capped) row
+            page_size, fetch_rows = None, None
+        else:
+            sql, params = paged
+
+    # Unpaged: one extra row tells whether the cap cut anything off
+    if cap and not page_size:
+        sql, _ = inject_row_cap(sql, cap + 1)
+
+    # ====================================================
+    # STEP 5️⃣ : Execute SQL on database
+    # ====================================================
+    log_event(
+        "sql_execution_started",
+        {
+            "question": question,
+            "mill": mill,
+            "source": source,
+            "sql": sql,
+            "params": params
+        }
+    )
+
+    # Identical (mill, sql, params) with the same shaping
+    # arguments may already be cached
+    max_rows = fetch_rows or (cap + 1 if cap else None)
+    shape = (max_rows, page_size, result_format)
+    colset = None
+    if use_cache and RESULT_CACHE_ENABLED:
+        with time_stage("result_cache", mill):
+            colset = RESULT_CACHE.get(mill, sql, params, shape)
+    cached = colset is not None
+
+    if not cached:
+        def fetch():
+            # Replica or a pooled DB connection (released on exit)
+            with time_stage("db_execute", mill), ExitStack() as stack:
+                # Execute query safely using parameterized SQL
+                cursor, ran_on_replica = open_query_cursor(stack, mill, sql, params, replica)
+
+                # Rows go straight into per-column arrays
+                # (bounded even when no TOP could be injected)
+                fetched = fetch_columns(cursor, max_rows=max_rows)
+                cursor.close()
+
+            if RESULT_CACHE_ENABLED:
+                RESULT_CACHE.set(mill, sql, params, fetched, shape=shape)
+            return fetched, ran_on_replica
+
+        # Identical concurrent executions share one DB round trip
+        # (the column set is only read, never modified, downstream)
+        colset, replica = DB_FLIGHTS.run(
+            (mill, sql, json.dumps(params, default=str), max_rows),
+            fetch,
+            SINGLE_FLIGHT_DB_TIMEOUT,
+        )
+
+    total_rows = row_count(colset)
+
+    has_more = False
+    if page_size:
+        has_more = total_rows > page_size
+        colset = slice_rows(colset, 0, page_size)
+
+    keep, has_more, truncated = apply_row_cap(
+        row_count(colset), offset, has_more, cap
+    )
+    if truncated:
+        colset = slice_rows(colset, 0, keep)
+
+    # ====================================================
+    # STEP 6️⃣ : Log successful execution
+    # ====================================================
+    log_event(
+        "sql_executed",
+        {
+            "question": question,
+            "mill": mill,
+            "source": source,
+            "sql": sql,
+            "params": params,
+            "rows_returned": total_rows,
+            "cached": cached,
+            "truncated": truncated,
+            "replica": replica and not cached
+        }
+    )
+
+    # Encode once, in the caller's format
+    with time_stage("serialize", mill):
+        if result_format == "columnar":
+            data = to_columnar(colset)
+        elif result_format == "arrow":
+            data = colset
+        else:
+            data = to_records(colset)
+
+    record_outcome(mill, "executed", source)
+    record_rows(mill, "query", row_count(colset))
+
+    response = {
+        "status": "executed",
+        "source": source,
+        "sql": base_sql,
+        "params": base_params,
+        "rows": row_count(colset),
+        "data": data,
+        "cached": cached,
+        "truncated": truncated,
+        "row_cap": cap or None,
+        "replica": replica and not cached
+    }
+
+    if downgraded:
+        response["downgraded"] = True
+        response["downgrade_reason"] = decision["reason"]
+
+    if page_size:
+        response.update(
+            page_size=page_size,
+            offset=offset,
+            next_page_token=(
+                encode_page_token(base_sql, base_params, offset + page_size)
+                if has_more else None
+            ),
+        )
+
+    # Return successful response
+    # return {
+    #     "status": "executed",
+    #     "sql": sql,
+    #     "params": params,
+    #     "rows": len(df),
+    #     "data": df
+    # }
+    return response
+
+
+def stream_sql(
+    question: str,
+    mill: str,
+    source: str,
+    sql: str,
+    params: list,
+    batch_size: int = None,
+):
+    """
+    Executes validated SQL and yields the result incrementally
+    (blocking generator, one cursor.fetchmany batch at a time):
+
+    {"type": "meta", "status": "executed", "source", "sql", "params",
+     "columns", "row_cap"}
+    {"type": "rows", "data": [{...}, ...]}      (repeated)
+    {"type": "end", "rows": int, "truncated": bool}
+
+    A DB failure ends the stream with {"type": "error", ...}.
+    A query the governor rejects (plan budget) yields one
+    {"type": "result", ...} blocked response and nothing is run.
+
+    Large results are never fully held in memory.
+    The result cache is bypassed; covered date ranges are read
+    from the local replica. Rows are capped at the mill's
+    streaming row cap (or the downgrade cap).
+    """
+    batch_size = batch_size or STREAM_BATCH_SIZE
+
+    # ====================================================
+    # STEP 4️⃣b : Query governor (as in execute_sql)
+    # ====================================================
+    try:
+        cap = stream_row_cap(mill)
+        replica = use_replica(mill, sql, params)
+
+        decision = None
+        if not replica:
+            with time_stage("plan_check", mill):
+                decision = review_plan(mill, sql, params)
     except Exception as e:
-        # ====================================================
-        # FINAL FAIL-SAFE (UI MUST NEVER CRASH)
-        # ====================================================
-        log_event(
-            "sql_execution_error",
-            {
-                "question": question,
-                "mill": mill,
-                "error": str(e)
+        yield {"type": "result", **failure_response(question, mill, source, e)}
+        return
+
+    if decision is not None:
+        if decision["action"] == "reject":
+            yield {
+                "type": "result",
+                **blocked_response(question, mill, source, sql, params, decision["reason"]),
+            }
+            return
+        cap = decision["row_cap"]
+
+    # One extra row tells whether the cap cut anything off
+    query = inject_row_cap(sql, cap + 1)[0] if cap else sql
+
+    log_event(
+        "sql_execution_started",
+        {
+            "question": question,
+            "mill": mill,
+            "source": source,
+            "sql": sql,
+            "params": params,
+            "streamed": True
+        }
+    )
+
+    total = 0
+    truncated = False
+
+    try:
+        # Connection is held until the stream finishes (or is abandoned)
+        with time_stage("db_stream", mill), ExitStack() as stack:
+            cursor, replica = open_query_cursor(stack, mill, query, params, replica)
+
+            columns = [col[0] for col in cursor.description]
+            types = [col[1] for col in cursor.description]
+
+            yield {
+                "type": "meta",
+                "status": "executed",
+                "source": source,
+                "sql": sql,
+                "params": params,
+                "columns": columns,
+                "row_cap": cap or None,
             }
-        )
 
+            while not truncated:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+
+                if cap and total + len(rows) > cap:
+                    rows, truncated = rows[:cap - total], True
+                    if not rows:
+                        break
+
+                total += len(rows)
+                yield {
+                    "type": "rows",
+                    "data": to_records({
+                        "columns": columns,
+                        "types": types,
+                        "values": [list(col) for col in zip(*rows)],
+                    }),
+                }
+
+    except Exception as e:
+        # Headers are already sent: report the failure in-band
+        yield {"type": "error", **failure_response(question, mill, source, e)}
+        return
+
+    log_event(
+        "sql_executed",
+        {
+            "question": question,
+            "mill": mill,
+            "source": source,
+            "sql": sql,
+            "params": params,
+            "rows_returned": total,
+            "truncated": truncated,
+            "streamed": True,
+            "replica": replica
+        }
+    )
+
+    record_outcome(mill, "executed", source)
+    record_rows(mill, "query_stream", total)
+
+    yield {"type": "end", "rows": total, "truncated": truncated}
+
+
+def failure_response(question: str, mill: str, source, error: Exception):
+    """
+    FINAL FAIL-SAFE (UI MUST NEVER CRASH)
+    """
+    record_outcome(mill, "error", source)
+
+    log_event(
+        "sql_execution_error",
+        {
+            "question": question,
+            "mill": mill,
+            "source": source,
+            "error": str(error)
+        }
+    )
+
+    if isinstance(error, LLMUnavailableError):
         return {
             "unsupported": True,
             "message": (
-                "Query execution failed. "
-                "Please refine the question."
+                "The query assistant is temporarily unavailable. "
+                "Common questions (attendance, outsiders, overtime) "
+                "still work; please retry others shortly."
             )
         }
+
+    return {
+        "unsupported": True,
+        "message": (
+            "Query execution failed. "
+            "Please refine the question."
+        )
+    }
+
+
+# ============================================================
+# MAIN ENTRY POINT
+# ============================================================
+
+def handle_question(
+    question: str,
+    mill: str = "hastings",
+    use_cache: bool = True,
+    page_size: int = None,
+    page_token: str = None,
+    result_format: str = "records",
+):
+    """
+    Handles a user question end-to-end in a SAFE manner.
+
+    Parameters:
+    - question   : Natural language user question
+    - mill       : Target mill database (default = hastings)
+    - use_cache  : Serve repeated questions from the LLM cache and
+                   repeated queries from the result cache
+                   (False forces a fresh LLM call and DB read)
+    - page_size  : Return only one page of rows (see execute_sql)
+    - page_token : "next_page_token" from the previous page
+    - result_format : records | columnar | arrow (see execute_sql)
+
+    Possible outcomes:
+
+    1️⃣ EXECUTED (Safe & successful)
+    {
+        "status": "executed",
+        "source": "rule" | "llm_cache" | "llm",
+        "sql": "...",
+        "params": [...],
+        "rows": int,
+        "data": [...],
+        "cached": bool,   (served from the result cache)
+        "truncated": bool,   (more than row_cap rows matched)
+        "row_cap": int | None
+    }
+
+    2️⃣ GENERATED BUT BLOCKED (Unsafe SQL)
+    {
+        "status": "generated",
+        "source": ...,
+        "sql": "...",
+        "params": [...],
+        "message": "SQL was generated but execution was blocked",
+        "blocked_reason": "..."   (when rejected by the SQL guard)
+    }
+
+    3️⃣ UNSUPPORTED (LLM couldn't understand)
+    {
+        "unsupported": True,
+        "message": "Query could not be understood."
+    }
+
+    "source" tells which path produced the SQL:
+    - rule      : deterministic fast-path matcher
+    - llm_cache : cached LLM answer
+    - llm       : fresh LLM call
+    """
+
+    source = None
+
+    try:
+        # Unknown mills fail here, before any per-mill metric or limit
+        mill = normalize_mill(mill)
+
+        # STEPS 1️⃣–2️⃣ : fast path / cached LLM / LLM
+        source, llm_result = resolve_question(question, mill, use_cache)
+
+        # STEPS 3️⃣–4️⃣ : contract + safety validation
+        response, sql, params = check_llm_result(
+            question, mill, llm_result, source
+        )
+        if response is not None:
+            return response
+
+        # STEPS 5️⃣–6️⃣ : execution
+        return execute_sql(
+            question, mill, source, sql, params,
+            use_cache, page_size, page_token, result_format
+        )
+
+    except Exception as e:
+        return failure_response(question, mill, source, e)
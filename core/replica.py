@@ -0,0 +1,547 @@
+"""
+Local analytics replica
+Purpose:
+- Optional per-mill SQLite copy of AttendanceReport, synced
+  incrementally by WDate watermark (rows up to REPLICA_LAG_DAYS
+  before today; recent days can still change at source)
+- Route validated SELECTs whose WDate range ends on or before the
+  watermark to the replica, and the analytics helpers' date ranges
+  likewise; everything else runs on the live SQL Server
+- A query the replica cannot run falls back to live
+
+A query is routed only if every AttendanceReport reference is
+bounded above by a top-level WDate predicate (=, <, <=, BETWEEN)
+with a known value (parameter, literal or CAST(GETDATE() ± n AS DATE)).
+Corrections to rows older than the lag window need a full resync
+(POST /admin/replica/sync with {"full": true}).
+
+Text columns compare case-insensitively (COLLATE NOCASE) and CHAR
+padding is stripped on copy, like SQL Server's default collation.
+Remaining differences from SQL Server:
+- NOCASE folds ASCII letters only
+- Trailing spaces in VARCHAR values / literals still count in
+  comparisons ('A ' = 'A' is false)
+- String concatenation with + is numeric in SQLite; queries that
+  add to a string literal are not routed, column + column is not
+  detected
+- Dates are text: date columns hold 'YYYY-MM-DD', datetime columns
+  'YYYY-MM-DD HH:MM:SS' (the date alone at midnight), as do bound
+  parameters (core.sql_dialect.adapt_value); a literal written in
+  another format ('2025-01-01T00:00:00', '20250101') compares as
+  text, not as a date
+"""
+
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from core.db import db_connection, get_schema_columns, normalize_mill
+from core.logger import log_event
+from core.metrics import time_stage
+from core.query_governor import query_timeout, statement_timeout
+from core.sql_dialect import SQLiteConnection, adapt_value
+from core.sql_guard import IDENT, NUMBER, PUNCT, STRING, WORD, iter_tokens
+
+# -------------------------
+# Replica settings
+# -------------------------
+REPLICA_ENABLED = os.getenv("REPLICA_ENABLED", "0") == "1"
+REPLICA_DIR = Path(os.getenv(
+    "REPLICA_DIR",
+    str(Path(__file__).resolve().parent.parent / "data" / "replica"),
+))
+# Days before today that are only served live
+REPLICA_LAG_DAYS = int(os.getenv("REPLICA_LAG_DAYS", "2"))
+# Seconds between background syncs per mill
+REPLICA_SYNC_INTERVAL = float(os.getenv("REPLICA_SYNC_INTERVAL", "900"))
+# Statement timeout of sync queries (a first sync copies the table)
+REPLICA_SYNC_TIMEOUT = int(os.getenv("REPLICA_SYNC_TIMEOUT", "3600"))
+REPLICA_SYNC_BATCH = int(os.getenv("REPLICA_SYNC_BATCH", "5000"))
+
+TABLE = "AttendanceReport"
+
+# Indexed replica columns (when present in the source schema)
+_INDEXES = [("WDate",), ("ECode", "WDate"), ("Dept_Code", "WDate")]
+
+# Bump to rebuild existing replicas when the table layout changes
+# (2: NOCASE text, 3: dates stored as YYYY-MM-DD)
+_LAYOUT_VERSION = 3
+
+# Fixed-length types: SQL Server pads them with spaces
+_PADDED_TYPES = {"char", "nchar"}
+
+_SQLITE_AFFINITY = {
+    "int": "INTEGER", "bigint": "INTEGER", "smallint": "INTEGER",
+    "tinyint": "INTEGER", "bit": "INTEGER",
+    "decimal": "REAL", "numeric": "REAL", "float": "REAL",
+    "real": "REAL", "money": "REAL", "smallmoney": "REAL",
+}
+
+# mill → watermark (date) once known
+_WATERMARKS = {}
+_SYNC_LOCKS = {}
+_LAST_SYNC = {}
+_STATE_LOCK = threading.Lock()
+
+
+def _as_date(value) -> datetime.date:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value).strip()[:10])
+
+
+def _path(mill: str) -> Path:
+    return REPLICA_DIR / f"{mill}.sqlite"
+
+# ============================================================
+# SYNC
+# ============================================================
+
+def _open_store(mill: str) -> sqlite3.Connection:
+    REPLICA_DIR.mkdir(parents=True, exist_ok=True)
+    store = sqlite3.connect(str(_path(mill)), isolation_level=None)
+    # Readers keep working while a sync writes
+    store.execute("PRAGMA journal_mode=WAL")
+    store.execute("CREATE TABLE IF NOT EXISTS replica_meta (key TEXT PRIMARY KEY, value TEXT)")
+    return store
+
+
+def _meta(store, key: str):
+    row = store.execute("SELECT value FROM replica_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _column_type(dtype) -> str:
+    # Case-insensitive text, as under SQL Server's default collation
+    return _SQLITE_AFFINITY.get(str(dtype).lower(), "TEXT COLLATE NOCASE")
+
+
+def _create_table(store, name: str, columns):
+    definition = ", ".join(f'"{col}" {_column_type(dtype)}' for col, dtype in columns)
+    store.execute(f'DROP TABLE IF EXISTS "{name}"')
+    store.execute(f'CREATE TABLE "{name}" ({definition})')
+
+
+def _create_indexes(store, columns):
+    names = {col.lower(): col for col, _ in columns}
+    for index in _INDEXES:
+        if all(col.lower() in names for col in index):
+            cols = ", ".join(f'"{names[col.lower()]}"' for col in index)
+            store.execute(
+                f'CREATE INDEX IF NOT EXISTS "ix_{"_".join(index).lower()}" ON "{TABLE}" ({cols})'
+            )
+
+
+def _copy_rows(cursor, store, table: str, columns, where: str, params) -> int:
+    """Streams source rows into the replica table; returns the row count."""
+    names = ", ".join(f"[{col}]" for col, _ in columns)
+    cursor.execute(f"SELECT {names} FROM {TABLE} WHERE {where}", *params)
+
+    insert = (
+        f'INSERT INTO "{table}" VALUES ({", ".join("?" for _ in columns)})'
+    )
+    padded = [str(dtype).lower() in _PADDED_TYPES for _, dtype in columns]
+
+    def adapt(row):
+        return [
+            v.rstrip(" ") if pad and isinstance(v, str) else adapt_value(v)
+            for v, pad in zip(row, padded)
+        ]
+
+    copied = 0
+    while True:
+        rows = cursor.fetchmany(REPLICA_SYNC_BATCH)
+        if not rows:
+            return copied
+        store.executemany(insert, (adapt(row) for row in rows))
+        copied += len(rows)
+
+
+def _sync_lock(mill: str) -> threading.Lock:
+    with _STATE_LOCK:
+        return _SYNC_LOCKS.setdefault(mill, threading.Lock())
+
+
+def sync_replica(mill: str, full: bool = False) -> dict:
+    """
+    Copies the rows after the watermark (up to today - REPLICA_LAG_DAYS)
+    into the replica. The first sync, a schema change or full=True
+    rebuilds the copy (readers keep the old one until it is swapped in).
+
+    Returns {"mill", "full", "from", "to", "rows", "watermark"}.
+    """
+    mill = normalize_mill(mill)
+    cutoff = datetime.date.today() - datetime.timedelta(days=REPLICA_LAG_DAYS)
+
+    with _sync_lock(mill):
+        columns = get_schema_columns([TABLE], mill).get(TABLE)
+        if not columns:
+            raise ValueError(f"{TABLE} not found for mill {mill}")
+        signature = json.dumps({"layout": _LAYOUT_VERSION, "columns": columns})
+
+        store = _open_store(mill)
+        try:
+            watermark = _meta(store, "watermark")
+            rebuild = full or watermark is None or _meta(store, "schema") != signature
+            since = None if rebuild else _as_date(watermark)
+
+            if since is not None and since >= cutoff:
+                _WATERMARKS[mill] = since
+                return {"mill": mill, "full": False, "from": None, "to": None,
+                        "rows": 0, "watermark": since.isoformat()}
+
+            with time_stage("replica_sync", mill), db_connection(mill) as conn, \
+                    statement_timeout(conn, REPLICA_SYNC_TIMEOUT):
+                cursor = conn.cursor()
+
+                if rebuild:
+                    # Built next to the live copy, swapped in one transaction
+                    building = f"{TABLE}__building"
+                    _create_table(store, building, columns)
+                    store.execute("BEGIN")
+                    copied = _copy_rows(
+                        cursor, store, building, columns,
+                        "WDate <= ?", [cutoff.isoformat()],
+                    )
+                    store.execute("COMMIT")
+
+                    store.execute("BEGIN IMMEDIATE")
+                    store.execute(f'DROP TABLE IF EXISTS "{TABLE}"')
+                    store.execute(f'ALTER TABLE "{building}" RENAME TO "{TABLE}"')
+                    _create_indexes(store, columns)
+                else:
+                    store.execute("BEGIN IMMEDIATE")
+                    copied = _copy_rows(
+                        cursor, store, TABLE, columns,
+                        "WDate > ? AND WDate <= ?", [since.isoformat(), cutoff.isoformat()],
+                    )
+
+                store.executemany(
+                    "INSERT OR REPLACE INTO replica_meta (key, value) VALUES (?, ?)",
+                    [("watermark", cutoff.isoformat()), ("schema", signature)],
+                )
+                store.execute("COMMIT")
+        except BaseException:
+            if store.in_transaction:
+                store.execute("ROLLBACK")
+            raise
+        finally:
+            store.close()
+
+    _WATERMARKS[mill] = cutoff
+
+    result = {
+        "mill": mill,
+        "full": rebuild,
+        "from": since.isoformat() if since else None,
+        "to": cutoff.isoformat(),
+        "rows": copied,
+        "watermark": cutoff.isoformat(),
+    }
+    log_event("replica_synced", result)
+    return result
+
+
+def _schedule_sync(mill: str):
+    """Background sync at most every REPLICA_SYNC_INTERVAL per mill."""
+    now = time.monotonic()
+    with _STATE_LOCK:
+        last = _LAST_SYNC.get(mill)
+        if last is not None and now - last < REPLICA_SYNC_INTERVAL:
+            return
+        _LAST_SYNC[mill] = now
+
+    def run():
+        try:
+            sync_replica(mill)
+        except Exception as e:
+            log_event("replica_sync_error", {"mill": mill, "error": str(e)}, level="error")
+
+    threading.Thread(target=run, name=f"smarteye-replica-{mill}", daemon=True).start()
+
+
+def replica_watermark(mill: str):
+    """
+    Last WDate fully held by the replica (None = no replica yet).
+    Also starts a background sync when one is due.
+    """
+    if not REPLICA_ENABLED:
+        return None
+
+    mill = normalize_mill(mill)
+    _schedule_sync(mill)
+
+    if mill not in _WATERMARKS and _path(mill).exists():
+        store = _open_store(mill)
+        try:
+            watermark = _meta(store, "watermark")
+        finally:
+            store.close()
+        if watermark is not None:
+            _WATERMARKS.setdefault(mill, _as_date(watermark))
+
+    return _WATERMARKS.get(mill)
+
+# ============================================================
+# ROUTING
+# ============================================================
+
+# Keywords ending the WHERE clause of a scope
+_WHERE_END = {
+    "group", "having", "order", "union", "except", "intersect",
+    "option", "for", "window",
+}
+
+
+def _table_name_at(tokens, i):
+    """Last part of the (dotted) name starting at tokens[i], lower-cased."""
+    if i >= len(tokens) or tokens[i][0] not in (WORD, IDENT):
+        return None
+    name = tokens[i][1]
+    while i + 2 < len(tokens) and tokens[i + 1][:2] == (PUNCT, ".") \
+            and tokens[i + 2][0] in (WORD, IDENT):
+        i += 2
+        name = tokens[i][1]
+    return name.lower()
+
+
+def wdate_upper_bound(sql: str, params):
+    """
+    Latest WDate the query can read, or None when some
+    AttendanceReport reference is not bounded above.
+    """
+    try:
+        tokens = list(iter_tokens(sql))
+    except ValueError:
+        return None
+
+    params = list(params or [])
+    param_index = {}
+    for i, token in enumerate(tokens):
+        if token[:2] == (PUNCT, "?"):
+            param_index[i] = len(param_index)
+
+    def value_at(i):
+        """(date or None, index after the operand)"""
+        if i >= len(tokens):
+            return None, i
+        kind, value, start, end = tokens[i]
+
+        if (kind, value) == (PUNCT, "?"):
+            k = param_index[i]
+            raw = params[k] if k < len(params) else None
+            try:
+                return _as_date(raw), i + 1
+            except (TypeError, ValueError):
+                return None, i + 1
+
+        if kind == STRING:
+            text = sql[start:end].lstrip("nN").strip("'")
+            try:
+                return _as_date(text), i + 1
+            except ValueError:
+                return None, i + 1
+
+        # CAST(GETDATE() [± n] AS DATE)
+        words = [t[:2] for t in tokens[i:i + 9]]
+        if words[:5] == [(WORD, "cast"), (PUNCT, "("), (WORD, "getdate"), (PUNCT, "("), (PUNCT, ")")]:
+            j, offset = i + 5, 0
+            if j + 1 < len(tokens) and tokens[j][:2] in ((PUNCT, "-"), (PUNCT, "+")) \
+                    and tokens[j + 1][0] == NUMBER and tokens[j + 1][1].isdigit():
+                offset = int(tokens[j + 1][1]) * (-1 if tokens[j][1] == "-" else 1)
+                j += 2
+            if [t[:2] for t in tokens[j:j + 3]] == [(WORD, "as"), (WORD, "date"), (PUNCT, ")")]:
+                return datetime.date.today() + datetime.timedelta(days=offset), j + 3
+
+        return None, i + 1
+
+    def bound_after(i):
+        """Upper bound set by the predicate after WDate at tokens[i]."""
+        j = i + 1
+        if j >= len(tokens):
+            return None
+        op = tokens[j][:2]
+
+        if op == (WORD, "between"):
+            _, k = value_at(j + 1)
+            if k < len(tokens) and tokens[k][:2] == (WORD, "and"):
+                bound, end = value_at(k + 1)
+            else:
+                return None
+        elif op == (PUNCT, "="):
+            bound, end = value_at(j + 1)
+        elif op == (PUNCT, "<"):
+            nxt = tokens[j + 1][:2] if j + 1 < len(tokens) else None
+            if nxt == (PUNCT, ">"):
+                return None
+            bound, end = value_at(j + 2 if nxt == (PUNCT, "=") else j + 1)
+        else:
+            return None
+
+        # "WDate <= ? + 1" and the like: not a plain value
+        if end < len(tokens) and tokens[end][0] == PUNCT and tokens[end][1] in "+-*/%":
+            return None
+        return bound
+
+    def new_scope():
+        return {"tables": 0, "from": False, "where": False, "or": False, "bound": None}
+
+    scopes = [new_scope()]
+    upper = None
+
+    def close(scope) -> bool:
+        nonlocal upper
+        if not scope["tables"]:
+            return True
+        # Several references (self-joins) may be bounded separately
+        if scope["tables"] > 1 or scope["or"] or scope["bound"] is None:
+            return False
+        upper = scope["bound"] if upper is None else max(upper, scope["bound"])
+        return True
+
+    for i, (kind, value, _, _) in enumerate(tokens):
+        scope = scopes[-1]
+
+        if kind == PUNCT:
+            if value == "(":
+                scopes.append(new_scope())
+            elif value == ")":
+                if len(scopes) == 1 or not close(scopes.pop()):
+                    return None
+            elif value == "," and scope["from"] and _table_name_at(tokens, i + 1) == "attendancereport":
+                scope["tables"] += 1
+
+        elif kind == WORD and value in ("from", "join"):
+            scope["from"] = True
+            if _table_name_at(tokens, i + 1) == "attendancereport":
+                scope["tables"] += 1
+
+        elif kind == WORD and value == "where":
+            scope["from"], scope["where"] = False, True
+
+        elif kind == WORD and value in _WHERE_END:
+            scope["from"], scope["where"] = False, False
+
+        elif kind == WORD and value == "or" and scope["where"]:
+            scope["or"] = True
+
+        elif kind in (WORD, IDENT) and value.lower() == "wdate" and scope["where"]:
+            start = i - 2 if i >= 2 and tokens[i - 1][:2] == (PUNCT, ".") else i
+            if start > 0 and tokens[start - 1][:2] == (WORD, "not"):
+                continue
+            bound = bound_after(i)
+            if bound is not None:
+                scope["bound"] = bound if scope["bound"] is None else min(scope["bound"], bound)
+
+    while scopes:
+        if not close(scopes.pop()):
+            return None
+
+    return upper
+
+
+def _concatenates_strings(sql: str) -> bool:
+    """"+" next to a string literal (numeric addition in SQLite)."""
+    try:
+        tokens = list(iter_tokens(sql))
+    except ValueError:
+        return True
+    for i, token in enumerate(tokens):
+        if token[:2] == (PUNCT, "+") and any(
+            0 <= j < len(tokens) and tokens[j][0] == STRING for j in (i - 1, i + 1)
+        ):
+            return True
+    return False
+
+
+def use_replica(mill: str, sql: str, params) -> bool:
+    """True if the replica holds every row the query can read."""
+    watermark = replica_watermark(mill)
+    if watermark is None:
+        return False
+    bound = wdate_upper_bound(sql, params)
+    return bound is not None and bound <= watermark and not _concatenates_strings(sql)
+
+
+@contextmanager
+def replica_connection(mill: str):
+    """Read-only pyodbc-like connection to the mill's replica."""
+    conn = SQLiteConnection(_path(normalize_mill(mill)), readonly=True)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def analytics_connection(mill: str, end_date):
+    """
+    Replica connection when it covers everything up to end_date,
+    else a pooled live connection (core.db.db_connection).
+    """
+    watermark = replica_watermark(mill)
+    if watermark is not None and _as_date(end_date) <= watermark:
+        with replica_connection(mill) as conn:
+            yield conn
+    else:
+        with db_connection(mill) as conn:
+            yield conn
+
+
+def open_query_cursor(stack: ExitStack, mill: str, sql: str, params, replica: bool):
+    """
+    Executes the query on the replica (if routed there) or live,
+    with the mill's statement timeout. A failure on the replica
+    (e.g. T-SQL it cannot run) is retried live.
+
+    Connections are released when `stack` closes.
+    Returns (cursor, ran_on_replica).
+    """
+    if replica:
+        attempt = ExitStack()
+        try:
+            conn = attempt.enter_context(replica_connection(mill))
+            attempt.enter_context(statement_timeout(conn, query_timeout(mill)))
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            stack.enter_context(attempt.pop_all())
+            return cursor, True
+        except Exception as e:
+            attempt.close()
+            log_event(
+                "replica_fallback",
+                {"mill": mill, "sql": sql, "error": str(e)},
+                level="warning",
+            )
+
+    conn = stack.enter_context(db_connection(mill))
+    stack.enter_context(statement_timeout(conn, query_timeout(mill)))
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    return cursor, False
+
+
+def get_replica_stats() -> dict:
+    """Watermark and row count of every mill's replica."""
+    stats = {"enabled": REPLICA_ENABLED, "mills": {}}
+    for path in sorted(REPLICA_DIR.glob("*.sqlite")) if REPLICA_DIR.exists() else []:
+        store = _open_store(path.stem)
+        try:
+            exists = store.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE,)
+            ).fetchone()
+            stats["mills"][path.stem] = {
+                "watermark": _meta(store, "watermark"),
+                "rows": store.execute(f'SELECT COUNT(*) FROM "{TABLE}"').fetchone()[0]
+                if exists else 0,
+            }
+        finally:
+            store.close()
+    return stats
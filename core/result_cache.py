@@ -0,0 +1,171 @@
+"""
+Result Cache
+Purpose:
+- Avoid re-running identical (mill, sql, params) queries
+  against the production mill databases
+- Time-aware expiry:
+    * WDate ranges ending before today → long TTL
+    * anything touching today / GETDATE() / open ranges → short TTL
+- Bounded by total BYTES (not entry count), LRU eviction
+- Per-mill invalidation
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from core.replica import wdate_upper_bound
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_LIVE_TTL = float(os.getenv("RESULT_CACHE_LIVE_TTL", "60"))
+RESULT_CACHE_HISTORICAL_TTL = float(os.getenv("RESULT_CACHE_HISTORICAL_TTL", "86400"))
+
+
+# ============================================================
+# TTL POLICY
+# ============================================================
+
+def result_ttl(sql: str, params, today: date = None) -> float:
+    """
+    Chooses how long a result may be cached.
+
+    - SQL using GETDATE() (moves with the day)          → live TTL
+    - WDate bounded above (=, <, <=, BETWEEN) before today → historical TTL
+    - Anything else (open-ended ranges such as
+      WDate >= ?, no WDate bound)                        → live TTL
+    """
+    today = today or date.today()
+
+    if "getdate" in sql.lower():
+        return RESULT_CACHE_LIVE_TTL
+
+    bound = wdate_upper_bound(sql, params)
+    if bound is not None and bound < today:
+        return RESULT_CACHE_HISTORICAL_TTL
+
+    return RESULT_CACHE_LIVE_TTL
+
+
+# Estimated bytes per cached cell; string columns are sized
+# from their first few values instead
+_CELL_BYTES = 16
+_SIZE_SAMPLE = 8
+
+
+def _estimate_size(colset: dict) -> int:
+    """
+    Approximate memory cost of a cached column set, from its row
+    and column counts (no serialization on the hot path).
+    """
+    size = 0
+    for name, column in zip(colset["columns"], colset["values"]):
+        sample = [v for v in column[:_SIZE_SAMPLE] if isinstance(v, str)]
+        cell = _CELL_BYTES
+        if sample:
+            cell = max(cell, sum(map(len, sample)) // len(sample))
+        size += len(name) + cell * len(column)
+    return size
+
+
+# ============================================================
+# CACHE
+# ============================================================
+
+class ResultCache:
+    """
+    Thread-safe LRU cache bounded by total estimated bytes.
+    Values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+
+        # key → (value, size_bytes, expires_at_monotonic)
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(mill: str, sql: str, params, shape=()) -> tuple:
+        """
+        shape: request arguments that change what a query returns
+        (fetch cap, page size, result format).
+        """
+        return (mill.lower().strip(), sql.strip(), tuple(params), tuple(shape))
+
+    def _remove_locked(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def get(self, mill: str, sql: str, params, shape=()):
+        key = self.make_key(mill, sql, params, shape)
+
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is None or time.monotonic() >= item[2]:
+                if item is not None:
+                    self._remove_locked(key)
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, mill: str, sql: str, params, value, ttl: float = None, shape=()):
+        if ttl is None:
+            ttl = result_ttl(sql, params)
+
+        size = _estimate_size(value)
+
+        # A single result larger than the whole budget is not cached
+        if size > self.max_bytes or ttl <= 0:
+            return
+
+        key = self.make_key(mill, sql, params, shape)
+
+        with self._lock:
+            if key in self._data:
+                self._remove_locked(key)
+
+            self._data[key] = (value, size, time.monotonic() + ttl)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove_locked(oldest)
+                self.evictions += 1
+
+    def invalidate(self, mill: str = None) -> int:
+        """Drops entries for one mill (or everything)."""
+        mill = mill.lower().strip() if mill else None
+
+        with self._lock:
+            keys = [k for k in self._data if mill is None or k[0] == mill]
+            for k in keys:
+                self._remove_locked(k)
+
+        return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Process-wide cache used by the query runner
+RESULT_CACHE = ResultCache(RESULT_CACHE_MAX_BYTES)
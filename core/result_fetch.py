@@ -0,0 +1,157 @@
+"""
+Result fetch layer (no pandas)
+Purpose:
+- Read DB cursor rows straight into per-column arrays
+- Normalize types ONCE per column, using cursor.description
+  (dates → ISO strings, Decimal → float, NaN → None)
+- Encode the result exactly once, in the format the caller wants
+
+A fetched result ("column set") looks like:
+{
+    "columns": ["ECode", "WDate", ...],
+    "types":   [str, datetime.date, ...],   (None if unknown)
+    "values":  [[...ECode values...], [...WDate values...], ...]
+}
+"""
+
+import datetime
+import decimal
+import math
+
+# Rows per fetchmany() round trip
+FETCH_BATCH_SIZE = 5000
+
+
+# ============================================================
+# FETCH
+# ============================================================
+
+def fetch_columns(cursor, batch_size: int = FETCH_BATCH_SIZE, max_rows: int = None) -> dict:
+    """
+    Reads the remaining rows of an executed cursor into columns
+    (at most max_rows, if given).
+    """
+    description = cursor.description or []
+    columns = [col[0] for col in description]
+    types = [col[1] if len(col) > 1 else None for col in description]
+    values = [[] for _ in columns]
+    fetched = 0
+
+    while max_rows is None or fetched < max_rows:
+        size = batch_size if max_rows is None else min(batch_size, max_rows - fetched)
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        fetched += len(rows)
+        # Transpose the batch once and extend each column in bulk
+        for target, column in zip(values, zip(*rows)):
+            target.extend(column)
+
+    return {"columns": columns, "types": types, "values": values}
+
+
+def row_count(colset: dict) -> int:
+    return len(colset["values"][0]) if colset["values"] else 0
+
+
+def slice_rows(colset: dict, start: int, stop: int) -> dict:
+    """Returns a column set restricted to rows [start, stop)."""
+    return {
+        "columns": colset["columns"],
+        "types": colset["types"],
+        "values": [column[start:stop] for column in colset["values"]],
+    }
+
+
+# ============================================================
+# TYPE NORMALIZATION (one converter per column)
+# ============================================================
+
+def _convert_float(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value
+
+
+def _convert_decimal(value):
+    return None if value is None else float(value)
+
+
+def _convert_temporal(value):
+    return None if value is None else value.isoformat()
+
+
+def _convert_bytes(value):
+    return None if value is None else bytes(value).hex()
+
+
+def _convert_any(value):
+    """Fallback for columns whose type is unknown or mixed."""
+    if value is None or isinstance(value, (str, int, bool)):
+        return value
+    if isinstance(value, float):
+        return _convert_float(value)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).hex()
+    if hasattr(value, "item"):  # numpy scalar
+        return value.item()
+    return str(value)
+
+
+def _converter_for(type_code, column):
+    """
+    Picks the converter for a column.
+    Returns None when values are already JSON-safe.
+    """
+    if type_code is None:
+        # Driver gave no type (e.g. SQLite): use the first non-null value
+        sample = next((v for v in column if v is not None), None)
+        type_code = type(sample) if sample is not None else str
+
+    if not isinstance(type_code, type):
+        return _convert_any
+    if issubclass(type_code, bool) or type_code in (str, int):
+        return None
+    if issubclass(type_code, float):
+        return _convert_float
+    if issubclass(type_code, decimal.Decimal):
+        return _convert_decimal
+    if issubclass(type_code, (datetime.date, datetime.time)):
+        return _convert_temporal
+    if issubclass(type_code, (bytes, bytearray)):
+        return _convert_bytes
+    return _convert_any
+
+
+def json_safe_values(colset: dict) -> list:
+    """
+    Column arrays with every value converted to a JSON-native type.
+    String / integer columns are passed through untouched.
+    """
+    safe = []
+    for type_code, column in zip(colset["types"], colset["values"]):
+        convert = _converter_for(type_code, column)
+        safe.append(column if convert is None else list(map(convert, column)))
+    return safe
+
+
+# ============================================================
+# ENCODING
+# ============================================================
+
+def to_records(colset: dict) -> list:
+    """[{"col": value, ...}, ...] (JSON-safe)."""
+    columns = colset["columns"]
+    return [dict(zip(columns, row)) for row in zip(*json_safe_values(colset))]
+
+
+def to_columnar(colset: dict) -> dict:
+    """{"columns": [...], "rows": [[...], ...]} (JSON-safe)."""
+    return {
+        "columns": list(colset["columns"]),
+        "rows": [list(row) for row in zip(*json_safe_values(colset))],
+    }
@@ -0,0 +1,607 @@
+"""
+Monthly attendance rollups
+Purpose:
+- Keep per-mill working days and per-employee attendance days by
+  (year, month) in a local SQLite store (one file per mill)
+- Refresh incrementally: only days after the stored WDate
+  watermark are aggregated, up to ROLLUP_LAG_DAYS before today
+  (recent days can still be corrected at source)
+- Answer month-wise attendance from the rollups for whole months;
+  the live database is only hit for partial edge months and the
+  not-yet-rolled-up tail
+
+Distinct days and SUM(DUTY) are additive over disjoint date ranges,
+so a month can be completed from the live tail. Corrections older
+than the lag window need a full rebuild
+(POST /admin/rollups/refresh with {"full": true}).
+"""
+
+import datetime
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from core.db import normalize_mill
+from core.logger import log_event
+from core.metrics import time_stage
+from core.query_governor import query_timeout, statement_timeout
+from core.replica import analytics_connection
+
+# -------------------------
+# Rollup settings
+# -------------------------
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "1") == "1"
+ROLLUP_DIR = Path(os.getenv(
+    "ROLLUP_DIR",
+    str(Path(__file__).resolve().parent.parent / "data" / "rollups"),
+))
+# Days before today that are still answered live
+ROLLUP_LAG_DAYS = int(os.getenv("ROLLUP_LAG_DAYS", "3"))
+# Seconds between background refreshes per mill
+ROLLUP_REFRESH_INTERVAL = float(os.getenv("ROLLUP_REFRESH_INTERVAL", "900"))
+# Statement timeout of refresh queries (a first build scans the table)
+ROLLUP_REFRESH_TIMEOUT = int(os.getenv("ROLLUP_REFRESH_TIMEOUT", "600"))
+
+# Bump to rebuild existing stores when the stored data changes
+# (2: ECodes stored normalized)
+_LAYOUT_VERSION = "2"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mill_month (
+    yr INTEGER NOT NULL,
+    mon INTEGER NOT NULL,
+    work_days INTEGER NOT NULL,
+    duty REAL NOT NULL,
+    PRIMARY KEY (yr, mon)
+);
+CREATE TABLE IF NOT EXISTS emp_month (
+    ecode TEXT NOT NULL,
+    yr INTEGER NOT NULL,
+    mon INTEGER NOT NULL,
+    attn_days INTEGER NOT NULL,
+    duty REAL NOT NULL,
+    PRIMARY KEY (ecode, yr, mon)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# One refresh per mill at a time
+_REFRESH_LOCKS = {}
+_REFRESH_LOCKS_GUARD = threading.Lock()
+# mill → monotonic time of the last (background) refresh start
+_LAST_REFRESH = {}
+
+# ============================================================
+# DATES
+# ============================================================
+
+def _as_date(value) -> datetime.date:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def _normalize_ecode(ecode) -> str:
+    # SQL Server compares ECodes case- and padding-insensitively
+    return str(ecode).strip().upper()
+
+
+def _month_start_after(day: datetime.date) -> datetime.date:
+    """First day of the month following `day`'s month."""
+    if day.month == 12:
+        return datetime.date(day.year + 1, 1, 1)
+    return datetime.date(day.year, day.month + 1, 1)
+
+
+def _whole_months(start, end, watermark):
+    """
+    (first, last) day span of the whole months inside [start, end]
+    that the rollups cover (up to the watermark), or None.
+    """
+    if watermark is None:
+        return None
+
+    first = start if start.day == 1 else _month_start_after(start)
+    next_day = end + datetime.timedelta(days=1)
+    last = end if next_day.day == 1 else next_day.replace(day=1) - datetime.timedelta(days=1)
+    last = min(last, watermark)
+
+    return (first, last) if first <= last else None
+
+# ============================================================
+# STORE
+# ============================================================
+
+def _connect(mill: str) -> sqlite3.Connection:
+    ROLLUP_DIR.mkdir(parents=True, exist_ok=True)
+    # Streams resume on any executor thread (never concurrently)
+    store = sqlite3.connect(
+        str(ROLLUP_DIR / f"{mill}.sqlite"),
+        isolation_level=None,
+        check_same_thread=False,
+    )
+    # Readers never block the refresh (and vice versa)
+    store.execute("PRAGMA journal_mode=WAL")
+    store.executescript(_SCHEMA)
+    return store
+
+
+def _read_watermark(store):
+    """Watermark, or None when the store is empty or of an older layout."""
+    meta = dict(store.execute(
+        "SELECT key, value FROM meta WHERE key IN ('watermark', 'layout')"
+    ).fetchall())
+    if "watermark" not in meta or meta.get("layout") != _LAYOUT_VERSION:
+        return None
+    return datetime.date.fromisoformat(meta["watermark"])
+
+
+def _refresh_lock(mill: str) -> threading.Lock:
+    with _REFRESH_LOCKS_GUARD:
+        return _REFRESH_LOCKS.setdefault(mill, threading.Lock())
+
+# ============================================================
+# REFRESH
+# ============================================================
+
+def _fetch_batches(cursor, size: int = 5000):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def refresh_rollups(mill: str, full: bool = False) -> dict:
+    """
+    Adds the days after the watermark (up to today - ROLLUP_LAG_DAYS)
+    to the rollups; full=True rebuilds them from scratch.
+
+    Returns {"mill", "from", "to", "watermark"}
+    ("from" is None for a full build).
+    """
+    mill = normalize_mill(mill)
+    cutoff = datetime.date.today() - datetime.timedelta(days=ROLLUP_LAG_DAYS)
+
+    with _refresh_lock(mill):
+        store = _connect(mill)
+        try:
+            watermark = None if full else _read_watermark(store)
+            if watermark is not None and watermark >= cutoff:
+                return {"mill": mill, "from": None, "to": None, "watermark": watermark.isoformat()}
+
+            where = "WDate <= ?"
+            params = [cutoff.isoformat()]
+            if watermark is not None:
+                where = "WDate > ? AND WDate <= ?"
+                params.insert(0, watermark.isoformat())
+
+            with time_stage("rollup_refresh", mill), analytics_connection(mill, cutoff) as conn, \
+                    statement_timeout(conn, ROLLUP_REFRESH_TIMEOUT):
+                cursor = conn.cursor()
+
+                # Working days of the mill
+                cursor.execute(
+                    f"""
+                    SELECT YEAR(WDate), MONTH(WDate), COUNT(DISTINCT WDate), SUM(DUTY)
+                    FROM AttendanceReport
+                    WHERE {where}
+                    GROUP BY YEAR(WDate), MONTH(WDate)
+                    """,
+                    *params,
+                )
+                mill_rows = [
+                    (int(yr), int(mon), int(days), float(duty or 0))
+                    for yr, mon, days, duty in cursor.fetchall()
+                ]
+
+                store.execute("BEGIN IMMEDIATE")
+                try:
+                    if watermark is None:
+                        store.execute("DELETE FROM mill_month")
+                        store.execute("DELETE FROM emp_month")
+
+                    store.executemany(
+                        """
+                        INSERT INTO mill_month (yr, mon, work_days, duty)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT (yr, mon) DO UPDATE SET
+                            work_days = work_days + excluded.work_days,
+                            duty = duty + excluded.duty
+                        """,
+                        mill_rows,
+                    )
+
+                    # Attendance days per employee (streamed, can be large)
+                    cursor.execute(
+                        f"""
+                        SELECT ECode, YEAR(WDate), MONTH(WDate),
+                               COUNT(DISTINCT WDate), SUM(DUTY)
+                        FROM AttendanceReport
+                        WHERE {where}
+                        GROUP BY ECode, YEAR(WDate), MONTH(WDate)
+                        """,
+                        *params,
+                    )
+                    for rows in _fetch_batches(cursor):
+                        store.executemany(
+                            """
+                            INSERT INTO emp_month (ecode, yr, mon, attn_days, duty)
+                            VALUES (?, ?, ?, ?, ?)
+                            ON CONFLICT (ecode, yr, mon) DO UPDATE SET
+                                attn_days = attn_days + excluded.attn_days,
+                                duty = duty + excluded.duty
+                            """,
+                            [
+                                (_normalize_ecode(ecode), int(yr), int(mon), int(days),
+                                 float(duty or 0))
+                                for ecode, yr, mon, days, duty in rows
+                            ],
+                        )
+
+                    store.executemany(
+                        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                        [("watermark", cutoff.isoformat()), ("layout", _LAYOUT_VERSION)],
+                    )
+                    store.execute("COMMIT")
+                except BaseException:
+                    store.execute("ROLLBACK")
+                    raise
+        finally:
+            store.close()
+
+    log_event(
+        "rollup_refreshed",
+        {
+            "mill": mill,
+            "from": watermark.isoformat() if watermark else None,
+            "to": cutoff.isoformat(),
+        }
+    )
+
+    return {
+        "mill": mill,
+        "from": watermark.isoformat() if watermark else None,
+        "to": cutoff.isoformat(),
+        "watermark": cutoff.isoformat(),
+    }
+
+
+def _refresh_in_background(mill: str):
+    def run():
+        try:
+            refresh_rollups(mill)
+        except Exception as e:
+            log_event("rollup_refresh_error", {"mill": mill, "error": str(e)}, level="error")
+
+    threading.Thread(target=run, name=f"smarteye-rollup-{mill}", daemon=True).start()
+
+
+def _schedule_refresh(mill: str):
+    """Starts a background refresh at most every ROLLUP_REFRESH_INTERVAL."""
+    now = time.monotonic()
+    with _REFRESH_LOCKS_GUARD:
+        last = _LAST_REFRESH.get(mill)
+        if last is not None and now - last < ROLLUP_REFRESH_INTERVAL:
+            return
+        _LAST_REFRESH[mill] = now
+    _refresh_in_background(mill)
+
+# ============================================================
+# QUERY
+# ============================================================
+
+def _live_ranges(start, end, span) -> list:
+    """Parts of [start, end] outside the rolled-up span (read live)."""
+    if span is None:
+        return [(start, end)]
+
+    ranges = []
+    if start < span[0]:
+        ranges.append((start, span[0] - datetime.timedelta(days=1)))
+    if span[1] < end:
+        ranges.append((span[1] + datetime.timedelta(days=1), end))
+    return ranges
+
+
+def _month_keys(span) -> tuple:
+    """(first, last) yr * 100 + mon keys of a day span."""
+    return tuple(d.year * 100 + d.month for d in span)
+
+
+def _read_rollups(mill: str, ecode: str, start, end):
+    """
+    Rollup rows for the whole months of [start, end] (one snapshot).
+    Returns (span, {(yr, mon): [days, duty]} mill, same for employee);
+    span is None when the rollups cover nothing in the range.
+    """
+    store = _connect(mill)
+    try:
+        store.execute("BEGIN")
+        span = _whole_months(start, end, _read_watermark(store))
+        if span is None:
+            store.execute("COMMIT")
+            return None, {}, {}
+
+        first, last = _month_keys(span)
+        mill_rows = store.execute(
+            "SELECT yr, mon, work_days, duty FROM mill_month "
+            "WHERE yr * 100 + mon BETWEEN ? AND ?",
+            (first, last),
+        ).fetchall()
+        emp_rows = store.execute(
+            "SELECT yr, mon, attn_days, duty FROM emp_month "
+            "WHERE ecode = ? AND yr * 100 + mon BETWEEN ? AND ?",
+            (ecode, first, last),
+        ).fetchall()
+        store.execute("COMMIT")
+    finally:
+        store.close()
+
+    return (
+        span,
+        {(yr, mon): [days, duty] for yr, mon, days, duty in mill_rows},
+        {(yr, mon): [days, duty] for yr, mon, days, duty in emp_rows},
+    )
+
+
+def _ranges_filter(ranges):
+    """WHERE fragment + params matching any of the date ranges."""
+    where = " OR ".join("(WDate BETWEEN ? AND ?)" for _ in ranges)
+    params = []
+    for start, end in ranges:
+        params += [start.isoformat(), end.isoformat()]
+    return f"({where})", params
+
+
+def _live_aggregates(mill: str, ecode: str, ranges, mill_months: dict, emp_months: dict):
+    """
+    Adds the live (year, month) aggregates of the given date ranges
+    to mill_months / emp_months in one scan.
+    """
+    where, range_params = _ranges_filter(ranges)
+    params = [ecode, ecode] + range_params
+
+    with analytics_connection(mill, max(e for _, e in ranges)) as conn, \
+            statement_timeout(conn, query_timeout(mill)):
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            SELECT
+                YEAR(WDate) AS yr,
+                MONTH(WDate) AS mon,
+                COUNT(DISTINCT WDate) AS work_days,
+                SUM(DUTY) AS duty,
+                COUNT(DISTINCT CASE WHEN ECode = ? THEN WDate END) AS attn_days,
+                SUM(CASE WHEN ECode = ? THEN DUTY END) AS attn_duty
+            FROM AttendanceReport
+            WHERE {where}
+            GROUP BY YEAR(WDate), MONTH(WDate)
+            """,
+            *params,
+        )
+        rows = cursor.fetchall()
+
+    for yr, mon, days, duty, attn_days, attn_duty in rows:
+        key = (int(yr), int(mon))
+        totals = mill_months.setdefault(key, [0, 0.0])
+        totals[0] += int(days)
+        totals[1] += float(duty or 0)
+        if attn_days:
+            totals = emp_months.setdefault(key, [0, 0.0])
+            totals[0] += int(attn_days)
+            totals[1] += float(attn_duty or 0)
+
+
+def monthwise_attendance(mill: str, start_date, end_date, ecode: str):
+    """
+    Working days of the mill and attendance days of `ecode` per
+    (year, month) of [start_date, end_date]; months without duty
+    (for the mill or the employee) are left out.
+
+    [{"year", "mon", "work_days", "attn_days"}, ...] in date order.
+    """
+    mill = normalize_mill(mill)
+    ecode = _normalize_ecode(ecode)
+    start, end = _as_date(start_date), _as_date(end_date)
+    if start > end:
+        return []
+
+    span, mill_months, emp_months = None, {}, {}
+    if ROLLUPS_ENABLED:
+        _schedule_refresh(mill)
+        span, mill_months, emp_months = _read_rollups(mill, ecode, start, end)
+
+    live = _live_ranges(start, end, span)
+    if live:
+        _live_aggregates(mill, ecode, live, mill_months, emp_months)
+
+    return [
+        {
+            "year": yr,
+            "mon": mon,
+            "work_days": mill_months[(yr, mon)][0],
+            "attn_days": emp_months[(yr, mon)][0],
+        }
+        for yr, mon in sorted(mill_months)
+        if mill_months[(yr, mon)][1] > 0
+        and (yr, mon) in emp_months
+        and emp_months[(yr, mon)][1] > 0
+    ]
+
+
+# ============================================================
+# BULK (ALL EMPLOYEES)
+# ============================================================
+
+# Larger ECode lists are filtered after the scan
+_MAX_ECODE_PARAMS = 500
+
+
+def _employee_rows(ecode: str, months: dict, mill_months: dict):
+    """Output rows of one employee (months with duty on both sides)."""
+    for yr, mon in sorted(months):
+        days, duty = months[(yr, mon)]
+        totals = mill_months.get((yr, mon))
+        if totals and totals[1] > 0 and duty > 0:
+            yield {
+                "ECode": ecode,
+                "year": yr,
+                "mon": mon,
+                "work_days": totals[0],
+                "attn_days": days,
+            }
+
+
+def _live_employee_months(cursor, ranges, ecodes):
+    """
+    One grouped scan: (ECode, yr, mon, days, duty) rows of the
+    date ranges, ordered by ECode, streamed in batches.
+    """
+    where, params = _ranges_filter(ranges)
+    if ecodes and len(ecodes) <= _MAX_ECODE_PARAMS:
+        where += f" AND ECode IN ({', '.join('?' for _ in ecodes)})"
+        params += sorted(ecodes)
+
+    cursor.execute(
+        f"""
+        SELECT ECode, YEAR(WDate), MONTH(WDate), COUNT(DISTINCT WDate), SUM(DUTY)
+        FROM AttendanceReport
+        WHERE {where}
+        GROUP BY ECode, YEAR(WDate), MONTH(WDate)
+        ORDER BY ECode, YEAR(WDate), MONTH(WDate)
+        """,
+        *params,
+    )
+
+    for rows in _fetch_batches(cursor):
+        for ecode, yr, mon, days, duty in rows:
+            ecode = _normalize_ecode(ecode)
+            if ecodes and ecode not in ecodes:
+                continue
+            yield ecode, int(yr), int(mon), int(days), float(duty or 0)
+
+
+def _live_mill_months(cursor, ranges, mill_months: dict):
+    where, params = _ranges_filter(ranges)
+    cursor.execute(
+        f"""
+        SELECT YEAR(WDate), MONTH(WDate), COUNT(DISTINCT WDate), SUM(DUTY)
+        FROM AttendanceReport
+        WHERE {where}
+        GROUP BY YEAR(WDate), MONTH(WDate)
+        """,
+        *params,
+    )
+    for yr, mon, days, duty in cursor.fetchall():
+        totals = mill_months.setdefault((int(yr), int(mon)), [0, 0.0])
+        totals[0] += int(days)
+        totals[1] += float(duty or 0)
+
+
+def monthwise_attendance_bulk(mill: str, start_date, end_date, ecodes=None):
+    """
+    Month-wise attendance of every employee (or only `ecodes`) in
+    [start_date, end_date], in one grouped scan instead of one
+    query per employee.
+
+    Yields {"ECode", "year", "mon", "work_days", "attn_days"},
+    grouped per employee, months in date order. Same rules as
+    monthwise_attendance (months without duty are left out).
+    """
+    mill = normalize_mill(mill)
+    start, end = _as_date(start_date), _as_date(end_date)
+    if start > end:
+        return
+
+    wanted = {_normalize_ecode(e) for e in ecodes} if ecodes else None
+
+    store = None
+    span, mill_months = None, {}
+    if ROLLUPS_ENABLED:
+        _schedule_refresh(mill)
+        store = _connect(mill)
+        # One snapshot for the whole stream
+        store.execute("BEGIN")
+        span = _whole_months(start, end, _read_watermark(store))
+
+    try:
+        if span is not None:
+            first, last = _month_keys(span)
+            for yr, mon, days, duty in store.execute(
+                "SELECT yr, mon, work_days, duty FROM mill_month "
+                "WHERE yr * 100 + mon BETWEEN ? AND ?",
+                (first, last),
+            ):
+                mill_months[(yr, mon)] = [days, duty]
+
+        live = _live_ranges(start, end, span)
+
+        with analytics_connection(mill, max((e for _, e in live), default=start)) as conn, \
+                statement_timeout(conn, query_timeout(mill)):
+            cursor = conn.cursor()
+            _live_mill_months(cursor, live, mill_months)
+
+            if span is None:
+                # Everything is live: stream straight from the scan
+                for ecode, group in itertools.groupby(
+                    _live_employee_months(cursor, live, wanted), key=lambda r: r[0]
+                ):
+                    months = {(yr, mon): (days, duty) for _, yr, mon, days, duty in group}
+                    yield from _employee_rows(ecode, months, mill_months)
+                return
+
+            # Edge months / tail only: small, kept in memory
+            live_months = {}
+            for ecode, yr, mon, days, duty in _live_employee_months(cursor, live, wanted):
+                live_months.setdefault(ecode, {})[(yr, mon)] = (days, duty)
+
+        # Whole months from the rollups, completed with the live part
+        rollup_rows = store.execute(
+            "SELECT ecode, yr, mon, attn_days, duty FROM emp_month "
+            "WHERE yr * 100 + mon BETWEEN ? AND ? ORDER BY ecode, yr, mon",
+            (first, last),
+        )
+        for ecode, group in itertools.groupby(rollup_rows, key=lambda r: r[0]):
+            if wanted and _normalize_ecode(ecode) not in wanted:
+                continue
+            months = {(yr, mon): [days, duty] for _, yr, mon, days, duty in group}
+            for key, (days, duty) in live_months.pop(ecode, {}).items():
+                totals = months.setdefault(key, [0, 0.0])
+                totals[0] += days
+                totals[1] += duty
+            yield from _employee_rows(ecode, months, mill_months)
+
+        # Employees seen only in the live part
+        for ecode in sorted(live_months):
+            yield from _employee_rows(ecode, live_months[ecode], mill_months)
+
+    finally:
+        if store is not None:
+            store.execute("COMMIT")
+            store.close()
+
+
+def get_rollup_stats() -> dict:
+    """Watermark and row counts of every mill's rollup store."""
+    stats = {}
+    for path in sorted(ROLLUP_DIR.glob("*.sqlite")) if ROLLUP_DIR.exists() else []:
+        store = _connect(path.stem)
+        try:
+            watermark = _read_watermark(store)
+            stats[path.stem] = {
+                "watermark": watermark.isoformat() if watermark else None,
+                "months": store.execute("SELECT COUNT(*) FROM mill_month").fetchone()[0],
+                "employee_months": store.execute("SELECT COUNT(*) FROM emp_month").fetchone()[0],
+            }
+        finally:
+            store.close()
+    return stats
@@ -0,0 +1,135 @@
+"""
+Single-flight coalescing
+Purpose:
+- Concurrent requests for the same key share ONE in-flight
+  computation instead of each running it (thundering herd at
+  shift change: same question, same mill, same second)
+- Used for LLM calls (normalized question + mill + schema) and
+  DB executions (mill + sql + params)
+- Waiters give up after a per-key timeout (TimeoutError); the
+  computation's own exception is raised in every waiter
+
+Only in-flight work is shared: once it finishes the key is free
+again (finished results live in the LLM / result caches).
+"""
+
+import asyncio
+import os
+import threading
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "1") == "1"
+# Seconds a request waits for someone else's LLM call / DB execution
+SINGLE_FLIGHT_LLM_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_LLM_TIMEOUT", "60"))
+SINGLE_FLIGHT_DB_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_DB_TIMEOUT", "60"))
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    One group of coalesced calls (e.g. "llm", "db").
+
+    run()       : blocking callers (threads); the first caller runs
+                  the function, the others wait for it
+    run_async() : coroutine callers; the work runs as a task that
+                  every caller awaits (a caller going away does not
+                  cancel it for the others)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "coalesced": 0, "timeouts": 0}
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _timeout_error(self, key, timeout):
+        self._count("timeouts")
+        return TimeoutError(
+            f"Timed out after {timeout:g}s waiting for in-flight {self.name} call"
+        )
+
+    def run(self, key, func, timeout: float = None):
+        """Returns func() — shared with concurrent callers of the same key."""
+        if not SINGLE_FLIGHT_ENABLED:
+            return func()
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["leaders"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if leader:
+            try:
+                call.result = func()
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if not call.done.wait(timeout):
+            raise self._timeout_error(key, timeout)
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    async def run_async(self, key, func, timeout: float = None):
+        """Awaits func() — shared with concurrent callers of the same key."""
+        if not SINGLE_FLIGHT_ENABLED:
+            return await func()
+
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is None:
+                task = self._tasks[key] = asyncio.ensure_future(func())
+                self._stats["leaders"] += 1
+
+                def finished(done, key=key):
+                    with self._lock:
+                        if self._tasks.get(key) is done:
+                            del self._tasks[key]
+                    # Retrieved even if every waiter timed out
+                    if not done.cancelled():
+                        done.exception()
+
+                task.add_done_callback(finished)
+            else:
+                self._stats["coalesced"] += 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            if task.done():
+                raise
+            raise self._timeout_error(key, timeout) from None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "inflight": len(self._calls) + len(self._tasks)}
+
+
+LLM_FLIGHTS = SingleFlight("llm")
+DB_FLIGHTS = SingleFlight("db")
+
+
+def get_single_flight_stats() -> dict:
+    return {group.name: group.stats() for group in (LLM_FLIGHTS, DB_FLIGHTS)}
@@ -0,0 +1,228 @@
+"""
+T-SQL → SQLite dialect bridge
+Purpose:
+- Rewrite the T-SQL subset the service emits (GETDATE, YEAR / MONTH /
+  DAY, TOP, OFFSET/FETCH, NOLOCK, ISNULL, LEN) into SQLite
+- pyodbc-like connection / cursor wrappers over sqlite3, so code
+  written against pyodbc runs unchanged on a local SQLite file
+  (the analytics replica, the offline benchmarks)
+
+Rewrites apply to SQL text outside string literals and comments
+(core.sql_guard tokens). Dates are stored and bound as
+'YYYY-MM-DD' text, datetimes as 'YYYY-MM-DD HH:MM:SS' (the date
+alone at midnight), the formats of SQLite's date() / datetime().
+"""
+
+import datetime
+import decimal
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+from core.sql_guard import STRING, iter_tokens
+
+# ============================================================
+# T-SQL → SQLite
+# ============================================================
+
+_GETDATE_OFFSET = re.compile(
+    r"CAST\(\s*GETDATE\(\)\s*([-+])\s*(\d+)\s+AS\s+DATE\s*\)", re.IGNORECASE
+)
+_GETDATE_DATE = re.compile(r"CAST\(\s*GETDATE\(\)\s+AS\s+DATE\s*\)", re.IGNORECASE)
+_GETDATE = re.compile(r"\bGETDATE\(\)", re.IGNORECASE)
+_DATE_PART = re.compile(r"\b(YEAR|MONTH|DAY)\(([^()]*(?:\([^()]*\)[^()]*)*)\)", re.IGNORECASE)
+_TOP = re.compile(r"\bSELECT\s+(DISTINCT\s+)?TOP\s*\(?\s*(\d+)\s*\)?\s+", re.IGNORECASE)
+_OFFSET_FETCH = re.compile(
+    r"\bOFFSET\s+(\?|\d+)\s+ROWS?\s+FETCH\s+(?:NEXT|FIRST)\s+(\?|\d+)\s+ROWS?\s+ONLY",
+    re.IGNORECASE,
+)
+_NOLOCK = re.compile(r"\bWITH\s*\(\s*NOLOCK\s*\)", re.IGNORECASE)
+_ISNULL = re.compile(r"\bISNULL\(", re.IGNORECASE)
+_LEN = re.compile(r"\bLEN\(", re.IGNORECASE)
+
+_STRFTIME = {"year": "%Y", "month": "%m", "day": "%d"}
+
+
+def _scope_end(sql: str, start: int) -> int:
+    """Index of the ")" closing the scope that contains `start` (or len)."""
+    depth = 0
+    for i in range(start, len(sql)):
+        if sql[i] == "(":
+            depth += 1
+        elif sql[i] == ")":
+            if depth == 0:
+                return i
+            depth -= 1
+    return len(sql.rstrip().rstrip(";").rstrip())
+
+
+def _rewrite_top(sql: str) -> str:
+    """SELECT [DISTINCT] TOP n ... → SELECT [DISTINCT] ... LIMIT n (per scope)."""
+    while True:
+        match = _TOP.search(sql)
+        if match is None:
+            return sql
+        distinct = match.group(1) or ""
+        head = sql[:match.start()] + "SELECT " + distinct
+        rest = sql[match.end():]
+        end = _scope_end(rest, 0)
+        sql = head + rest[:end] + f" LIMIT {match.group(2)}" + rest[end:]
+
+
+_LITERAL_MARK = re.compile("\x00(\\d+)\x00")
+
+
+def _mask_literals(sql: str):
+    """
+    (sql with every string literal replaced by a marker and comments
+    by a space, literals). Unparseable SQL is returned unchanged.
+    """
+    try:
+        tokens = list(iter_tokens(sql))
+    except ValueError:
+        return sql, []
+
+    out, literals, pos = [], [], 0
+    for kind, _, start, end in tokens:
+        gap = sql[pos:start]
+        # Whitespace is kept as is; a gap holding a comment becomes a space
+        out.append(gap if not gap or gap.isspace() else " ")
+        if kind == STRING:
+            text = sql[start:end]
+            # N'...' (Unicode literal) is plain '...' in SQLite
+            literals.append(text[1:] if text[0] in "nN" else text)
+            out.append(f"\x00{len(literals) - 1}\x00")
+        else:
+            out.append(sql[start:end])
+        pos = end
+    return "".join(out), literals
+
+
+def tsql_to_sqlite(sql: str) -> str:
+    """
+    Rewrites the T-SQL subset used by the service into SQLite.
+    (Only literal TOP n is supported.)
+    """
+    sql, literals = _mask_literals(sql)
+
+    sql = _GETDATE_OFFSET.sub(
+        lambda m: f"date('now', 'localtime', '{m.group(1)}{m.group(2)} day')", sql
+    )
+    sql = _GETDATE_DATE.sub("date('now', 'localtime')", sql)
+    sql = _GETDATE.sub("datetime('now', 'localtime')", sql)
+
+    # Nested calls (MONTH(...)) are rewritten innermost first
+    while True:
+        rewritten = _DATE_PART.sub(
+            lambda m: (
+                f"CAST(strftime('{_STRFTIME[m.group(1).lower()]}', {m.group(2)}) "
+                f"AS INTEGER)"
+            ),
+            sql,
+        )
+        if rewritten == sql:
+            break
+        sql = rewritten
+
+    sql = _rewrite_top(sql)
+    # OFFSET o ROWS FETCH NEXT n ROWS ONLY → LIMIT o, n (same param order)
+    sql = _OFFSET_FETCH.sub(lambda m: f"LIMIT {m.group(1)}, {m.group(2)}", sql)
+    sql = _NOLOCK.sub("", sql)
+    sql = _ISNULL.sub("IFNULL(", sql)
+    sql = _LEN.sub("LENGTH(", sql)
+    return _LITERAL_MARK.sub(lambda m: literals[int(m.group(1))], sql)
+
+
+# ============================================================
+# PYODBC-LIKE WRAPPERS
+# ============================================================
+
+def adapt_value(value):
+    """
+    Python value → SQLite value: dates as 'YYYY-MM-DD', datetimes as
+    'YYYY-MM-DD HH:MM:SS' or just the date at midnight, so they compare
+    with date parameters / date('now') as on SQL Server.
+    """
+    if isinstance(value, datetime.datetime):
+        if value.time() == datetime.time():
+            return value.date().isoformat()
+        return value.isoformat(sep=" ")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return value
+
+
+class SQLiteCursor:
+    """Accepts pyodbc call styles: execute(sql, [p...]) and execute(sql, p1, p2)."""
+
+    def __init__(self, cursor, connection):
+        self._cursor = cursor
+        self._connection = connection
+
+    def execute(self, sql, *params):
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = params[0]
+        self._connection._arm_timeout()
+        self._cursor.execute(tsql_to_sqlite(sql), [adapt_value(p) for p in params])
+        return self
+
+    def executemany(self, sql, rows):
+        self._cursor.executemany(
+            tsql_to_sqlite(sql), ([adapt_value(p) for p in row] for row in rows)
+        )
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """
+    Minimal pyodbc.Connection look-alike over sqlite3.
+    `timeout` (seconds, 0 = none) is enforced per statement.
+    """
+
+    def __init__(self, path, readonly: bool = False):
+        if readonly:
+            self._conn = sqlite3.connect(
+                f"file:{Path(path).as_posix()}?mode=ro", uri=True, check_same_thread=False
+            )
+        else:
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        # pyodbc exposes a per-connection query timeout (seconds)
+        self.timeout = 0
+
+    def _arm_timeout(self):
+        if not self.timeout:
+            self._conn.set_progress_handler(None, 0)
+            return
+        deadline = time.monotonic() + self.timeout
+        # Non-zero return aborts the statement ("interrupted")
+        self._conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+
+    def cursor(self):
+        return SQLiteCursor(self._conn.cursor(), self)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
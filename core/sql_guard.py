@@ -1,48 +1,383 @@
 """
 SQL Guard
 Ensures ONLY safe, read-only SQL runs
+
+Single pass over a token stream (not regexes over raw text):
+- Comments, string literals and [bracketed] / "quoted" identifiers
+  are recognised, so keywords inside them are not false positives
+- Table references are checked after FROM, every JOIN, APPLY and
+  comma-separated FROM lists, at any subquery depth, including
+  parenthesized joins ("FROM (a JOIN b ON ...)")
+- WITH (CTE) queries are allowed; unqualified CTE names count as tables
+- SELECT ... INTO, variables, table-valued functions and
+  cross-database names are rejected
+
+Verdicts are memoized per SQL fingerprint, so cached and repeated
+queries cost a dictionary lookup.
 """
 
-import re
+import hashlib
+import os
+
+from core.cache import LRUTTLCache
 
 # Keywords that can modify or destroy data
-FORBIDDEN_KEYWORDS = [
+FORBIDDEN_KEYWORDS = {
     "insert", "update", "delete", "drop",
     "alter", "create", "merge", "exec",
-    "truncate", "grant", "revoke"
-]
+    "truncate", "grant", "revoke",
+    # Writes / side effects reachable from a SELECT
+    "into", "execute", "openrowset", "opendatasource", "openquery",
+    "openxml", "bulk", "waitfor", "dbcc", "shutdown", "kill",
+    "backup", "restore", "declare", "use", "deny",
+}
 
 # Restrict access to known table only
 ALLOWED_TABLES = {"attendancereport"}
 
-def validate_sql(sql: str):
+# Two-part names (schema.table) may only use these schemas
+ALLOWED_SCHEMAS = {"dbo"}
+
+# Keywords after which a table reference follows
+_TABLE_INTRODUCERS = {"from", "join", "apply"}
+
+# Keywords that end a FROM list; until then every "," at the same
+# depth starts another table reference (also after JOIN ... ON)
+_FROM_LIST_END = {
+    "where", "group", "having", "order", "union", "except", "intersect",
+    "option", "for", "window",
+}
+
+# Functions whose arguments use FROM without a table:
+# TRIM(' ' FROM col), EXTRACT(year FROM col), SUBSTRING(col FROM 1 FOR 3)
+_FROM_FUNCTIONS = {"trim", "extract", "datepart", "substring", "position", "overlay"}
+
+# Number of memoized verdicts
+SQL_GUARD_CACHE_SIZE = int(os.getenv("SQL_GUARD_CACHE_SIZE", "4096"))
+
+_VERDICTS = LRUTTLCache(maxsize=SQL_GUARD_CACHE_SIZE, ttl=float("inf"))
+
+# ============================================================
+# TOKENIZER
+# ============================================================
+
+WORD, IDENT, STRING, NUMBER, VARIABLE, PUNCT = (
+    "word", "ident", "string", "number", "variable", "punct"
+)
+
+
+def _skip_quoted(sql: str, i: int, close: str, what: str) -> int:
     """
-    Validates SQL query for safety.
-    Raises ValueError if unsafe.
+    Index just past a quoted run starting at sql[i] (the opener).
+    A doubled closing character is an escaped one.
+    """
+    n = len(sql)
+    i += 1
+    while i < n:
+        if sql[i] == close:
+            if i + 1 < n and sql[i + 1] == close:
+                i += 2
+                continue
+            return i + 1
+        i += 1
+    raise ValueError(f"Unterminated {what}")
+
+
+def iter_tokens(sql: str):
+    """
+    Yields (kind, value, start, end) for every token of `sql`;
+    comments and whitespace are skipped. Words are lower-cased;
+    identifiers keep their text without the surrounding brackets / quotes.
+
+    Raises ValueError on unterminated strings, comments or identifiers.
+    """
+    i, n = 0, len(sql)
+
+    while i < n:
+        ch = sql[i]
+        start = i
+
+        if ch.isspace():
+            i += 1
+
+        elif ch == "-" and sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end < 0 else end + 1
+
+        elif ch == "/" and sql.startswith("/*", i):
+            # T-SQL block comments nest
+            depth, i = 1, i + 2
+            while depth:
+                if i >= n:
+                    raise ValueError("Unterminated comment")
+                if sql.startswith("/*", i):
+                    depth, i = depth + 1, i + 2
+                elif sql.startswith("*/", i):
+                    depth, i = depth - 1, i + 2
+                else:
+                    i += 1
+
+        elif ch == "'" or (ch in "nN" and sql.startswith("'", i + 1)):
+            i = _skip_quoted(sql, i + 1 if ch != "'" else i, "'", "string literal")
+            yield STRING, None, start, i
+
+        elif ch == "[":
+            i = _skip_quoted(sql, i, "]", "identifier")
+            yield IDENT, sql[start + 1:i - 1].replace("]]", "]"), start, i
+
+        elif ch == '"':
+            i = _skip_quoted(sql, i, '"', "identifier")
+            yield IDENT, sql[start + 1:i - 1].replace('""', '"'), start, i
+
+        elif ch.isalpha() or ch in "_#@":
+            i += 1
+            while i < n and (sql[i].isalnum() or sql[i] in "_@#$"):
+                i += 1
+            text = sql[start:i]
+            if ch == "@":
+                yield VARIABLE, text, start, i
+            else:
+                yield WORD, text.lower(), start, i
+
+        elif ch.isdigit() or (ch == "." and i + 1 < n and sql[i + 1].isdigit()):
+            i += 1
+            while i < n and (sql[i].isalnum() or sql[i] == "."):
+                i += 1
+            yield NUMBER, sql[start:i], start, i
+
+        else:
+            i += 1
+            yield PUNCT, ch, start, i
+
+
+def tokenize(sql: str) -> list:
+    """
+    (kind, value) tokens of `sql` (see iter_tokens).
+    """
+    return [(kind, value) for kind, value, _, _ in iter_tokens(sql)]
+
+# ============================================================
+# ANALYSIS
+# ============================================================
+
+def _is_name(token) -> bool:
+    return token is not None and token[0] in (WORD, IDENT)
+
+
+def _matching_paren(tokens, i: int) -> int:
+    """Index of the ")" matching the "(" at tokens[i]."""
+    depth = 0
+    for j in range(i, len(tokens)):
+        if tokens[j] == (PUNCT, "("):
+            depth += 1
+        elif tokens[j] == (PUNCT, ")"):
+            depth -= 1
+            if depth == 0:
+                return j
+    raise ValueError("Unbalanced parentheses")
+
+
+def _parse_ctes(tokens) -> tuple:
+    """
+    WITH name [(cols)] AS (SELECT ...) [, ...] SELECT ...
+    Returns (cte_names, index of the main SELECT).
+    """
+    names = set()
+    i = 1
+
+    while True:
+        if not _is_name(tokens[i] if i < len(tokens) else None):
+            raise ValueError("Malformed WITH clause")
+        names.add(tokens[i][1].lower())
+        i += 1
+
+        # Optional column list
+        if i < len(tokens) and tokens[i] == (PUNCT, "("):
+            i = _matching_paren(tokens, i) + 1
+
+        if tokens[i:i + 2] != [(WORD, "as"), (PUNCT, "(")]:
+            raise ValueError("Malformed WITH clause")
+        if tokens[i + 2:i + 3] != [(WORD, "select")]:
+            raise ValueError("CTE body must be a SELECT")
+        i = _matching_paren(tokens, i + 1) + 1
+
+        if i < len(tokens) and tokens[i] == (PUNCT, ","):
+            i += 1
+            continue
+        break
+
+    if tokens[i:i + 1] != [(WORD, "select")]:
+        raise ValueError("Only SELECT queries are allowed")
+
+    return names, i
+
+
+def _check_table(tokens, i: int, ctes: set, tables: set) -> None:
+    """
+    Validates the table reference starting at tokens[i].
+    A derived table "(SELECT ...)" is left to the main scan; for a
+    parenthesized join "((a JOIN b ...))" the first table is checked
+    here and the JOINs inside by the main scan.
     """
+    while tokens[i:i + 1] == [(PUNCT, "(")]:
+        i += 1
+    token = tokens[i] if i < len(tokens) else None
+
+    if token in ((WORD, "select"), (WORD, "with")):
+        return
+    if not _is_name(token):
+        raise ValueError("Malformed table reference")
+
+    parts = [token[1].lower()]
+    while tokens[i + 1:i + 2] == [(PUNCT, ".")] and _is_name(
+        tokens[i + 2] if i + 2 < len(tokens) else None
+    ):
+        i += 2
+        parts.append(tokens[i][1].lower())
 
-    if not sql:
+    if tokens[i + 1:i + 2] == [(PUNCT, "(")]:
+        raise ValueError(f"Table-valued functions are not allowed: {'.'.join(parts)}")
+
+    if len(parts) > 2:
+        raise ValueError("Cross-database references are not allowed")
+    if len(parts) == 2 and parts[0] not in ALLOWED_SCHEMAS:
+        raise ValueError(f"Access to schema '{parts[0]}' is not allowed")
+
+    table = parts[-1]
+    # Only a one-part name can refer to a CTE ("dbo.x" is a real table)
+    if len(parts) == 1 and table in ctes:
+        return
+    if table not in ALLOWED_TABLES:
+        raise ValueError(f"Access to table '{table}' is not allowed")
+
+    tables.add(table)
+
+
+def _analyze(sql: str) -> set:
+    """
+    Walks the token stream once.
+    Returns the referenced tables; raises ValueError with the reason.
+    """
+    if not sql or not sql.strip():
         raise ValueError("Empty SQL")
 
-    sql_clean = sql.strip().lower()
+    tokens = tokenize(sql)
+    if not tokens:
+        raise ValueError("Empty SQL")
 
-    # Must be SELECT
-    if not sql_clean.startswith("select"):
+    # Must be SELECT (optionally preceded by CTEs)
+    ctes = set()
+    if tokens[0] == (WORD, "with"):
+        ctes, _ = _parse_ctes(tokens)
+    elif tokens[0] != (WORD, "select"):
         raise ValueError("Only SELECT queries are allowed")
 
-    # Block multi-statement queries
-    if ";" in sql_clean:
-        raise ValueError("Semicolons are not allowed")
+    tables = set()
+    depth = 0
+    # Paren depths with an open FROM list ("FROM a, b"),
+    # including parenthesized joins inside one
+    from_lists = set()
+    # Paren depths of TRIM(... FROM ...) arguments
+    from_functions = set()
+
+    for i, (kind, value) in enumerate(tokens):
+        if kind == PUNCT:
+            if value == ";":
+                # Block multi-statement queries
+                raise ValueError("Semicolons are not allowed")
+            if value == "(":
+                depth += 1
+                prev = tokens[i - 1] if i else None
+                if prev is not None and prev[0] == WORD and prev[1] in _FROM_FUNCTIONS:
+                    from_functions.add(depth)
+                elif tokens[i + 1:i + 2] != [(WORD, "select")] and (
+                    (prev is not None and prev[0] == WORD and prev[1] in _TABLE_INTRODUCERS)
+                    or (prev in ((PUNCT, ","), (PUNCT, "(")) and depth - 1 in from_lists)
+                ):
+                    # Parenthesized join: its own FROM list
+                    from_lists.add(depth)
+            elif value == ")":
+                from_lists.discard(depth)
+                from_functions.discard(depth)
+                depth -= 1
+            elif value == "," and depth in from_lists:
+                _check_table(tokens, i + 1, ctes, tables)
+
+        elif kind == VARIABLE:
+            raise ValueError(f"Variables are not allowed: {value}")
+
+        elif kind == WORD:
+            # Block dangerous keywords
+            if value in FORBIDDEN_KEYWORDS:
+                raise ValueError(f"Forbidden SQL keyword detected: {value}")
 
-    # Block dangerous keywords
-    for keyword in FORBIDDEN_KEYWORDS:
-        if re.search(rf"\b{keyword}\b", sql_clean):
-            raise ValueError(f"Forbidden SQL keyword detected: {keyword}")
+            if value in _FROM_LIST_END:
+                from_lists.discard(depth)
 
-    # Enforce allowed tables only
-    tables = re.findall(r"from\s+([a-zA-Z0-9_]+)", sql_clean)
-    for table in tables:
-        if table not in ALLOWED_TABLES:
-            raise ValueError(f"Access to table '{table}' is not allowed")
+            # Enforce allowed tables only
+            if value == "from" and depth in from_functions:
+                continue
+            if value in _TABLE_INTRODUCERS:
+                _check_table(tokens, i + 1, ctes, tables)
+                if value == "from":
+                    from_lists.add(depth)
+
+    if depth != 0:
+        raise ValueError("Unbalanced parentheses")
+
+    return tables
+
+# ============================================================
+# PUBLIC API
+# ============================================================
+
+def sql_fingerprint(sql: str) -> str:
+    """Stable short hash of the exact SQL text."""
+    return hashlib.sha256(sql.encode("utf-8")).hexdigest()[:16]
+
+
+def check_sql(sql: str) -> dict:
+    """
+    Returns the (memoized) verdict for a SQL statement:
+    {
+        "allowed": bool,
+        "reason": str | None,     (why it was rejected)
+        "tables": [...],          (tables referenced, if allowed)
+        "fingerprint": str
+    }
+    """
+    fingerprint = sql_fingerprint(sql or "")
+
+    verdict = _VERDICTS.get(fingerprint, None)
+    if verdict is None:
+        try:
+            tables = _analyze(sql)
+            verdict = {"allowed": True, "reason": None, "tables": sorted(tables)}
+        except ValueError as e:
+            verdict = {"allowed": False, "reason": str(e), "tables": []}
+        verdict["fingerprint"] = fingerprint
+        _VERDICTS.set(fingerprint, verdict)
+
+    return {**verdict, "tables": list(verdict["tables"])}
+
+
+def validate_sql(sql: str):
+    """
+    Validates SQL query for safety.
+    Raises ValueError if unsafe.
+    """
+    verdict = check_sql(sql)
+
+    if not verdict["allowed"]:
+        raise ValueError(verdict["reason"])
 
     return True
+
+
+def get_sql_guard_stats() -> dict:
+    """Hit / miss counters of the verdict cache."""
+    return _VERDICTS.stats()
+
+
+def clear_sql_guard_cache():
+    _VERDICTS.clear()
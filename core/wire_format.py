@@ -0,0 +1,103 @@
+"""
+Wire formats for tabular results
+Purpose:
+- "records"  : [{"col": value, ...}, ...]          (default, legacy)
+- "columnar" : {"columns": [...], "rows": [[...]]}  (no repeated keys)
+- "arrow"    : Apache Arrow IPC stream (binary, needs pyarrow)
+
+The format is chosen by an explicit request field or,
+failing that, by the HTTP Accept header.
+"""
+
+import json
+
+FORMAT_RECORDS = "records"
+FORMAT_COLUMNAR = "columnar"
+FORMAT_ARROW = "arrow"
+
+MEDIA_TYPES = {
+    FORMAT_RECORDS: "application/json",
+    FORMAT_COLUMNAR: "application/vnd.smarteye.columnar+json",
+    FORMAT_ARROW: "application/vnd.apache.arrow.stream",
+}
+
+# Schema metadata key carrying the non-tabular response fields
+ARROW_META_KEY = b"smarteye"
+
+
+def negotiate_format(requested: str = None, accept: str = None) -> str:
+    """
+    Picks the response format.
+
+    - requested : value of the request's "format" field (wins if set)
+    - accept    : raw Accept header
+
+    Raises ValueError for an unknown requested format.
+    """
+    if requested:
+        requested = requested.lower().strip()
+        if requested not in MEDIA_TYPES:
+            raise ValueError(f"Unsupported format: {requested}")
+        return requested
+
+    if accept:
+        accepted = [part.split(";")[0].strip().lower() for part in accept.split(",")]
+        for fmt in (FORMAT_ARROW, FORMAT_COLUMNAR):
+            if MEDIA_TYPES[fmt] in accepted:
+                return fmt
+
+    return FORMAT_RECORDS
+
+
+def arrow_available() -> bool:
+    """True if pyarrow (optional dependency) is installed."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def to_columnar(records, columns=None) -> dict:
+    """
+    Converts a list of row dicts into {"columns": [...], "rows": [[...]]}.
+    """
+    if columns is None:
+        columns = list(records[0].keys()) if records else []
+
+    return {
+        "columns": list(columns),
+        "rows": [[row.get(col) for col in columns] for row in records],
+    }
+
+
+def to_arrow_ipc(columns, values, metadata: dict = None) -> bytes:
+    """
+    Serializes column arrays as an Arrow IPC stream.
+    Values keep their native types (dates, decimals, ...).
+    `metadata` (e.g. sql, params) is stored as JSON in the schema metadata.
+
+    Raises RuntimeError if pyarrow is not installed.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError("Arrow format requires the 'pyarrow' package")
+
+    # Built from arrays, not a dict: duplicate column names
+    # (e.g. SELECT a.ECode, b.ECode) stay separate columns
+    table = pa.Table.from_arrays(
+        [pa.array(list(column)) for column in values],
+        names=[str(col) for col in columns],
+    )
+
+    if metadata is not None:
+        table = table.replace_schema_metadata(
+            {ARROW_META_KEY: json.dumps(metadata, default=str).encode("utf-8")}
+        )
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+import core.batch_runner as batch_runner
+from core.batch_runner import handle_batch_async
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """(question, mill) of every question actually run."""
+    seen = []
+
+    async def single(question, mill, use_cache=True, result_format="records"):
+        seen.append((question, mill))
+        await asyncio.sleep(0)
+        if "boom" in question:
+            raise RuntimeError("db down")
+        return {"status": "executed", "mill": mill.lower().strip(), "question": question}
+
+    async def all_mills(question, use_cache=True, result_format="records"):
+        seen.append((question, "all"))
+        return {"status": "executed", "mill": "all"}
+
+    monkeypatch.setattr(batch_runner, "handle_question_async", single)
+    monkeypatch.setattr(batch_runner, "handle_question_all_mills_async", all_mills)
+    return seen
+
+
+def run(items):
+    return asyncio.run(handle_batch_async(items))
+
+
+def test_duplicate_questions_run_once(calls):
+    batch = run([
+        {"question": "Attendance of H00001 today?", "mill": "SHJM"},
+        {"question": "  attendance of   h00001 today ", "mill": "shjm"},
+        {"question": "attendance of H00001 today", "mill": "sgjm"},
+    ])
+
+    assert len(calls) == 2
+    assert (batch["items"], batch["unique"]) == (3, 2)
+    first, duplicate, other_mill = (entry["result"] for entry in batch["results"])
+    assert duplicate is first
+    assert other_mill["mill"] == "sgjm"
+
+
+def test_results_keep_request_order(calls):
+    items = [{"question": f"q{n}", "mill": "shjm"} for n in range(5)]
+
+    batch = run(items)
+
+    assert [entry["index"] for entry in batch["results"]] == list(range(5))
+    assert [entry["result"]["question"] for entry in batch["results"]] == [f"q{n}" for n in range(5)]
+
+
+def test_failing_item_does_not_fail_the_batch(calls):
+    batch = run([
+        {"question": "boom", "mill": "shjm"},
+        {"question": "fine", "mill": "shjm"},
+    ])
+
+    failed, fine = (entry["result"] for entry in batch["results"])
+    assert failed["unsupported"] is True
+    assert fine["status"] == "executed"
+
+
+def test_all_mills_items_fan_out(calls):
+    batch = run([{"question": "q", "mill": "ALL"}, {"question": "q", "mill": "all"}])
+
+    assert calls == [("q", "all")]
+    assert batch["results"][0]["result"]["mill"] == "all"
+
+
+def test_oversized_batch_is_rejected(calls, monkeypatch):
+    monkeypatch.setattr(batch_runner, "BATCH_MAX_ITEMS", 2)
+
+    with pytest.raises(ValueError, match="Batch too large"):
+        run([{"question": "q", "mill": "shjm"}] * 3)
+    assert calls == []
@@ -0,0 +1,124 @@
+import contextlib
+import datetime
+
+import pytest
+
+import core.employee_index as employee_index
+from core.employee_index import EmployeeIndex
+
+TODAY = datetime.date.today()
+
+
+def day(offset: int) -> datetime.date:
+    return TODAY - datetime.timedelta(days=offset)
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.pending = []
+
+    def execute(self, sql, since, until):
+        self.pending = [
+            row for row in self.rows if since <= row[2].isoformat() <= until
+        ]
+
+    def fetchmany(self, size):
+        batch, self.pending = self.pending[:size], self.pending[size:]
+        return batch
+
+
+@pytest.fixture
+def rows(monkeypatch):
+    """(ECode, EName, WDate) rows of the fake AttendanceReport."""
+    table = []
+
+    @contextlib.contextmanager
+    def connection(mill):
+        class Conn:
+            def cursor(self):
+                return FakeCursor(table)
+        yield Conn()
+
+    monkeypatch.setattr(employee_index, "db_connection", connection)
+    monkeypatch.setattr(
+        employee_index, "statement_timeout", lambda conn, seconds: contextlib.nullcontext()
+    )
+    return table
+
+
+def codes(found):
+    return [entry["ECode"] for entry in found]
+
+
+def test_between_uses_the_attendance_bitmap(rows):
+    rows += [
+        ("H1", "ANIL", day(10)),
+        ("H2", "BIMAL", day(5)),
+        ("H3", "CHANDAN", day(1)),
+    ]
+    index = EmployeeIndex("shjm")
+    result = index.refresh()
+
+    assert result["full"] and result["employees"] == 3
+    assert codes(index.between(day(10), day(10))) == ["H1"]
+    assert codes(index.between(day(9), day(2))) == ["H2"]
+    assert codes(index.between(day(10), TODAY)) == ["H1", "H2", "H3"]
+    assert index.between(day(4), day(2)) == []
+
+
+def test_incremental_refresh_merges_new_days_and_names(rows):
+    rows += [("H1", "ANIL", day(3)), ("H2", "BIMAL", day(2))]
+    index = EmployeeIndex("shjm")
+    index.refresh()
+
+    rows += [("H1", "ANIL KUMAR", TODAY), ("H4", "DEEPAK", TODAY)]
+    result = index.refresh()
+
+    assert not result["full"]
+    assert result["rows"] == 2
+    assert codes(index.between(TODAY, TODAY)) == ["H1", "H4"]
+    assert codes(index.between(day(3), day(3))) == ["H1"]
+    assert index.entries["H1"]["EName"] == "ANIL KUMAR"
+    assert index.entries["H1"]["first"] == day(3)
+
+
+def test_search_ranks_code_then_name_matches(rows):
+    rows += [
+        ("H10", "RAJU", day(1)),
+        ("H1", "MOHAN", day(1)),
+        ("H2", "HARI", day(1)),
+        ("H3", "SHIV HARI", day(20)),
+    ]
+    index = EmployeeIndex("shjm")
+    index.refresh()
+
+    assert codes(index.search("h1", 10)) == ["H1", "H10"]
+    assert codes(index.search("hari", 10)) == ["H2", "H3"]
+    assert codes(index.search("hari", 10, day(2), TODAY)) == ["H2"]
+    # Same rank: ordered by name, then cut at the limit
+    assert codes(index.search("h", 2)) == ["H2", "H1"]
+    assert index.search("   ", 10) == []
+
+
+def test_lookup_falls_back_outside_the_indexed_range(rows, monkeypatch):
+    rows += [("H1", "ANIL", day(1))]
+    index = EmployeeIndex("shjm")
+    index.refresh()
+    monkeypatch.setattr(employee_index, "get_employee_index", lambda mill: index)
+    monkeypatch.setattr(index, "schedule_refresh", lambda: None)
+
+    assert codes(employee_index.lookup_employees("shjm", day(2), TODAY)) == ["H1"]
+    assert employee_index.lookup_employees("shjm", TODAY, day(2)) == []
+    too_old = day(employee_index.EMPLOYEE_INDEX_DAYS + 1)
+    assert employee_index.lookup_employees("shjm", too_old, TODAY) is None
+
+
+def test_lookup_waits_for_the_first_build(monkeypatch):
+    index = EmployeeIndex("shjm")
+    monkeypatch.setattr(employee_index, "get_employee_index", lambda mill: index)
+    monkeypatch.setattr(index, "schedule_refresh", lambda: None)
+
+    assert employee_index.lookup_employees("shjm", day(2), TODAY) is None
+    with pytest.raises(ValueError, match="still being built"):
+        employee_index.search_employees("shjm", "h1")
@@ -0,0 +1,130 @@
+import asyncio
+import datetime
+
+import pytest
+
+import core.fanout as fanout
+from core.fanout import handle_question_all_mills_async, merge_colsets
+
+SQL = "SELECT ECode, Hours FROM AttendanceReport WHERE WDate = ?"
+
+
+def colset(*codes):
+    return {
+        "columns": ["ECode", "Hours"],
+        "types": [str, float],
+        "values": [list(codes), [8.0] * len(codes)],
+    }
+
+
+def executed(data):
+    return {
+        "status": "executed", "rows": len(data["values"][0]), "data": data,
+        "cached": False, "truncated": False,
+    }
+
+
+@pytest.fixture
+def mills(monkeypatch):
+    """Per-mill outcome of execute_sql: a response dict or an exception."""
+    outcomes = {}
+
+    async def resolve(question, mill, use_cache):
+        return "rule", {"sql": SQL}
+
+    def check(question, mill, llm_result, source):
+        return None, SQL, ["2026-03-01"]
+
+    async def run_db(mill, func, *args):
+        await asyncio.sleep(0)
+        outcome = outcomes[mill]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(fanout, "resolve_question_async", resolve)
+    monkeypatch.setattr(fanout, "check_llm_result", check)
+    monkeypatch.setattr(fanout, "run_db", run_db)
+    monkeypatch.setattr(fanout, "log_event", lambda *args: None)
+    return outcomes
+
+
+def ask(result_format="records"):
+    return asyncio.run(handle_question_all_mills_async("q", result_format=result_format))
+
+
+def by_mill(response):
+    return {entry["mill"]: entry for entry in response["mills"]}
+
+
+def test_a_failing_mill_does_not_fail_the_others(mills):
+    mills.update(
+        shjm=executed(colset("H1", "H2")),
+        sgjm=RuntimeError("login failed"),
+        mijm={"status": "generated", "blocked_reason": "plan too expensive"},
+    )
+
+    response = ask()
+
+    assert response["status"] == "executed"
+    assert response["rows"] == 2
+    assert [row["Mill"] for row in response["data"]] == ["shjm", "shjm"]
+    summary = by_mill(response)
+    assert summary["shjm"]["status"] == "executed"
+    assert (summary["sgjm"]["status"], summary["sgjm"]["error"]) == ("failed", "login failed")
+    assert summary["mijm"]["status"] == "blocked"
+    assert summary["mijm"]["error"] == "plan too expensive"
+
+
+def test_rows_are_merged_in_mill_order(mills):
+    mills.update(
+        shjm=executed(colset("H1")),
+        sgjm=executed(colset("G1", "G2")),
+        mijm=executed(colset()),
+    )
+
+    response = ask("columnar")
+
+    assert response["data"]["columns"] == ["Mill", "ECode", "Hours"]
+    assert response["data"]["rows"] == [
+        ["shjm", "H1", 8.0], ["sgjm", "G1", 8.0], ["sgjm", "G2", 8.0],
+    ]
+
+
+def test_mill_with_different_columns_is_reported_failed(mills):
+    other = {"columns": ["ECode"], "types": [str], "values": [["G1"]]}
+    mills.update(shjm=executed(colset("H1")), sgjm=executed(other), mijm=executed(colset("M1")))
+
+    response = ask()
+
+    assert response["rows"] == 2
+    assert by_mill(response)["sgjm"]["error"] == "Result columns differ from the other mills"
+
+
+def test_every_mill_failing_is_unsupported(mills):
+    mills.update(shjm=RuntimeError("a"), sgjm=RuntimeError("b"), mijm=RuntimeError("c"))
+
+    response = ask()
+
+    assert response["unsupported"] is True
+    assert [entry["status"] for entry in response["mills"]] == ["failed"] * 3
+
+
+def test_unanswerable_question_never_reaches_the_mills(mills, monkeypatch):
+    refusal = {"unsupported": True, "message": "Query could not be understood."}
+    monkeypatch.setattr(fanout, "check_llm_result", lambda *args: (refusal, None, None))
+
+    assert ask() == refusal
+
+
+def test_merge_makes_mismatched_column_types_json_safe():
+    day = datetime.date(2026, 3, 1)
+    parts = [
+        ("shjm", {"columns": ["WDate"], "types": [datetime.date], "values": [[day]]}),
+        ("sgjm", {"columns": ["WDate"], "types": [str], "values": [["2026-03-02"]]}),
+    ]
+
+    merged = merge_colsets(parts)
+
+    assert merged["types"] == [str, None]
+    assert merged["values"] == [["shjm", "sgjm"], ["2026-03-01", "2026-03-02"]]
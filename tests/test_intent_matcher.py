@@ -0,0 +1,22 @@
+import pytest
+
+from core.intent_matcher import match_intent
+
+
+@pytest.mark.parametrize("question, ecode", [
+    ("show attendance of H00012 yesterday", "H00012"),
+    ("show attendance of 12345 yesterday", "12345"),
+    ("show attendance of 2101 yesterday", "2101"),
+])
+def test_employee_codes_are_matched(question, ecode):
+    name, result = match_intent(question)
+    assert name == "employee_attendance"
+    assert result["params"][0] == ecode
+
+
+@pytest.mark.parametrize("question", [
+    "show attendance of 2025 yesterday",
+    "show attendance of 1999 yesterday",
+])
+def test_bare_years_are_not_employee_codes(question):
+    assert match_intent(question) is None
@@ -0,0 +1,116 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+import core.llm_resilience as resilience
+from core.llm_resilience import BREAKER, LLMUnavailableError, call_llm, call_llm_async
+
+
+def status_error(code: int) -> openai.APIStatusError:
+    request = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+    return openai.APIStatusError(
+        f"status {code}", response=httpx.Response(code, request=request), body=None
+    )
+
+
+@pytest.fixture(autouse=True)
+def breaker(monkeypatch):
+    monkeypatch.setattr(BREAKER, "failures", 1)
+    monkeypatch.setattr(BREAKER, "cooldown", 0.0)
+    monkeypatch.setattr(resilience, "LLM_HEDGING", False)
+    monkeypatch.setattr(resilience, "LLM_MAX_RETRIES", 2)
+    BREAKER.reset()
+    yield BREAKER
+    BREAKER.reset()
+
+
+def open_breaker():
+    BREAKER.record(failed=True)
+    assert BREAKER._opened_at is not None
+
+
+def test_half_open_probe_success_closes():
+    open_breaker()
+    assert call_llm(lambda **_: "ok", {}, lambda r: r) == "ok"
+    assert BREAKER.state == "closed"
+
+
+def test_half_open_probe_failure_reopens(monkeypatch):
+    monkeypatch.setattr(resilience, "LLM_MAX_RETRIES", 0)
+    monkeypatch.setattr(BREAKER, "cooldown", 60.0)
+    open_breaker()
+    BREAKER._opened_at -= 61
+
+    def create(**_):
+        raise status_error(503)
+
+    with pytest.raises(openai.APIStatusError):
+        call_llm(create, {}, lambda r: r)
+    assert BREAKER.state == "open"
+    with pytest.raises(LLMUnavailableError):
+        call_llm(create, {}, lambda r: r)
+
+
+@pytest.mark.parametrize("code", [400, 401])
+def test_client_errors_leave_the_breaker_alone(code):
+    open_breaker()
+    consecutive = BREAKER._consecutive
+
+    def create(**_):
+        raise status_error(code)
+
+    with pytest.raises(openai.APIStatusError):
+        call_llm(create, {}, lambda r: r)
+    assert BREAKER.state != "closed"
+    assert BREAKER._consecutive == consecutive
+    # The probe slot is free again
+    assert not BREAKER._probing
+
+
+def test_async_client_error_does_not_close_the_breaker():
+    open_breaker()
+
+    async def create(**_):
+        raise status_error(401)
+
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(call_llm_async(create, {}, lambda r: r))
+    assert BREAKER.state != "closed"
+    assert not BREAKER._probing
+
+
+async def cancel_after(coro, seconds: float):
+    task = asyncio.ensure_future(coro)
+    await asyncio.sleep(seconds)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+def test_cancel_during_probe_frees_the_probe_slot():
+    open_breaker()
+
+    async def create(**_):
+        await asyncio.sleep(10)
+
+    asyncio.run(cancel_after(call_llm_async(create, {}, lambda r: r), 0.05))
+    assert BREAKER._opened_at is not None
+    assert not BREAKER._probing
+    assert BREAKER.allow()
+
+
+def test_cancel_during_backoff_frees_the_probe_slot(monkeypatch):
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 5.0)
+    open_breaker()
+    consecutive = BREAKER._consecutive
+
+    async def create(**_):
+        raise status_error(503)
+
+    asyncio.run(cancel_after(call_llm_async(create, {}, lambda r: r), 0.05))
+    assert BREAKER._opened_at is not None
+    assert BREAKER._consecutive == consecutive
+    assert not BREAKER._probing
+    assert BREAKER.allow()
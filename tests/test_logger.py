@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+import core.logger as logger
+
+
+@pytest.fixture
+def log_dir(tmp_path, monkeypatch):
+    # Entries queued by earlier tests go to the real log directory
+    logger.flush_logs()
+    monkeypatch.setattr(logger, "LOG_DIR", tmp_path)
+    monkeypatch.setattr(logger, "LOG_LEVEL", logger.LEVELS["debug"])
+    monkeypatch.setattr(logger, "LOG_SAMPLE_RATES", {})
+    return tmp_path
+
+
+def read_entries(log_dir):
+    logger.flush_logs()
+    lines = []
+    for path in sorted(log_dir.glob("*.log")):
+        lines.extend(path.read_text().splitlines())
+    return [json.loads(line) for line in lines]
+
+
+def test_payload_is_captured_at_enqueue(log_dir):
+    payload = {"sql": "SELECT 1", "params": [1]}
+    logger.log_event("sql_executed", payload)
+    payload["sql"] = "changed"
+    payload["params"].append(2)
+
+    (entry,) = read_entries(log_dir)
+    assert entry["event"] == "sql_executed"
+    assert entry["payload"] == {"sql": "SELECT 1", "params": [1]}
+
+
+def test_unserializable_payload_is_still_logged(log_dir):
+    payload = {}
+    payload["self"] = payload
+    logger.log_event("sql_executed", payload)
+
+    (entry,) = read_entries(log_dir)
+    assert entry["payload"] == repr(payload)
+
+
+def test_writer_errors_go_to_stderr(log_dir, monkeypatch, capsys):
+    def broken(batch):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(logger._WRITER, "_write", broken)
+    logger.log_event("sql_executed", {})
+    logger.flush_logs()
+
+    captured = capsys.readouterr()
+    assert "log writer error: disk full" in captured.err
+    assert captured.out == ""
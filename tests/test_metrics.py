@@ -0,0 +1,58 @@
+import pytest
+
+from core.db_pool import ConnectionPool
+from core.metrics import QUERIES_TOTAL, counter_lines, record_outcome
+
+
+@pytest.mark.parametrize("mill, label", [
+    ("SHJM", "shjm"),
+    ("  sgjm ", "sgjm"),
+    ("", ""),
+    ("nope'; DROP", "invalid"),
+    ("hastings", "invalid"),
+])
+def test_mill_labels_are_bounded(mill, label):
+    before = QUERIES_TOTAL.value(mill=label, outcome="error", source="none")
+    record_outcome(mill, "error")
+    assert QUERIES_TOTAL.value(mill=label, outcome="error", source="none") == before + 1
+
+
+def test_counter_lines_are_typed_as_counters():
+    lines = list(counter_lines("x_total", "Things", [({"cache": "llm"}, 3)]))
+    assert lines == [
+        "# HELP x_total Things",
+        "# TYPE x_total counter",
+        'x_total{cache="llm"} 3.0',
+    ]
+
+
+class FakeConnection:
+    def cursor(self):
+        return self
+
+    def execute(self, sql):
+        pass
+
+    def fetchone(self):
+        return (1,)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_pool_counts_hits_misses_and_evictions():
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=2)
+
+    with pool.connection():
+        pass
+    with pool.connection():
+        pass
+    with pytest.raises(RuntimeError):
+        with pool.connection():
+            raise RuntimeError("broken")
+
+    stats = pool.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 1, 1)
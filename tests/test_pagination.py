@@ -0,0 +1,79 @@
+import pytest
+
+from core.pagination import paginate_sql
+from core.sql_guard import PUNCT, iter_tokens
+
+
+def placeholders(sql: str) -> int:
+    return sum(1 for kind, value, _, _ in iter_tokens(sql) if (kind, value) == (PUNCT, "?"))
+
+
+def test_plain_query_gets_a_neutral_order():
+    sql, params = paginate_sql("SELECT * FROM AttendanceReport WHERE ECode = ?", ["H1"], 10, 5)
+    assert sql == (
+        "SELECT * FROM AttendanceReport WHERE ECode = ? "
+        "ORDER BY (SELECT NULL) OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+    )
+    assert params == ["H1", 10, 5]
+
+
+def test_existing_order_by_is_kept():
+    sql, _ = paginate_sql("SELECT ECode FROM AttendanceReport ORDER BY ECode DESC", [], 0, 5)
+    assert sql == "SELECT ECode FROM AttendanceReport ORDER BY ECode DESC OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT ECode, ROW_NUMBER() OVER (ORDER BY WDate) AS n FROM AttendanceReport",
+    "SELECT ECode FROM AttendanceReport WHERE EName <> 'order by x'",
+    "SELECT ECode FROM AttendanceReport /* ORDER BY ECode */",
+])
+def test_nested_or_quoted_order_by_does_not_count(sql):
+    paged, _ = paginate_sql(sql, [], 0, 5)
+    assert "ORDER BY (SELECT NULL) OFFSET" in paged
+
+
+def test_trailing_comment_is_dropped():
+    sql, params = paginate_sql("SELECT * FROM AttendanceReport WHERE ECode = ? -- by code", ["H1"], 0, 5)
+    assert "--" not in sql
+    assert placeholders(sql) == len(params) == 3
+
+
+def test_distinct_is_ordered_by_first_column():
+    sql, _ = paginate_sql("SELECT DISTINCT ECode FROM AttendanceReport", [], 0, 5)
+    assert sql.endswith("ORDER BY 1 OFFSET ? ROWS FETCH NEXT ? ROWS ONLY")
+
+
+def test_top_becomes_the_fetch_window():
+    sql, params = paginate_sql(
+        "SELECT TOP (10) ECode FROM AttendanceReport ORDER BY ECode", [], 6, 100
+    )
+    assert sql == "SELECT ECode FROM AttendanceReport ORDER BY ECode OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+    assert params == [6, 4]
+
+
+def test_past_the_top_rows_returns_nothing():
+    sql, params = paginate_sql("SELECT DISTINCT TOP 10 ECode FROM AttendanceReport", ["x"], 10, 5)
+    assert sql == "SELECT DISTINCT TOP (0) ECode FROM AttendanceReport"
+    assert params == ["x"]
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT ECode FROM AttendanceReport UNION SELECT ECode FROM AttendanceReport",
+    "SELECT ECode FROM AttendanceReport ORDER BY ECode OFFSET 5 ROWS",
+    "SELECT TOP 10 PERCENT ECode FROM AttendanceReport",
+    "SELECT TOP 10 WITH TIES ECode FROM AttendanceReport ORDER BY ECode",
+    "SELECT TOP (?) ECode FROM AttendanceReport",
+    "SELECT ECode FROM AttendanceReport FOR JSON PATH",
+    "SELECT ECode FROM AttendanceReport OPTION (RECOMPILE)",
+])
+def test_unpageable_shapes_are_refused(sql):
+    assert paginate_sql(sql, [], 0, 5) is None
+
+
+def test_cte_union_inside_body_is_pageable():
+    sql, _ = paginate_sql(
+        "WITH a AS (SELECT ECode FROM AttendanceReport UNION SELECT ECode FROM AttendanceReport) "
+        "SELECT ECode FROM a",
+        [], 0, 5,
+    )
+    assert sql.endswith("FROM a ORDER BY (SELECT NULL) OFFSET ? ROWS FETCH NEXT ? ROWS ONLY")
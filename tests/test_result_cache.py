@@ -0,0 +1,68 @@
+from datetime import date
+
+import pytest
+
+from core.result_cache import (
+    RESULT_CACHE_HISTORICAL_TTL,
+    RESULT_CACHE_LIVE_TTL,
+    ResultCache,
+    _estimate_size,
+    result_ttl,
+)
+
+TODAY = date(2026, 3, 15)
+
+
+@pytest.mark.parametrize("sql, params", [
+    ("SELECT * FROM AttendanceReport WHERE WDate BETWEEN ? AND ?", ["2026-01-01", "2026-01-31"]),
+    ("SELECT * FROM AttendanceReport WHERE WDate = ?", ["2026-03-14"]),
+    ("SELECT * FROM AttendanceReport WHERE WDate >= ? AND WDate <= ?", ["2026-01-01", "2026-02-01"]),
+])
+def test_closed_past_ranges_are_historical(sql, params):
+    assert result_ttl(sql, params, TODAY) == RESULT_CACHE_HISTORICAL_TTL
+
+
+@pytest.mark.parametrize("sql, params", [
+    ("SELECT * FROM AttendanceReport WHERE WDate >= ?", ["2026-01-01"]),
+    ("SELECT * FROM AttendanceReport WHERE WDate > ? AND ECode = ?", ["2026-01-01", "H00001"]),
+    ("SELECT * FROM AttendanceReport WHERE WDate BETWEEN ? AND ?", ["2026-03-01", "2026-03-15"]),
+    ("SELECT * FROM AttendanceReport WHERE WDate <= CAST(GETDATE() - 30 AS DATE)", []),
+    ("SELECT * FROM AttendanceReport", []),
+])
+def test_open_or_current_ranges_are_live(sql, params):
+    assert result_ttl(sql, params, TODAY) == RESULT_CACHE_LIVE_TTL
+
+
+def colset(rows, text="H00001"):
+    return {
+        "columns": ["ECode", "Hours"],
+        "types": [str, float],
+        "values": [[text] * rows, [8.0] * rows],
+    }
+
+
+def test_shaping_arguments_are_part_of_the_key():
+    cache = ResultCache(10_000)
+    sql, params = "SELECT ECode, Hours FROM AttendanceReport", []
+    cache.set("SHJM", sql, params, colset(2), ttl=60, shape=(3, None, "records"))
+
+    assert cache.get("shjm", sql, params, (3, None, "records")) is not None
+    assert cache.get("shjm", sql, params, (11, None, "records")) is None
+    assert cache.get("shjm", sql, params, (3, 2, "records")) is None
+    assert cache.get("shjm", sql, params, (3, None, "arrow")) is None
+
+
+def test_size_estimate_scales_with_rows_and_text():
+    assert _estimate_size(colset(0)) < _estimate_size(colset(10)) < _estimate_size(colset(100))
+    assert _estimate_size(colset(10, "x" * 200)) > _estimate_size(colset(10))
+    assert _estimate_size({"columns": [], "types": [], "values": []}) == 0
+
+
+def test_byte_budget_evicts_oldest():
+    cache = ResultCache(_estimate_size(colset(10)) * 2)
+    for n in range(3):
+        cache.set("shjm", f"SELECT {n}", [], colset(10), ttl=60)
+
+    assert cache.get("shjm", "SELECT 0", []) is None
+    assert cache.get("shjm", "SELECT 2", []) is not None
+    assert cache.evictions == 1
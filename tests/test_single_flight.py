@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core.single_flight import SingleFlight
+
+
+def run_threads(group, key, func, count, timeout=5.0):
+    """Runs group.run() from `count` threads; returns results / errors."""
+    outcomes = [None] * count
+
+    def worker(i):
+        try:
+            outcomes[i] = ("ok", group.run(key, func, timeout))
+        except Exception as e:
+            outcomes[i] = ("error", e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition never became true"
+        time.sleep(0.001)
+
+
+def joined(group):
+    stats = group.stats()
+    return stats["leaders"] + stats["coalesced"]
+
+
+def test_concurrent_callers_share_one_call():
+    group = SingleFlight("test")
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return {"rows": 3}
+
+    threads, outcomes = run_threads(group, "k", work, 5)
+    wait_until(lambda: joined(group) == 5)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert all(outcome == ("ok", {"rows": 3}) for outcome in outcomes)
+    assert group.stats() == {"leaders": 1, "coalesced": 4, "timeouts": 0, "inflight": 0}
+
+
+def test_different_keys_do_not_coalesce():
+    group = SingleFlight("test")
+    assert group.run("a", lambda: 1) == 1
+    assert group.run("b", lambda: 2) == 2
+    assert group.stats()["leaders"] == 2
+
+
+def test_leader_error_reaches_every_waiter():
+    group = SingleFlight("test")
+    release = threading.Event()
+
+    def work():
+        release.wait(5)
+        raise RuntimeError("db down")
+
+    threads, outcomes = run_threads(group, "k", work, 3)
+    wait_until(lambda: joined(group) == 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert [kind for kind, _ in outcomes] == ["error"] * 3
+    assert all(str(error) == "db down" for _, error in outcomes)
+    # The key is free again once the call finished
+    assert group.run("k", lambda: "fresh") == "fresh"
+
+
+def test_waiter_times_out_but_leader_finishes():
+    group = SingleFlight("test")
+    release = threading.Event()
+    leader = threading.Thread(target=group.run, args=("k", lambda: release.wait(5)))
+    leader.start()
+    wait_until(lambda: group.stats()["inflight"] == 1)
+
+    with pytest.raises(TimeoutError, match="in-flight test call"):
+        group.run("k", lambda: "unused", timeout=0.05)
+
+    release.set()
+    leader.join()
+    assert group.stats()["timeouts"] == 1
+    assert group.stats()["inflight"] == 0
+
+
+def test_async_callers_share_one_task():
+    group = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(group.run_async("k", work, 5) for _ in range(4)))
+
+    assert asyncio.run(main()) == ["answer"] * 4
+    assert calls == [1]
+    assert group.stats() == {"leaders": 1, "coalesced": 3, "timeouts": 0, "inflight": 0}
+
+
+def test_async_timeout_does_not_cancel_the_shared_task():
+    group = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    async def main():
+        slow = asyncio.ensure_future(group.run_async("k", work, 5))
+        await asyncio.sleep(0)
+        with pytest.raises(TimeoutError, match="in-flight test call"):
+            await group.run_async("k", work, 0.01)
+        return await slow
+
+    assert asyncio.run(main()) == "answer"
+    assert group.stats()["timeouts"] == 1
+
+
+def test_async_error_reaches_every_waiter():
+    group = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("bad sql")
+
+    async def main():
+        return await asyncio.gather(
+            *(group.run_async("k", work, 5) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    errors = asyncio.run(main())
+    assert [str(e) for e in errors] == ["bad sql"] * 3
+    assert group.stats()["inflight"] == 0
@@ -0,0 +1,44 @@
+import datetime
+import sqlite3
+
+import pytest
+
+from core.sql_dialect import adapt_value, tsql_to_sqlite
+
+
+def test_rewrites_skip_string_literals_and_comments():
+    sql = tsql_to_sqlite(
+        "SELECT YEAR(WDate) AS y, 'YEAR(x) GETDATE()' AS s FROM AttendanceReport "
+        "-- TOP 5 isn't\n"
+        "WHERE WDate = CAST(GETDATE()-1 AS DATE) AND ISNULL(EName, 'LEN(') <> 'it''s'"
+    )
+    assert sql == (
+        "SELECT CAST(strftime('%Y', WDate) AS INTEGER) AS y, 'YEAR(x) GETDATE()' AS s "
+        "FROM AttendanceReport WHERE WDate = date('now', 'localtime', '-1 day') "
+        "AND IFNULL(EName, 'LEN(') <> 'it''s'"
+    )
+
+
+def test_unicode_literals_lose_their_prefix():
+    assert tsql_to_sqlite("SELECT N'x' AS s") == "SELECT 'x' AS s"
+
+
+@pytest.mark.parametrize("value, stored", [
+    (datetime.date(2025, 1, 2), "2025-01-02"),
+    (datetime.datetime(2025, 1, 2), "2025-01-02"),
+    (datetime.datetime(2025, 1, 2, 8, 30), "2025-01-02 08:30:00"),
+])
+def test_dates_are_stored_in_sqlite_formats(value, stored):
+    assert adapt_value(value) == stored
+
+
+def test_stored_dates_compare_like_sql_server():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (WDate TEXT)")
+    conn.executemany(
+        "INSERT INTO t VALUES (?)",
+        [(adapt_value(datetime.datetime(2025, 1, day)),) for day in (1, 15, 31)],
+    )
+    sql = tsql_to_sqlite("SELECT COUNT(*) FROM t WHERE WDate BETWEEN ? AND ?")
+    assert conn.execute(sql, ["2025-01-01", "2025-01-31"]).fetchone() == (3,)
+    assert conn.execute("SELECT COUNT(*) FROM t WHERE WDate = ?", ["2025-01-15"]).fetchone() == (1,)
@@ -0,0 +1,62 @@
+import pytest
+
+from core.sql_guard import check_sql
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM (sys.sql_logins l CROSS JOIN AttendanceReport a)",
+    "SELECT * FROM (secret s JOIN AttendanceReport b ON 1=1)",
+    "SELECT * FROM (AttendanceReport a JOIN secret s ON 1=1)",
+    "SELECT * FROM ((AttendanceReport a JOIN (secret s) ON 1=1))",
+    "SELECT * FROM AttendanceReport a, (secret s JOIN AttendanceReport b ON 1=1)",
+    "SELECT * FROM (AttendanceReport a JOIN ((secret s)) ON 1=1)",
+])
+def test_parenthesized_joins_are_checked(sql):
+    verdict = check_sql(sql)
+    assert not verdict["allowed"]
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM ((AttendanceReport))",
+    "SELECT * FROM (AttendanceReport a JOIN AttendanceReport b ON a.ECode = b.ECode)",
+    "SELECT * FROM (SELECT ECode FROM AttendanceReport) t",
+])
+def test_parenthesized_tables_are_recorded(sql):
+    verdict = check_sql(sql)
+    assert verdict["allowed"], verdict["reason"]
+    assert verdict["tables"] == ["attendancereport"]
+
+
+def test_trim_from_is_not_a_table():
+    verdict = check_sql("SELECT TRIM(' ' FROM EName) AS Name FROM AttendanceReport")
+    assert verdict["allowed"], verdict["reason"]
+    assert verdict["tables"] == ["attendancereport"]
+
+
+@pytest.mark.parametrize("sql", [
+    "WITH secret AS (SELECT 1 AS x FROM AttendanceReport) SELECT * FROM dbo.secret",
+    "WITH secret AS (SELECT 1 AS x FROM AttendanceReport) SELECT * FROM [dbo].[secret]",
+    "WITH s AS (SELECT 1 AS x FROM AttendanceReport) SELECT * FROM s JOIN dbo.s t ON 1=1",
+])
+def test_schema_qualified_names_are_not_ctes(sql):
+    verdict = check_sql(sql)
+    assert not verdict["allowed"]
+
+
+def test_cte_names_are_allowed():
+    verdict = check_sql(
+        "WITH a AS (SELECT ECode FROM AttendanceReport) SELECT * FROM a"
+    )
+    assert verdict["allowed"], verdict["reason"]
+    assert verdict["tables"] == ["attendancereport"]
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT EXTRACT(year FROM WDate) AS y FROM AttendanceReport",
+    "SELECT DATEPART(year FROM WDate) AS y FROM AttendanceReport",
+    "SELECT SUBSTRING(EName FROM 1 FOR 3) AS s FROM AttendanceReport",
+])
+def test_from_inside_functions_is_not_a_table(sql):
+    verdict = check_sql(sql)
+    assert verdict["allowed"], verdict["reason"]
+    assert verdict["tables"] == ["attendancereport"]
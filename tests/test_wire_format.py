@@ -0,0 +1,70 @@
+import datetime
+import json
+
+import pytest
+
+from core.wire_format import (
+    ARROW_META_KEY,
+    FORMAT_ARROW,
+    FORMAT_COLUMNAR,
+    FORMAT_RECORDS,
+    negotiate_format,
+    to_arrow_ipc,
+    to_columnar,
+)
+
+
+@pytest.mark.parametrize("requested, accept, expected", [
+    (None, None, FORMAT_RECORDS),
+    ("Columnar ", None, FORMAT_COLUMNAR),
+    ("records", "application/vnd.apache.arrow.stream", FORMAT_RECORDS),
+    (None, "application/json, application/vnd.apache.arrow.stream;q=0.9", FORMAT_ARROW),
+    (None, "application/vnd.smarteye.columnar+json", FORMAT_COLUMNAR),
+    (None, "text/html, */*", FORMAT_RECORDS),
+])
+def test_negotiate_format(requested, accept, expected):
+    assert negotiate_format(requested, accept) == expected
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError, match="Unsupported format"):
+        negotiate_format("xml")
+
+
+def test_columnar_keeps_column_order():
+    records = [{"ECode": "H1", "Hours": 8.0}, {"ECode": "H2"}]
+
+    assert to_columnar(records) == {
+        "columns": ["ECode", "Hours"],
+        "rows": [["H1", 8.0], ["H2", None]],
+    }
+    assert to_columnar([]) == {"columns": [], "rows": []}
+
+
+def read_arrow(data):
+    pa = pytest.importorskip("pyarrow")
+    return pa.ipc.open_stream(data).read_all()
+
+
+def test_arrow_keeps_native_types_and_metadata():
+    pytest.importorskip("pyarrow")
+    day = datetime.date(2026, 3, 1)
+
+    table = read_arrow(to_arrow_ipc(
+        ["ECode", "WDate"], [["H1", "H2"], [day, None]], {"sql": "SELECT 1", "rows": 2}
+    ))
+
+    assert table.column_names == ["ECode", "WDate"]
+    assert table.column("WDate").to_pylist() == [day, None]
+    assert json.loads(table.schema.metadata[ARROW_META_KEY]) == {"sql": "SELECT 1", "rows": 2}
+
+
+def test_arrow_keeps_duplicate_column_names():
+    pytest.importorskip("pyarrow")
+
+    table = read_arrow(to_arrow_ipc(
+        ["ECode", "ECode", "Hours"], [["H1"], ["G1"], [8.0]]
+    ))
+
+    assert table.column_names == ["ECode", "ECode", "Hours"]
+    assert [table.column(i).to_pylist() for i in range(3)] == [["H1"], ["G1"], [8.0]]